@@ -0,0 +1,40 @@
+"""
+The synthetic manuscript shared by the benchmarks.
+"""
+import os
+import random
+import sys
+from contextlib import redirect_stdout
+from io import StringIO
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from tocmanuscript import ToCManuscript, Prompt
+
+def build(title, sections, words):
+    """
+    Creates a manuscript with the given number of sections in chapters of ten, each with a prompt and content of words drawn with Zipf-like frequencies from a vocabulary of 2000 made-up words. The texts depend on the title only.
+
+    The manuscript is created and saved with the public API in the configured output directory, so point it to a temporary directory with configure(output_directory=...) first.
+
+    Parameters:
+        title (str): The title of the manuscript.
+        sections (int): The number of sections.
+        words (int): The number of words per section.
+
+    Returns:
+        ToCManuscript: The manuscript.
+    """
+    generator = random.Random(title)
+    syllables = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'en', 'ar', 'is', 'on']
+    vocabulary = [''.join(generator.choices(syllables, k=generator.randint(1, 4))) for _ in range(2000)]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    with redirect_stdout(StringIO()):
+        toc = ToCManuscript(title=title)
+        with toc.batch():
+            toc.set_guidelines({'Style': 'Formal'})
+            for i in range(sections):
+                chapter, section = divmod(i, 10)
+                if section == 0:
+                    toc.set_section([chapter + 1], title=f'Chapter {chapter + 1}')
+                toc.set_section([chapter + 1, section + 1], title=f'Section {i}', prompt=Prompt(directives={'Instruction': f'Write section {i}'}))
+                toc[chapter + 1][section + 1]['content'] = ' '.join(generator.choices(vocabulary, weights, k=words))
+    return toc
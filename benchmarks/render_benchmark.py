@@ -0,0 +1,73 @@
+"""
+Measures how generate(workers=N) and generate_many(workers=N) scale with the number of worker processes.
+
+Usage:
+    python benchmarks/render_benchmark.py [sections] [words_per_section] [manuscripts] [max_workers]
+
+A synthetic manuscript with the given number of sections, see common.build(), is written from scratch with 1, 2, 4, ... workers up to the number of CPUs or 'max_workers', and the given number of such manuscripts, saved in a temporary output directory, are exported by title with generate_many(). Workers 1 is the serial renderer of this process. The speedup is relative to it.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from common import build
+from tocmanuscript import ToCManuscript, configure
+
+def measure(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def worker_counts(max_workers):
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+    return counts
+
+def main(sections=1000, words=2000, manuscripts=8, max_workers=None):
+    max_workers = max_workers or os.cpu_count() or 1
+    output_dir = tempfile.mkdtemp()
+    try:
+        with redirect_stdout(StringIO()):
+            configure(output_directory=output_dir)
+            toc = build('Benchmark', sections, words)
+            titles = [build(f'Benchmark {number}', sections // manuscripts, words).title for number in range(manuscripts)]
+        size = len(toc.get_content().encode('utf-8')) / 1024 / 1024
+        print(f'CPUs: {os.cpu_count()}, affinity: {len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else "n/a"}')
+        print(f'generate(): {sections} sections, {size:.1f} MB, written from scratch')
+
+        def generate(workers):
+            # Without the previous file the whole file is written.
+            if os.path.exists(toc.get_filepath()):
+                os.remove(toc.get_filepath())
+            toc.generate(return_content=False, workers=workers)
+
+        print(f'{"workers":>8} {"time ms":>10} {"speedup":>8}')
+        serial = None
+        for workers in worker_counts(max_workers):
+            elapsed = measure(lambda: generate(workers))
+            serial = serial or elapsed
+            print(f'{workers:>8} {elapsed * 1000:>10.1f} {serial / elapsed:>8.2f}')
+        print(f'generate_many(): {manuscripts} manuscripts of {sections // manuscripts} sections, restored by title')
+        print(f'{"workers":>8} {"time ms":>10} {"speedup":>8}')
+        serial = None
+        for workers in worker_counts(max_workers):
+            elapsed = measure(lambda: ToCManuscript.generate_many(titles, workers=workers))
+            serial = serial or elapsed
+            print(f'{workers:>8} {elapsed * 1000:>10.1f} {serial / elapsed:>8.2f}')
+    finally:
+        with redirect_stdout(StringIO()):
+            configure(output_directory='text_output')
+        shutil.rmtree(output_dir)
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,80 @@
+"""
+Compares the save time, load time and file size of the pickle and JSON storage formats, and of pickle with compressed section texts. Compressed texts are decompressed on access, so the load times do not include decompression.
+
+Usage:
+    python benchmarks/storage_benchmark.py [sections] [words_per_section]
+
+The synthetic manuscript has the given number of sections of the given number of words, see common.build(). It is created in a temporary output directory. The bundled output/The_Forgotten_Experiment.pkl is measured as well.
+"""
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from common import build
+from tocmanuscript import ToCManuscript, configure
+from tocmanuscript.Codec import ManuscriptCodec
+from tocmanuscript.Compression import TextCompressor
+from tocmanuscript.ToCDict import ToCDict
+
+def clear_compressed(node):
+    if isinstance(node, ToCDict):
+        node._compressed_texts = None
+    if isinstance(node, ToCManuscript):
+        node.__dict__.pop('_compression_dictionary', None)
+    for value in dict.values(node):
+        if isinstance(value, dict):
+            clear_compressed(value)
+
+def measure(name, toc, repeat=5):
+    codec = ManuscriptCodec()
+    results = []
+    for label, dumps, loads in (
+        ('pickle', pickle.dumps, pickle.loads),
+        ('json', codec.dumps, lambda data: codec.loads(data, ToCManuscript.__new__(ToCManuscript))),
+        ('zlib', TextCompressor('zlib').dumps, pickle.loads),
+        ('zlib+dict', TextCompressor('zlib', dictionary=True).dumps, pickle.loads),
+        ('lzma', TextCompressor('lzma').dumps, pickle.loads),
+    ):
+        # Every save compresses all texts from scratch, like the first save of a session.
+        start = time.perf_counter()
+        for _ in range(repeat):
+            clear_compressed(toc)
+            data = dumps(toc)
+        save = (time.perf_counter() - start) / repeat
+        ToCDict._restoring = True
+        try:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                loads(data)
+            load = (time.perf_counter() - start) / repeat
+        finally:
+            ToCDict._restoring = False
+        results.append(f'{name:<28} {label:<10} {len(data) / 1024:>10.1f} KB {save * 1000:>10.2f} ms {load * 1000:>10.2f} ms')
+    return results
+
+if __name__ == '__main__':
+    sections = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    words = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    print(f'{"manuscript":<28} {"format":<10} {"size":>13} {"save":>13} {"load":>13}')
+    output_dir = tempfile.mkdtemp()
+    try:
+        with redirect_stdout(StringIO()):
+            configure(output_directory=output_dir)
+        lines = measure(f'synthetic {sections}x{words} words', build('Benchmark', sections, words))
+    finally:
+        with redirect_stdout(StringIO()):
+            configure(output_directory='text_output')
+        shutil.rmtree(output_dir)
+    sample = os.path.join(os.path.dirname(__file__), '..', 'output', 'The_Forgotten_Experiment.pkl')
+    if os.path.exists(sample):
+        ToCDict._restoring = True
+        try:
+            with open(sample, 'rb') as file:
+                lines += measure('The_Forgotten_Experiment', pickle.load(file))
+        finally:
+            ToCDict._restoring = False
+    print('\n'.join(lines))
@@ -0,0 +1,1634 @@
+import multiprocessing
+import os
+import pickle
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from functools import partial
+from io import BytesIO, StringIO
+from unittest import mock
+from tocmanuscript import ToCManuscript, Prompt, configure
+from tocmanuscript.Compression import CompressedText, TextCompressor, cache
+from tocmanuscript.Definitions import prompt_definitions
+from tocmanuscript.LazyText import LazyText
+from tocmanuscript.Schema import Schema
+from tocmanuscript.StorySchema import StorySchema
+from tocmanuscript.JSONStorage import migrate
+from tocmanuscript.Registry import registry
+from tocmanuscript.Storage import PickleStorage, storages
+from tocmanuscript.Templates import OutputTemplates
+from tocmanuscript.ToCDict import ToCDict
+from tocmanuscript.ShardedStorage import ShardedStorage
+from tocmanuscript.SQLiteStorage import SQLiteStorage
+
+class ManuscriptTestCase(unittest.TestCase):
+    """
+    Base class that points the output directory to a temporary directory and restores the default configuration afterwards.
+    """
+    storage = 'pickle'
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        with redirect_stdout(StringIO()):
+            configure(output_directory=self.output_dir, storage=self.storage)
+
+    def tearDown(self):
+        registry.close()
+        with redirect_stdout(StringIO()):
+            configure(output_directory='text_output', storage='pickle')
+        shutil.rmtree(self.output_dir)
+
+    def create(self, title='Test Manuscript'):
+        with redirect_stdout(StringIO()):
+            toc = ToCManuscript(title=title)
+            toc.set_section([1], title='Chapter 1')
+            toc.set_section([1, 1], title='Section 1.1', prompt=Prompt(directives={'Instruction': 'Write 1.1'}))
+            toc.set_section([1, 2], title='Section 1.2', prompt=Prompt(directives={'Instruction': 'Write 1.2'}))
+            toc.set_section([2], title='Chapter 2', prompt=Prompt(directives={'Instruction': 'Write 2'}))
+        return toc
+
+    def restore(self, title='Test Manuscript'):
+        with redirect_stdout(StringIO()):
+            return ToCManuscript(title=title)
+
+
+class TestPickleStorage(ManuscriptTestCase):
+
+    def test_restore_nested_prompts(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.move_to_next_section()
+            toc.set_content('Content 1.1', [1, 1], completed=True)
+        restored = self.restore()
+        self.assertEqual(restored[1][1]['content'], 'Content 1.1')
+        self.assertTrue(restored[1][1]['completed'])
+        self.assertEqual(restored[1][2]['prompt'].directives, {'Instruction': 'Write 1.2'})
+        self.assertEqual(restored.currently_editing_index, [1])
+
+
+class TestPickleState(ManuscriptTestCase):
+
+    def test_round_trip(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_guidelines({'Style': 'Formal'})
+            toc.set_section([3], title='Chapter 3', prompt=Prompt(directives={'Instruction': 'Write 3'}))
+        restored = pickle.loads(pickle.dumps(toc))
+        # Prompts compare by identity, so compare the representations.
+        self.assertEqual(repr(restored), repr(toc))
+        self.assertEqual(restored.__getstate__().keys(), toc.__getstate__().keys())
+        self.assertEqual(restored[1][2]['prompt'].directives, {'Instruction': 'Write 1.2'})
+        # Shared definitions are restored as a single object.
+        self.assertIs(restored[3].guidelines, restored.guidelines)
+        self.assertIs(restored[3]['prompt'].guidelines, restored.guidelines)
+        self.assertEqual(restored[1].directives, {})
+
+    def test_empty_definitions_are_left_out(self):
+        node = ToCDict({'title': 'Title'})
+        self.assertIsNone(node.__reduce__()[1][2])
+        node.guidelines = {'Style': 'Formal'}
+        self.assertEqual(node.__reduce__()[1][2], {'guidelines': {'Style': 'Formal'}})
+
+    def test_previous_pickle_format(self):
+        path = os.path.join(os.path.dirname(__file__), '..', 'output', 'The_Forgotten_Experiment.pkl')
+        ToCDict._restoring = True
+        try:
+            with open(path, 'rb') as file:
+                toc = pickle.load(file)
+        finally:
+            ToCDict._restoring = False
+        self.assertEqual(toc.title, 'The Forgotten Experiment')
+        self.assertIs(toc[1].guidelines, toc.guidelines)
+        self.assertIs(toc[1][1]['prompt'].guidelines, toc.guidelines)
+        self.assertEqual(repr(pickle.loads(pickle.dumps(toc))), repr(toc))
+
+
+class TestSectionNode(ManuscriptTestCase):
+
+    def test_compact_node(self):
+        node = ToCDict({'title': 'Title'})
+        self.assertFalse(hasattr(node, '__dict__'))
+        self.assertFalse(hasattr(node, '_directives'))
+        self.assertEqual(node.directives, {})
+        self.assertIs(node.directives, node.directives)
+        with self.assertRaises(AttributeError):
+            node.extra = True
+
+    def test_children(self):
+        toc = self.create()
+        self.assertEqual(toc.children(), [1, 2])
+        toc[1][3] = ToCDict({'title': 'Section 1.3'})
+        self.assertEqual(toc[1].children(), [1, 2, 3])
+        del toc[1][1]
+        toc[1][0] = ToCDict({'title': 'Section 1.0'})
+        self.assertEqual(toc[1].children(), [0, 2, 3])
+        dict.__setitem__(toc[1], 4, ToCDict({'title': 'Section 1.4'}))
+        self.assertEqual(toc[1].children(), [0, 2, 3, 4])
+
+    def test_restored_node_state(self):
+        toc = self.create()
+        toc[2].guidelines = {'Style': 'Formal'}
+        for storage in ('pickle', 'sharded', 'sqlite', 'json'):
+            with redirect_stdout(StringIO()):
+                configure(storage=storage)
+                toc.pickle()
+                restored = self.restore()
+            self.assertEqual(restored[2].guidelines, {'Style': 'Formal'})
+            self.assertFalse(hasattr(restored[1], '_guidelines'))
+
+
+class TestSectionIndex(ManuscriptTestCase):
+
+    def test_lookup(self):
+        toc = self.create()
+        self.assertIs(toc.section(()), toc)
+        self.assertIs(toc.section([1, 2]), toc[1][2])
+        self.assertIs(toc.section((2,)), toc[2])
+        self.assertEqual(toc.section((1, 1, 'title')), 'Section 1.1')
+        with self.assertRaises(KeyError):
+            toc.section((1, 3))
+        self.assertEqual(toc.sections_by_title['Section 1.2'], [(1, 2)])
+
+    def test_updates(self):
+        toc = self.create()
+        toc.section(())
+        with redirect_stdout(StringIO()):
+            toc.set_section([3, 1, 1], title='Section 3.1.1')
+        self.assertIsInstance(toc.section((3, 1)), ToCDict)
+        self.assertIs(toc.section((3, 1, 1)), toc[3][1][1])
+        toc[1][3] = ToCDict({'title': 'Section 1.3'})
+        toc[1][3][1] = ToCDict({'title': 'Section 1.3.1'})
+        self.assertIs(toc.section((1, 3, 1)), toc[1][3][1])
+        toc[1][2]['title'] = 'Renamed'
+        self.assertNotIn('Section 1.2', toc.sections_by_title)
+        self.assertEqual(toc.sections_by_title['Renamed'], [(1, 2)])
+        # Replacing a section drops its old subsections.
+        toc[1][3] = ToCDict({'title': 'Section 1.3'})
+        self.assertNotIn((1, 3, 1), toc._section_index)
+        self.assertNotIn('Section 1.3.1', toc.sections_by_title)
+        del toc[1][1]
+        self.assertNotIn((1, 1), toc._section_index)
+        removed = toc.pop(1)
+        self.assertEqual([path for path in toc._section_index if path[:1] == (1,)], [])
+        self.assertFalse(hasattr(removed[2], '_root'))
+        with redirect_stdout(StringIO()):
+            toc.set_content('Content 2', [2])
+        self.assertEqual(toc.section((2,))['content'], 'Content 2')
+
+    def test_ancestors(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_section([1, 2, 1], title='Section 1.2.1')
+        self.assertEqual(toc.ancestors([1, 2, 1]), [((1,), toc[1]), ((1, 2), toc[1][2])])
+        self.assertEqual(toc.ancestors([2]), [])
+        self.assertEqual([path for path, section in toc.siblings([1, 1])], [(1, 2)])
+        self.assertEqual([path for path, section in toc.siblings([2], include_self=True)], [(1,), (2,)])
+        self.assertEqual(toc.numbering([1, 2, 1]), '1.2.1.')
+        self.assertEqual(toc.numbering([]), '')
+        with self.assertRaises(KeyError):
+            toc.ancestors([1, 3])
+        with self.assertRaises(KeyError):
+            toc.numbering([1, 1, 'title'])
+        # The paths follow structural edits.
+        with redirect_stdout(StringIO()):
+            toc.move_section([1, 2], [2, 1])
+        self.assertEqual([section['title'] for path, section in toc.ancestors([2, 1, 1])], ['Chapter 2', 'Section 1.2'])
+        self.assertEqual(toc.numbering([2, 1, 1]), '2.1.1.')
+
+    def test_restore(self):
+        toc = self.create()
+        toc.section(())
+        data = pickle.dumps(toc)
+        self.assertNotIn(b'_section_index', data)
+        self.assertNotIn(b'_root', data)
+        restored = self.restore()
+        self.assertIs(restored.section((1, 2)), restored[1][2])
+        self.assertEqual(restored.sections_by_title['Chapter 2'], [(2,)])
+
+
+class TestNavigation(ManuscriptTestCase):
+
+    def preorder(self, node, path=()):
+        paths = []
+        for key, child in dict.items(node):
+            if isinstance(key, int) and isinstance(child, dict):
+                paths.append(list(path + (key,)))
+                paths += self.preorder(child, path + (key,))
+        return paths
+
+    def walk(self, toc, step):
+        paths = []
+        with redirect_stdout(StringIO()):
+            toc.currently_editing_index = []
+            while True:
+                path = step()
+                if not path:
+                    return paths
+                paths.append(path)
+
+    def check_order(self, toc):
+        expected = self.preorder(toc)
+        self.assertEqual(self.walk(toc, toc.move_to_next_section), expected)
+        self.assertEqual(self.walk(toc, toc.move_to_previous_section), expected[::-1])
+
+    def test_order_follows_changes(self):
+        toc = self.create()
+        with toc.batch():
+            self.check_order(toc)
+            toc.set_section([1, 3], title='Section 1.3')
+            toc.set_section([2, 1, 1], title='Section 2.1.1')
+            toc.set_section([3], title='Chapter 3')
+            toc.set_section([1, 1, 1], title='Section 1.1.1')
+            self.check_order(toc)
+            # Replacing a section keeps its place, removing one closes the gap.
+            toc[1][1] = ToCDict({'title': 'Section 1.1', 1: ToCDict({'title': 'Section 1.1.1'})})
+            del toc[2][1]
+            toc[2]['notes'] = 'Notes'
+            toc[2][5] = ToCDict({'title': 'Section 2.5'})
+            self.check_order(toc)
+            toc[2][7] = 'Not a section yet'
+            toc[2][8] = ToCDict({'title': 'Section 2.8'})
+            toc[2][7] = ToCDict({'title': 'Section 2.7'})
+            self.check_order(toc)
+            toc.pop(1)
+            self.check_order(toc)
+
+    def test_next_prompt_directives(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            self.assertEqual(toc.move_to_next_section(), [1])
+            self.assertEqual(toc.find_next_index(), [1, 1])
+            self.assertEqual(toc.get_next_prompt_directives(), {'Instruction': 'Write 1.1'})
+            toc.currently_editing_index = [2]
+            self.assertEqual(toc.find_next_index(), [])
+            self.assertEqual(toc.move_to_previous_section(), [1, 2])
+
+
+class TestIterSections(ManuscriptTestCase):
+
+    def create(self, title='Test Manuscript'):
+        toc = super().create(title)
+        with redirect_stdout(StringIO()):
+            # Numbering order, not insertion order.
+            toc.set_section([1, 0], title='Section 1.0')
+            toc.set_section([2, 1, 1], title='Section 2.1.1')
+        return toc
+
+    def test_orders(self):
+        toc = self.create()
+        self.assertEqual([index for index, section in toc.iter_sections()], [(1,), (1, 0), (1, 1), (1, 2), (2,), (2, 1), (2, 1, 1)])
+        self.assertEqual([index for index, section in toc.iter_sections('postorder')], [(1, 0), (1, 1), (1, 2), (1,), (2, 1, 1), (2, 1), (2,)])
+        self.assertEqual([index for index, section in toc.iter_sections('bfs')], [(1,), (2,), (1, 0), (1, 1), (1, 2), (2, 1), (2, 1, 1)])
+        index, section = next(toc.iter_sections(start=[1, 2]))
+        self.assertEqual(index, (1, 2))
+        self.assertIs(section, toc[1][2])
+        with self.assertRaises(ValueError):
+            toc.iter_sections('inorder')
+        with self.assertRaises(KeyError):
+            toc.iter_sections(start=[3])
+
+    def test_filters(self):
+        toc = self.create()
+        self.assertEqual([index for index, section in toc.iter_sections(max_depth=1)], [(1,), (2,)])
+        self.assertEqual([index for index, section in toc.iter_sections(start=[2], max_depth=1)], [(2,), (2, 1)])
+        has_prompt = lambda index, section: 'prompt' in section
+        self.assertEqual([index for index, section in toc.iter_sections(where=has_prompt)], [(1, 1), (1, 2), (2,)])
+        self.assertEqual(toc._check_completion_status([1]), [
+            {'level_str': '1.1.', 'title': 'Section 1.1'},
+            {'level_str': '1.2.', 'title': 'Section 1.2'},
+        ])
+
+    def test_rendering_order(self):
+        toc = self.create()
+        content = toc.get_content()
+        self.assertLess(content.index('## 1.0. Section 1.0'), content.index('## 1.1. Section 1.1'))
+        self.assertIn('### 2.1.1. Section 2.1.1', content)
+        with redirect_stdout(StringIO()) as output:
+            toc.print_toc()
+        self.assertEqual(output.getvalue().splitlines()[:2], ['- Chapter 1', '  - Section 1.0'])
+
+
+class TestRender(ManuscriptTestCase):
+
+    def create(self, title='Test Manuscript'):
+        toc = super().create(title)
+        with redirect_stdout(StringIO()):
+            toc.set_content('Content 1.1', [1, 1], completed=True)
+        return toc
+
+    def test_sinks(self):
+        toc = self.create()
+        content = toc.get_content()
+        self.assertEqual(''.join(toc.render_iter()), content)
+        self.assertEqual(toc.render(), content)
+        stream = StringIO()
+        self.assertEqual(toc.render(stream, buffer_size=0), len(content))
+        self.assertEqual(stream.getvalue(), content)
+        chunks = []
+        toc.render(chunks, buffer_size=0)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), content)
+        calls = []
+        toc.render(calls.append)
+        self.assertEqual(calls, [content])
+        binary = BytesIO()
+        toc.render(binary)
+        self.assertEqual(binary.getvalue().decode('utf-8'), content)
+        left, right = socket.socketpair()
+        with left, right:
+            toc.render(left, start=[1, 1])
+            left.shutdown(socket.SHUT_WR)
+            received = b''.join(iter(lambda: right.recv(4096), b''))
+        self.assertEqual(received.decode('utf-8'), toc.render(start=[1, 1]))
+        self.assertTrue(received.startswith(b'## 1.1. Section 1.1'))
+        with self.assertRaises(TypeError):
+            toc.render(42)
+
+    def test_generate(self):
+        toc = self.create()
+        content = toc.get_content()
+        self.assertEqual(toc.generate(), content)
+        path = toc.generate(return_content=False)
+        self.assertEqual(path, toc.get_filepath())
+        with open(path, 'r') as file:
+            self.assertEqual(file.read(), content)
+        with redirect_stdout(StringIO()):
+            toc.set_content('Content 2', [2])
+        changed = toc.get_content()
+        # The content comes from the written or patched parts, not from a second rendering.
+        with mock.patch.object(ToCManuscript, 'render_iter', autospec=True) as render_iter:
+            self.assertEqual(toc.generate(), changed)
+            self.assertEqual(toc.generate(), changed)
+            os.remove(path)
+            self.assertEqual(toc.generate(), changed)
+        self.assertEqual(render_iter.call_count, 0)
+
+    def test_incremental(self):
+        toc = self.create()
+        path = toc.generate(return_content=False)
+
+        def generate():
+            with mock.patch.object(ToCManuscript, '_render_entry', autospec=True, side_effect=ToCManuscript._render_entry) as render_entry:
+                toc.generate(return_content=False)
+            with open(path, 'r', encoding='utf-8') as file:
+                self.assertEqual(file.read(), toc.get_content())
+            return [call.args[1] for call in render_entry.call_args_list]
+
+        self.assertEqual(generate(), [])
+        with redirect_stdout(StringIO()):
+            toc.set_content('Content 1.2 ä', [1, 2], completed=True)
+            self.assertEqual(generate(), [(1, 2)])
+            # The same size is patched in place.
+            toc.set_content('Content 1.2 ö', [1, 2], completed=True)
+            self.assertEqual(generate(), [(1, 2)])
+            toc[1][1]['title'] = 'Renamed'
+            toc.set_summary('Summary 2', [2])
+            self.assertEqual(generate(), [(1, 1), (1, 2), (2,)])
+            toc.insert_section([1, 1], title='Inserted')
+            self.assertEqual(generate(), [(1, 1), (1, 2), (1, 3)])
+            toc.delete_section([1])
+            self.assertEqual(generate(), [(1,)])
+        toc.set_title('New Title')
+        path = toc.get_filepath()
+        self.assertEqual(generate(), [None, (1,)])
+        # A file changed by others is written again.
+        with open(path, 'a') as file:
+            file.write('Notes')
+        self.assertEqual(generate(), [None, (1,)])
+
+    def test_partial(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_summary('Summary 1.2', [1, 2])
+        full = toc.get_content()
+        self.assertEqual(toc.get_content(indices=[[1], [2]]), full)
+        self.assertEqual(toc.get_content(indices=[[1, 1], [1]]), full[:full.index('# 2.')])
+        self.assertEqual(toc.get_content(include=toc.render_fields), full)
+        toc_titles = toc.get_content(max_depth=1, include=('titles',))
+        self.assertEqual(toc_titles, 'Test Manuscript\n\n\n# 1. Chapter 1\n\n\n# 2. Chapter 2 (draft)\n\n\n')
+        chapter = toc.get_content(indices=[[1]], max_depth=2, include=('titles', 'summaries'))
+        self.assertIn('## 1.2. Section 1.2 (draft)\n\n\nSummary: Summary 1.2\n\n', chapter)
+        self.assertNotIn('Prompt:', chapter)
+        self.assertNotIn('Updated:', chapter)
+        self.assertNotIn('Chapter 2', chapter)
+        self.assertEqual(toc.render(start=[1, 1], include=('content',)), 'Content 1.1\n')
+        # Texts that are not rendered are not read.
+        loader = mock.Mock(return_value='Lazy')
+        dict.__setitem__(toc[2], 'content', LazyText(loader, 'key'))
+        toc.get_content(include=('titles', 'prompts'))
+        loader.assert_not_called()
+        self.assertIn('Lazy', toc.get_content(indices=[[2]]))
+        with self.assertRaises(KeyError):
+            toc.get_content(indices=[[3]])
+        with self.assertRaises(ValueError):
+            toc.get_content(include=('headings',))
+        with self.assertRaises(ValueError):
+            toc.render(start=[1], indices=[[2]])
+        # A preview replaces the generated file, and the next full generation writes it again.
+        toc.generate(return_content=False)
+        path = toc.get_filepath()
+        self.assertEqual(toc.generate(max_depth=1, include=('titles',)), toc_titles)
+        self.assertEqual(toc.generate(return_content=False, indices=[[1, 2]]), path)
+        with open(path, 'r', encoding='utf-8') as file:
+            self.assertEqual(file.read(), toc.get_content(indices=[[1, 2]]))
+        toc.generate(return_content=False)
+        with open(path, 'r', encoding='utf-8') as file:
+            self.assertEqual(file.read(), toc.get_content())
+
+    def test_workers(self):
+        toc = self.create()
+        content = toc.get_content()
+        self.assertEqual(toc.generate(workers=2), content)
+        path = toc.get_filepath()
+        with open(path, 'r', encoding='utf-8') as file:
+            self.assertEqual(file.read(), content)
+        # The render table of the workers is used by the next call.
+        with redirect_stdout(StringIO()):
+            toc.set_content('Content 1.2', [1, 2], completed=True)
+        with mock.patch.object(ToCManuscript, '_render_entry', autospec=True, side_effect=ToCManuscript._render_entry) as render_entry:
+            toc.generate(return_content=False, workers=2)
+        self.assertEqual([call.args[1] for call in render_entry.call_args_list], [(1, 2)])
+        with open(path, 'r', encoding='utf-8') as file:
+            self.assertEqual(file.read(), toc.get_content())
+
+    def test_generate_many(self):
+        first = self.create('First')
+        second = self.create('Second')
+        paths = ToCManuscript.generate_many(['First', second], workers=2)
+        self.assertEqual(paths, [first.get_filepath(), second.get_filepath()])
+        for toc, path in zip((first, second), paths):
+            with open(path, 'r', encoding='utf-8') as file:
+                self.assertEqual(file.read(), toc.get_content())
+        self.assertEqual(ToCManuscript.generate_many([second], workers=1), [second.get_filepath()])
+        with self.assertRaises(ValueError):
+            ToCManuscript.generate_many(['First', 'Missing'], workers=2)
+
+
+class TestTemplates(ManuscriptTestCase):
+
+    def tearDown(self):
+        with redirect_stdout(StringIO()):
+            configure(templates=None)
+        super().tearDown()
+
+    def test_compile(self):
+        templates = OutputTemplates(heading="${hashes} {${title}} costs $$5 'it's'\\n", draft='')
+        self.assertEqual(templates.heading(hashes='##', title='A'), "## {A} costs $5 'it's'\\n")
+        self.assertEqual(templates.used['heading'], {'hashes', 'title'})
+        self.assertEqual(templates.draft_text, '')
+        self.assertEqual(templates.prompt(prompt=Prompt(directives={'Instruction': 'Write'})), f"Prompt: {Prompt(directives={'Instruction': 'Write'})}\n\n")
+        restored = pickle.loads(pickle.dumps(templates))
+        self.assertEqual(restored.overrides, templates.overrides)
+        self.assertEqual(restored.heading(hashes='#', title='B'), "# {B} costs $5 'it's'\\n")
+        self.assertEqual(templates.replace(draft='*').overrides['heading'], templates.overrides['heading'])
+        with self.assertRaises(ValueError):
+            OutputTemplates(headings='')
+        with self.assertRaises(ValueError):
+            OutputTemplates(heading='${content}')
+        with self.assertRaises(ValueError):
+            OutputTemplates(heading='$ title')
+        with self.assertRaises(ValueError):
+            OutputTemplates(draft=None)
+
+    def test_compile_literal(self):
+        template = '\'\'\' """ \\ \\n \\N{BULLET} {0} {title} {{ }} %s ${title}\n'
+        templates = OutputTemplates(heading=template)
+        self.assertEqual(templates.heading(title='T'), template.replace('${title}', 'T'))
+        # Values are not interpreted either.
+        self.assertEqual(templates.heading(title='{hashes} ${title} \\'), template.replace('${title}', '{hashes} ${title} \\'))
+        self.assertEqual(OutputTemplates(draft='\\x41 {} \'').draft_text, '\\x41 {} \'')
+
+    def test_render(self):
+        toc = self.create()
+        default = toc.get_content()
+        toc.generate(return_content=False)
+        with redirect_stdout(StringIO()):
+            configure(templates={'heading': '${hashes} ${title}${draft}\n\n', 'draft': '', 'updated': '', 'prompt': '',
+                                 'front_matter': '---\ntitle: ${title}\n---\n\n'})
+        content = toc.get_content()
+        self.assertTrue(content.startswith('---\ntitle: Test Manuscript\n---\n\nTest Manuscript\n\n'))
+        self.assertIn('\n## Section 1.1\n\n', content)
+        self.assertNotIn('draft', content)
+        self.assertNotIn('Prompt:', content)
+        # Changed templates render the sections again.
+        path = toc.generate(return_content=False)
+        with open(path, 'r', encoding='utf-8') as file:
+            self.assertEqual(file.read(), content)
+        # A manuscript can override the configured templates, which are not saved with it.
+        toc.output_templates = OutputTemplates(draft=' [draft]')
+        self.assertIn('## 1.2. Section 1.2 [draft]', toc.get_content())
+        self.assertNotIn('output_templates', toc.__getstate__())
+        self.assertEqual(toc.generate(workers=2), toc.get_content())
+        del toc.output_templates
+        with redirect_stdout(StringIO()):
+            configure(templates=None)
+        self.assertEqual(toc.get_content(), default)
+
+    def test_generate_many(self):
+        first = self.create('First')
+        second = self.create('Second')
+        with redirect_stdout(StringIO()):
+            configure(templates={'heading': '${hashes} ${title}${draft}\n\n'})
+        second.output_templates = OutputTemplates(draft=' [draft]')
+        expected = [toc.generate() for toc in (first, second)]
+        for toc in (first, second):
+            os.remove(toc.get_filepath())
+        # Workers started with spawn do not inherit the configured templates of this process.
+        spawn = partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('spawn'))
+        with mock.patch('tocmanuscript.core.ProcessPoolExecutor', spawn):
+            paths = ToCManuscript.generate_many(['First', second], workers=2)
+        for path, content in zip(paths, expected):
+            with open(path, 'r', encoding='utf-8') as file:
+                self.assertEqual(file.read(), content)
+
+
+class TestProgress(ManuscriptTestCase):
+
+    def assertCounts(self, toc):
+        # The counters match a full scan.
+        for index, section in [((), toc)] + list(toc.iter_sections()):
+            sections = [s for i, s in toc.iter_sections(start=index or None)]
+            prompted = [s for s in sections if s.get('prompt') is not None]
+            completed = [s for s in prompted if s.get('completed')]
+            progress = toc.progress(index)
+            self.assertEqual((progress['sections'], progress['prompted_sections'], progress['completed_sections']),
+                             (len(sections), len(prompted), len(completed)), index)
+
+    def test_counters(self):
+        toc = self.create()
+        self.assertEqual(toc.progress(), {'sections': 4, 'prompted_sections': 3, 'completed_sections': 0, 'drafts': 3, 'completion': 0.0})
+        with redirect_stdout(StringIO()):
+            toc.set_content('Content 1.1', [1, 1], completed=True)
+            toc.set_section([1, 3], title='Section 1.3', prompt=Prompt(directives={'Instruction': 'Write 1.3'}))
+            toc.set_section([3, 1], title='Section 3.1', prompt=Prompt(directives={'Instruction': 'Write 3.1'}))
+        self.assertEqual(toc.progress([1])['drafts'], 2)
+        self.assertCounts(toc)
+        del toc[1][2]
+        toc[3] = ToCDict({'title': 'Chapter 3'})
+        del toc[2]['prompt']
+        self.assertEqual(toc.progress()['drafts'], 1)
+        self.assertCounts(toc)
+        with self.assertRaises(KeyError):
+            toc.progress([4])
+
+    def test_next_incomplete(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_content('Content 1.1', [1, 1], completed=True)
+        self.assertEqual(toc.find_next_incomplete_index([]), [1, 2])
+        self.assertEqual(toc.find_next_incomplete_index([1, 2]), [2])
+        self.assertEqual(toc.find_next_incomplete_index([2]), [])
+        self.assertEqual(toc._check_completion_status(), [
+            {'level_str': '1.2.', 'title': 'Section 1.2'},
+            {'level_str': '2.', 'title': 'Chapter 2'},
+        ])
+        with redirect_stdout(StringIO()):
+            toc.set_content('Content 1.2', [1, 2], completed=True)
+            toc.set_content('Content 2', [2], completed=True)
+            toc.check_complete()
+        self.assertTrue(toc.completed)
+        self.assertEqual(toc.progress()['completion'], 1.0)
+
+
+class TestOutline(ManuscriptTestCase):
+
+    def test_nested_structure(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_guidelines({'Style': 'Formal'})
+        with mock.patch.object(PickleStorage, 'save') as save:
+            count = toc.load_outline([
+                'Introduction',
+                {'title': 'Background', 'summary': 'Where it started.', 'sections': {
+                    '1': {'title': 'History', 'prompt': 'Write the history.'},
+                    '3': {'title': 'Theory', 'prompt': {'directives': {'Question': 'Why?'}}},
+                }},
+            ])
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual(count, 4)
+        self.assertEqual([(index, section['title']) for index, section in toc.iter_sections()],
+                         [((1,), 'Introduction'), ((2,), 'Background'), ((2, 1), 'History'), ((2, 3), 'Theory')])
+        self.assertTrue(toc[1]['completed'])
+        self.assertFalse(toc[2][1]['completed'])
+        self.assertEqual(toc['modified'], toc[1]['modified'])
+        self.assertEqual(toc[2]['summary'], 'Where it started.')
+        self.assertEqual(toc[2][1]['prompt'].directives, {'Instruction': 'Write the history.'})
+        self.assertIs(toc[2][3]['prompt'].guidelines, toc.guidelines)
+        self.assertIs(toc[2].guidelines, toc.guidelines)
+        self.assertEqual(toc[2][1]['created'], toc[1]['modified'])
+        self.assertIs(toc.section([2, 3]), toc[2][3])
+        self.assertEqual(toc.progress()['drafts'], 2)
+
+    def test_titles_and_files(self):
+        toc = self.create()
+        toc.load_outline({'Introduction': None, 'Background': ['History', 'Theory']})
+        self.assertEqual(toc[2][2]['title'], 'Theory')
+        path = os.path.join(self.output_dir, 'outline.md')
+        with open(path, 'w') as file:
+            file.write('# 1. Introduction\n\nSome text.\n\n# 2. Background\n## 2.1. History\n### Sources\n## Theory\n')
+        self.assertEqual(toc.load_outline(path), 5)
+        self.assertEqual(toc[2][1][1]['title'], 'Sources')
+        self.assertEqual(toc[2][2]['title'], 'Theory')
+        path = os.path.join(self.output_dir, 'outline.json')
+        with open(path, 'w') as file:
+            file.write('{"1": {"title": "Preface", "sections": ["Thanks"]}}')
+        toc.load_outline(path)
+        self.assertEqual(toc[1][1]['title'], 'Thanks')
+        with redirect_stdout(StringIO()):
+            restored = self.restore()
+        self.assertEqual(restored[1][1]['title'], 'Thanks')
+
+    def test_completed(self):
+        toc = self.create()
+        toc.load_outline([{'title': 'Introduction', 'completed': False}, {'title': 'Background', 'prompt': 'Write it.', 'completed': True}])
+        # As with set_section(), a section without a prompt is completed.
+        self.assertTrue(toc[1]['completed'])
+        self.assertTrue(toc[2]['completed'])
+        self.assertEqual(toc.progress()['drafts'], 0)
+
+    def test_validation(self):
+        toc = self.create()
+        with self.assertRaises(ValueError) as context:
+            toc.load_outline(['Introduction', {'sections': [{'title': ''}]}, {'title': 'Theory', 'prompt': 5}])
+        message = str(context.exception)
+        self.assertIn('Section 2.: Title must be given.', message)
+        self.assertIn('Section 2.1.: Title must be given.', message)
+        self.assertIn('Section 3.: Prompt must be', message)
+        # Nothing was set.
+        self.assertEqual(toc[1]['title'], 'Chapter 1')
+        with self.assertRaises(ValueError) as context:
+            toc.load_outline({1: 'Introduction', '1': 'Preface', '2': {'title': 'Background', 'sections': {'1': 'History', 'Theory': None}}})
+        message = str(context.exception)
+        self.assertIn("Section 1.: The keys 1, '1' number the same section.", message)
+        self.assertIn('Section 2.: Sections must be numbered by their keys or have their titles as keys, not both.', message)
+        with self.assertRaises(ValueError):
+            toc.load_outline('# Introduction\n### Too deep')
+        with self.assertRaises(ValueError):
+            toc.load_outline('No headings')
+
+
+class TestStructuralEdits(ManuscriptTestCase):
+
+    def create(self, title='Test Manuscript'):
+        toc = super().create(title)
+        toc.load_outline({3: 'Chapter 3', 4: {'title': 'Chapter 4', 'sections': ['Section 4.1', 'Section 4.2']}})
+        return toc
+
+    def titles(self, toc):
+        return [(index, section['title']) for index, section in toc.iter_sections()]
+
+    def assertIndexed(self, toc):
+        # The incrementally updated index matches a rebuilt one.
+        index, links, counts = dict(toc._section_index), dict(toc._next_section), toc.progress()
+        del toc._section_index
+        toc._get_section_index()
+        self.assertEqual(index, toc._section_index)
+        self.assertEqual(links, toc._next_section)
+        self.assertEqual(counts, toc.progress())
+        for path, section in toc.iter_sections():
+            self.assertEqual(section._path, path)
+
+    def test_insert_and_delete(self):
+        toc = self.create()
+        toc.section(())
+        toc.currently_editing_index = [4, 2]
+        with mock.patch.object(PickleStorage, 'save') as save:
+            self.assertEqual(toc.insert_section([2], title='Interlude'), [2])
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual([title for index, title in self.titles(toc) if len(index) == 1], ['Chapter 1', 'Interlude', 'Chapter 2', 'Chapter 3', 'Chapter 4'])
+        self.assertEqual(toc.currently_editing_index, [5, 2])
+        self.assertEqual(toc[5][2]['title'], 'Section 4.2')
+        self.assertTrue(toc[2]['completed'])
+        self.assertIndexed(toc)
+        with self.assertRaises(ValueError):
+            toc.insert_section([1, 1])
+        removed = toc.delete_section([5, 2])
+        self.assertEqual(removed['title'], 'Section 4.2')
+        self.assertEqual(toc.currently_editing_index, [5, 1])
+        toc.delete_section([1, 1])
+        self.assertEqual(toc[1][1]['title'], 'Section 1.2')
+        toc.delete_section([2], shift=False)
+        self.assertNotIn(2, toc)
+        self.assertIndexed(toc)
+        with self.assertRaises(KeyError):
+            toc.delete_section([9])
+
+    def test_move_and_renumber(self):
+        toc = self.create()
+        toc.currently_editing_index = [1, 2]
+        toc.first_index = [1]
+        toc.move_section([1], [4])
+        self.assertEqual([title for index, title in self.titles(toc) if len(index) == 1], ['Chapter 2', 'Chapter 3', 'Chapter 4', 'Chapter 1'])
+        self.assertEqual(toc.currently_editing_index, [4, 2])
+        self.assertEqual(toc.first_index, [4])
+        toc.move_section([4, 2], [3, 1])
+        self.assertEqual([title for index, title in self.titles(toc) if index[:1] == (3,)], ['Chapter 4', 'Section 1.2', 'Section 4.1', 'Section 4.2'])
+        self.assertEqual(toc.currently_editing_index, [3, 1])
+        self.assertIndexed(toc)
+        # The new index is given after the removal, when chapter 4 is the last one.
+        with self.assertRaises(KeyError):
+            toc.move_section([3], [4, 1])
+        toc.delete_section([2], shift=False)
+        toc.move_section([3, 3], [3, 7])
+        self.assertEqual(toc.renumber(), 3)
+        self.assertEqual(self.titles(toc), [((1,), 'Chapter 2'), ((2,), 'Chapter 4'), ((2, 1), 'Section 1.2'), ((2, 2), 'Section 4.1'),
+                                            ((2, 3), 'Section 4.2'), ((3,), 'Chapter 1'), ((3, 1), 'Section 1.1')])
+        self.assertEqual(toc.currently_editing_index, [2, 1])
+        self.assertIndexed(toc)
+
+    def test_persistence(self):
+        for storage in ('journal', 'sqlite'):
+            with redirect_stdout(StringIO()):
+                configure(storage=storage)
+            toc = self.create(title=storage)
+            with redirect_stdout(StringIO()):
+                toc.set_content('Content 4.2', [4, 2])
+                toc.insert_section([1], title='Preface')
+                toc.move_section([5, 2], [2, 1])
+                toc.delete_section([4])
+                toc.set_content('Content 4.1', [4, 1])
+                restored = self.restore(title=storage)
+            self.assertEqual(self.titles(restored), self.titles(toc))
+            self.assertEqual(restored[2][1]['content'], 'Content 4.2')
+            self.assertEqual(restored[4][1]['content'], 'Content 4.1')
+
+
+class TestPromptDefinitions(ManuscriptTestCase):
+
+    def guidelines(self):
+        return {'N-Shot Learning': 'Example: ' * 100, 'Style': 'Formal'}
+
+    def create(self, title='Test Manuscript'):
+        with redirect_stdout(StringIO()):
+            toc = ToCManuscript(title=title)
+            for key in range(1, 4):
+                toc.set_section([key], title=f'Chapter {key}', prompt=Prompt(directives={'Instruction': 'Write'}, guidelines=self.guidelines()))
+                toc.set_section([key, 1], title=f'Section {key}.1', prompt=Prompt(directives={'Instruction': f'Write {key}.1'}, guidelines=self.guidelines()))
+        return toc
+
+    def assertShared(self, toc):
+        guidelines = toc[1]['prompt'].guidelines
+        self.assertEqual(guidelines, self.guidelines())
+        for path in ([2], [3], [1, 1], [3, 1]):
+            self.assertIs(toc.section(path)['prompt'].guidelines, guidelines)
+        self.assertIs(toc[1]['prompt'].directives, toc[2]['prompt'].directives)
+        self.assertIsNot(toc[1][1]['prompt'].directives, toc[2][1]['prompt'].directives)
+
+    def test_intern(self):
+        toc = self.create()
+        self.assertShared(toc)
+        guidelines = toc[1]['prompt'].guidelines
+        self.assertIs(prompt_definitions.intern(self.guidelines()), guidelines)
+        self.assertIs(prompt_definitions.get(guidelines.id), guidelines)
+        self.assertEqual(prompt_definitions.key({'b': 1, 'a': 2}), prompt_definitions.key({'a': 2, 'b': 1}))
+        toc[1]['prompt'].guidelines = {'Style': 'Casual'}
+        self.assertEqual(toc[2]['prompt'].guidelines['Style'], 'Formal')
+        # Empty definitions are not interned.
+        self.assertEqual(Prompt().guidelines, {})
+
+    def test_edit_in_place(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_guidelines({'Style': 'Formal'})
+            toc.set_section([4], title='Chapter 4', prompt=Prompt(directives={'Instruction': 'Write 4'}))
+        toc.get_guidelines()['Tone'] = 'Light'
+        # Sections and prompts sharing the manuscript's guidelines see the change.
+        self.assertEqual(toc[4].guidelines, {'Style': 'Formal', 'Tone': 'Light'})
+        self.assertIs(toc[4]['prompt'].guidelines, toc.guidelines)
+        self.assertIs(prompt_definitions.intern({'Style': 'Formal', 'Tone': 'Light'}), toc.guidelines)
+        self.assertIsNot(prompt_definitions.intern({'Style': 'Formal'}), toc.guidelines)
+        guidelines = toc[1]['prompt'].guidelines
+        guidelines['Style'] = 'Casual'
+        del toc[2][1]['prompt'].guidelines['N-Shot Learning']
+        self.assertEqual(toc[3]['prompt'].guidelines, {'Style': 'Casual'})
+        self.assertEqual(guidelines.id, prompt_definitions.key({'Style': 'Casual'}))
+        toc[1]['prompt'].guidelines.update({'Format': 'Essay'})
+        self.assertEqual(toc[1][1]['prompt'].guidelines, {'Style': 'Casual', 'Format': 'Essay'})
+        # A new dictionary changes one prompt only.
+        toc[1]['prompt'].guidelines = {'Style': 'Formal'}
+        self.assertEqual(toc[2]['prompt'].guidelines, {'Style': 'Casual', 'Format': 'Essay'})
+
+    def test_edit_in_place_persistence(self):
+        for storage in ('sqlite', 'journal', 'json'):
+            with self.subTest(storage=storage), redirect_stdout(StringIO()):
+                configure(storage=storage)
+                title = f'Edits {storage}'
+                toc = self.create(title)
+                toc.set_content('Content 1.1', [1, 1], completed=True)
+                toc[1]['prompt'].guidelines['Style'] = 'Casual'
+                toc.set_content('Content 2.1', [2, 1], completed=True)
+                restored = self.restore(title)
+                self.assertEqual(restored[3][1]['prompt'].guidelines['Style'], 'Casual')
+                self.assertEqual(restored[2][1]['content'], 'Content 2.1')
+        storages['sqlite'].close()
+
+    def test_pickle_once(self):
+        toc = self.create()
+        data = pickle.dumps(toc)
+        self.assertEqual(data.count(b'Example: ' * 100), 1)
+        self.assertShared(pickle.loads(data))
+
+    def test_persistence(self):
+        for storage in ('json', 'sqlite', 'sharded', 'journal'):
+            with self.subTest(storage=storage), redirect_stdout(StringIO()):
+                configure(storage=storage)
+                title = f'Definitions {storage}'
+                toc = self.create(title)
+                toc.set_content('Content 1.1', [1, 1], completed=True)
+                toc.pickle()
+                if storage == 'json':
+                    with open(storages['json'].get_location(toc), 'rb') as file:
+                        self.assertEqual(file.read().count(b'Example: ' * 100), 1)
+                self.assertShared(self.restore(title))
+        storages['sqlite'].close()
+
+
+class TestCursors(ManuscriptTestCase):
+
+    def create(self, title='Test Manuscript'):
+        toc = super().create(title)
+        with redirect_stdout(StringIO()):
+            toc.set_section([2, 1], title='Section 2.1', prompt=Prompt(directives={'Instruction': 'Write 2.1'}))
+        return toc
+
+    def test_claims(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            first, second = toc.cursor('first'), toc.cursor('second')
+            chapter = toc.cursor('chapter', subtree=[2])
+            self.assertEqual(first.move_next(), [1, 1])
+            self.assertEqual(second.move_next(), [1, 2])
+            self.assertEqual(chapter.move_next(), [2])
+            self.assertEqual(first.move_next(), [2, 1])
+            # The only section left in the subtree is handed out again.
+            self.assertEqual(chapter.move_next(), [2])
+            self.assertEqual(first.get_prompt().directives, {'Instruction': 'Write 2.1'})
+            first.set_content('Content 2.1', completed=True)
+            chapter.set_content('Content 2', completed=True)
+            self.assertEqual(chapter.move_next(), [])
+            with self.assertRaises(ValueError):
+                chapter.set_content('Content')
+            second.release()
+            self.assertEqual(first.move_next(), [1, 1])
+            self.assertEqual(toc.currently_editing_index, [])
+        self.assertTrue(toc[2][1]['completed'])
+
+    def test_lease(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            first, second = toc.cursor('first', lease=10), toc.cursor('second')
+            self.assertEqual(first.move_next(), [1, 1])
+            with mock.patch('tocmanuscript.Cursor.time.time', return_value=time.time() + 20), \
+                    mock.patch('tocmanuscript.core.time.time', return_value=time.time() + 20):
+                self.assertTrue(first.holds())
+                self.assertEqual(second.move_next(), [1, 1])
+                self.assertFalse(first.holds())
+                with self.assertRaises(ValueError):
+                    first.set_content('Content 1.1')
+
+    def test_structure_and_restore(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            cursor = toc.cursor('worker', subtree=[2])
+            cursor.move_next()
+            cursor.move_next()
+            toc.insert_section([1], title='Preface')
+            self.assertEqual((cursor.subtree, cursor.index), ([3], [3, 1]))
+            toc.move_section([3], [1])
+            self.assertEqual((cursor.subtree, cursor.index), ([1], [1, 1]))
+            cursor.set_summary('Summary')
+        restored = self.restore()
+        cursor = restored.cursor('worker')
+        self.assertEqual((cursor.subtree, cursor.index), ([1], [1, 1]))
+        self.assertTrue(cursor.holds())
+        self.assertEqual(restored.section(cursor.index)['summary'], 'Summary')
+
+    def test_workers(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            for key in range(3, 9):
+                toc.set_section([key], title=f'Chapter {key}', prompt=Prompt(directives={'Instruction': f'Write {key}'}))
+        written = []
+
+        def work(name):
+            cursor = toc.cursor(name)
+            while cursor.move_next():
+                written.append(tuple(cursor.index))
+                cursor.set_content(f'Written by {name}', completed=True)
+
+        with redirect_stdout(StringIO()):
+            threads = [threading.Thread(target=work, args=(f'worker-{number}',)) for number in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(sorted(written), sorted(set(written)))
+        self.assertEqual(toc.progress()['drafts'], 0)
+
+
+class TestJournalStorage(ManuscriptTestCase):
+    storage = 'journal'
+
+    def journal_path(self, toc):
+        return os.path.join(self.output_dir, f'{toc.safe_title}.journal')
+
+    def test_changes_are_appended_to_journal(self):
+        toc = self.create()
+        snapshot = os.path.join(self.output_dir, f'{toc.safe_title}.pkl')
+        mtime = os.path.getmtime(snapshot)
+        with redirect_stdout(StringIO()):
+            toc.move_to_next_section()
+            toc.set_content('Content 1', [1])
+            toc.set_summary('Summary 1', [1])
+        self.assertTrue(os.path.exists(self.journal_path(toc)))
+        self.assertEqual(os.path.getmtime(snapshot), mtime)
+        restored = self.restore()
+        self.assertEqual(restored[1]['content'], 'Content 1')
+        self.assertEqual(restored[1]['summary'], 'Summary 1')
+        self.assertEqual(restored[1][1]['title'], 'Section 1.1')
+        self.assertEqual(restored.currently_editing_index, [1])
+        self.assertEqual(restored.first_index, [1])
+
+    def test_compaction_on_threshold(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            configure(journal_max_bytes=100)
+            try:
+                toc.set_content('x' * 200, [2], completed=True)
+            finally:
+                configure(journal_max_bytes=1024 * 1024)
+        self.assertFalse(os.path.exists(self.journal_path(toc)))
+        self.assertEqual(self.restore()[2]['content'], 'x' * 200)
+
+    def test_explicit_pickle_writes_snapshot(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_content('Content 2', [2])
+        self.assertTrue(os.path.exists(self.journal_path(toc)))
+        toc.compact()
+        self.assertFalse(os.path.exists(self.journal_path(toc)))
+        self.assertEqual(self.restore()[2]['content'], 'Content 2')
+
+    def test_incomplete_journal_tail_is_ignored(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_content('Content 2', [2])
+        with open(self.journal_path(toc), 'ab') as file:
+            file.write(b'\x80\x04\x95')
+        self.assertEqual(self.restore()[2]['content'], 'Content 2')
+
+    def test_journal_is_replayed_by_pickle_storage(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_content('Content 2', [2])
+            configure(storage='pickle')
+        self.assertEqual(self.restore()[2]['content'], 'Content 2')
+
+    def test_direct_node_edits(self):
+        toc = self.create()
+        snapshot = os.path.join(self.output_dir, f'{toc.safe_title}.pkl')
+        mtime = os.path.getmtime(snapshot)
+        with redirect_stdout(StringIO()):
+            toc[1][1]['title'] = 'Renamed 1.1'
+            toc[1][3] = ToCDict({'title': 'Section 1.3'})
+            del toc[1][2]
+            toc.set_content('Content 2', [2])
+        self.assertEqual(os.path.getmtime(snapshot), mtime)
+        restored = self.restore()
+        self.assertEqual(restored[1][1]['title'], 'Renamed 1.1')
+        self.assertEqual(restored[1][3]['title'], 'Section 1.3')
+        self.assertNotIn(2, restored[1])
+        self.assertEqual(restored[2]['content'], 'Content 2')
+
+    def test_untracked_edits_write_snapshot(self):
+        with redirect_stdout(StringIO()):
+            configure(storage='pickle')
+        self.create()
+        toc = self.restore()
+        with redirect_stdout(StringIO()):
+            configure(storage='journal', journal_ratio=100)
+            try:
+                # Not recorded, as the sections are not attached to the section index yet.
+                toc[1][1]['title'] = 'Renamed 1.1'
+                toc.set_content('Content 2', [2])
+                self.assertFalse(os.path.exists(self.journal_path(toc)))
+                toc.set_content('Content 1', [1])
+                self.assertTrue(os.path.exists(self.journal_path(toc)))
+            finally:
+                configure(journal_ratio=0.5)
+        restored = self.restore()
+        self.assertEqual(restored[1][1]['title'], 'Renamed 1.1')
+        self.assertEqual(restored[2]['content'], 'Content 2')
+
+
+class TestShardedStorage(ManuscriptTestCase):
+    storage = 'sharded'
+
+    def shards(self, toc):
+        directory = os.path.join(self.output_dir, f'{toc.safe_title}.shards')
+        return sorted(name for name in os.listdir(directory) if name.endswith('.txt'))
+
+    def test_restore(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_content('Content 1.1', [1, 1], completed=True)
+            toc.set_summary('Summary 1.1', [1, 1])
+            toc.move_to_next_section()
+        restored = self.restore()
+        self.assertEqual(restored[1][1]['content'], 'Content 1.1')
+        self.assertEqual(restored[1][1]['summary'], 'Summary 1.1')
+        self.assertEqual(restored[1][2]['prompt'].directives, {'Instruction': 'Write 1.2'})
+        self.assertEqual(restored.currently_editing_index, [1])
+        self.assertEqual(list(restored[1].keys()), list(toc[1].keys()))
+
+    def test_only_changed_texts_are_written(self):
+        toc = self.create()
+        with toc.batch():
+            toc.set_content('Content 1.1', [1, 1])
+            toc.set_content('Content 1.2', [1, 2])
+        self.assertEqual(len(self.shards(toc)), 2)
+        with mock.patch.object(ShardedStorage, '_write_atomic', autospec=True, side_effect=ShardedStorage._write_atomic) as write:
+            toc.set_content('Content 2', [2])
+        written = [os.path.basename(call.args[1]) for call in write.call_args_list]
+        self.assertEqual(len(written), 2)
+        self.assertIn('manifest.pkl', written)
+
+    def test_replaced_texts_are_removed(self):
+        toc = self.create()
+        toc.set_content('Old content', [2])
+        toc.set_content('New content', [2])
+        self.assertEqual(len(self.shards(toc)), 1)
+        self.assertEqual(self.restore()[2]['content'], 'New content')
+
+    def test_pickle_state_is_migrated(self):
+        with redirect_stdout(StringIO()):
+            configure(storage='pickle')
+        toc = self.create()
+        toc.set_content('Content 2', [2])
+        with redirect_stdout(StringIO()):
+            configure(storage='sharded')
+        restored = self.restore()
+        self.assertEqual(restored[2]['content'], 'Content 2')
+        restored.pickle()
+        self.assertEqual(len(self.shards(restored)), 1)
+
+
+class TestSQLiteStorage(ManuscriptTestCase):
+    storage = 'sqlite'
+
+    def tearDown(self):
+        storages['sqlite'].close()
+        super().tearDown()
+
+    def test_restore(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_guidelines({'Style': 'Formal'})
+            toc.set_section([3], title='Chapter 3', prompt=Prompt(directives={'Instruction': 'Write 3'}))
+            toc.set_content('Content 1.1', [1, 1], completed=True)
+            toc.set_summary('Summary 1.1', [1, 1])
+            toc.move_to_next_section()
+        restored = self.restore()
+        self.assertEqual(list(restored.keys()), list(toc.keys()))
+        self.assertEqual(list(restored[1][1].keys()), list(toc[1][1].keys()))
+        self.assertEqual(restored[1][1]['content'], 'Content 1.1')
+        self.assertEqual(restored[1][1]['summary'], 'Summary 1.1')
+        self.assertTrue(restored[1][1]['completed'])
+        self.assertEqual(restored[1][1]['modified'], toc[1][1]['modified'])
+        self.assertEqual(restored[1][2]['prompt'].directives, {'Instruction': 'Write 1.2'})
+        self.assertIs(restored[3]['prompt'].guidelines, restored.guidelines)
+        self.assertEqual(restored.guidelines, {'Style': 'Formal'})
+        self.assertEqual(restored.currently_editing_index, [1])
+
+    def test_changes_update_single_rows(self):
+        toc = self.create()
+        with mock.patch.object(SQLiteStorage, '_write_all', autospec=True) as write_all:
+            with mock.patch.object(SQLiteStorage, '_write_section', autospec=True, side_effect=SQLiteStorage._write_section) as write_section:
+                toc.set_content('Content 1.2', [1, 2], completed=True)
+        self.assertEqual(write_all.call_count, 0)
+        self.assertEqual([call.args[3] for call in write_section.call_args_list], [(1, 2)])
+        self.assertEqual(self.restore()[1][2]['content'], 'Content 1.2')
+
+    def test_shared_database(self):
+        self.create('First Manuscript')
+        second = self.create('Second Manuscript')
+        second.set_content('Second content', [2])
+        self.assertEqual([name for name in os.listdir(self.output_dir) if not name.startswith(('manuscripts.sqlite3', 'registry.sqlite3'))], [])
+        self.assertEqual(self.restore('First Manuscript')[1][1]['title'], 'Section 1.1')
+        self.assertEqual(self.restore('Second Manuscript')[2]['content'], 'Second content')
+
+    def test_incomplete_sections_query(self):
+        toc = self.create()
+        toc.set_content('Content 1.1', [1, 1], completed=True)
+        self.assertEqual(storages['sqlite'].incomplete_sections(toc), [
+            {'level_str': '1.2.', 'title': 'Section 1.2'},
+            {'level_str': '2.', 'title': 'Chapter 2'},
+        ])
+        self.assertEqual(storages['sqlite'].incomplete_sections(toc), toc._check_completion_status())
+
+    def test_sort_key_order(self):
+        with redirect_stdout(StringIO()):
+            toc = ToCManuscript(title='Test Manuscript')
+            for path in ([10], [9], [-1], [-10], [0], [10 ** 8], [10 ** 20], [10, 10], [10, 9], [10, -2],
+                         [10, 10, 10], [10, 10, 9], [9, 10 ** 9], [9, 99999999]):
+                toc.set_section(path, title='.'.join(map(str, path)), prompt=Prompt(directives={'Instruction': 'Write'}))
+            toc.pickle()
+        expected = ['-10', '-1', '0', '9', '9.99999999', '9.1000000000', '10', '10.-2', '10.9', '10.10', '10.10.9', '10.10.10', '100000000', str(10 ** 20)]
+        self.assertEqual([section['title'] for section in storages['sqlite'].incomplete_sections(toc)], expected)
+        self.assertEqual(storages['sqlite'].incomplete_sections(toc), toc._check_completion_status())
+
+    def test_upgrade_sort_keys(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_section([10], title='Chapter 10', prompt=Prompt(directives={'Instruction': 'Write 10'}))
+        # The zero-padded sort keys and the layout version of older databases.
+        connection = storages['sqlite'].connect(toc)
+        with connection:
+            for path, in connection.execute('SELECT path FROM sections').fetchall():
+                connection.execute('UPDATE sections SET sort_key = ? WHERE path = ?', ('.'.join(f'{int(key):08d}' for key in path.split('.')), path))
+            connection.execute('PRAGMA user_version = 0')
+        storages['sqlite'].close()
+        self.assertEqual(storages['sqlite'].incomplete_sections(toc), toc._check_completion_status())
+        self.assertEqual(storages['sqlite'].connect(toc).execute('PRAGMA user_version').fetchone()[0], 1)
+
+    def test_direct_node_edits(self):
+        toc = self.create()
+        with mock.patch.object(SQLiteStorage, '_write_all', autospec=True) as write_all:
+            toc[1][1]['title'] = 'Renamed 1.1'
+            toc[1][3] = ToCDict({'title': 'Section 1.3'})
+            del toc[1][2]
+            del toc[2]
+            toc.pickle()
+        self.assertEqual(write_all.call_count, 0)
+        # The rows of the removed sections are gone too.
+        self.assertEqual(storages['sqlite'].incomplete_sections(toc), [{'level_str': '1.1.', 'title': 'Renamed 1.1'}])
+        restored = self.restore()
+        self.assertEqual(restored[1][1]['title'], 'Renamed 1.1')
+        self.assertEqual(restored[1][3]['title'], 'Section 1.3')
+        self.assertEqual(list(restored[1].children()), [1, 3])
+        self.assertEqual(list(restored.children()), [1])
+
+    def test_replaced_manuscript_definitions(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_guidelines({'Style': 'Formal'})
+            toc.set_section([3], title='Chapter 3', prompt=Prompt(directives={'Instruction': 'Write 3'}))
+            toc.set_guidelines({'Style': 'Casual'})
+        restored = self.restore()
+        self.assertEqual(restored[3]['prompt'].guidelines, {'Style': 'Formal'})
+        self.assertEqual(restored[3].guidelines, {'Style': 'Formal'})
+        self.assertEqual(restored.guidelines, {'Style': 'Casual'})
+
+
+class TestLazyRestore(ManuscriptTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with redirect_stdout(StringIO()):
+            configure(lazy_restore=True)
+
+    def tearDown(self):
+        storages['sqlite'].close()
+        with redirect_stdout(StringIO()):
+            configure(lazy_restore=False)
+        super().tearDown()
+
+    def check_lazy_restore(self):
+        toc = self.create()
+        with toc.batch():
+            toc.set_content('Content 1.1', [1, 1], completed=True)
+            toc.set_content('Content 2', [2])
+            toc.set_summary('Summary 2', [2])
+        restored = self.restore()
+        self.assertIs(type(dict.__getitem__(restored[1][1], 'content')), LazyText)
+        self.assertEqual(restored[1][1]['title'], 'Section 1.1')
+        self.assertTrue(restored[1][1]['completed'])
+        self.assertEqual(restored[2].get('summary'), 'Summary 2')
+        self.assertIs(type(dict.__getitem__(restored[2], 'summary')), str)
+        restored.set_content('Content 1.2', [1, 2])
+        restored.pickle()
+        restored = self.restore()
+        self.assertEqual(restored[1][1]['content'], 'Content 1.1')
+        self.assertEqual(restored[2]['content'], 'Content 2')
+        self.assertEqual(restored[1][2]['content'], 'Content 1.2')
+
+    def test_sharded(self):
+        with redirect_stdout(StringIO()):
+            configure(storage='sharded')
+        self.check_lazy_restore()
+
+    def test_sqlite(self):
+        with redirect_stdout(StringIO()):
+            configure(storage='sqlite')
+        self.check_lazy_restore()
+
+    def check_word_counts(self):
+        toc = self.create()
+        with toc.batch():
+            toc.set_content('One two three', [1, 1])
+            toc.set_content('Four five', [2])
+        restored = self.restore()
+        with mock.patch.object(LazyText, 'load', autospec=True, side_effect=LazyText.load) as load:
+            restored.set_content('Six', [1, 2])
+        self.assertEqual(load.call_count, 0)
+        self.assertEqual(ToCManuscript.list()[0]['words'], 6)
+        # The counts were saved with the sections.
+        restored = self.restore()
+        with redirect_stdout(StringIO()), mock.patch.object(LazyText, 'load', autospec=True, side_effect=LazyText.load) as load:
+            restored.move_to_next_section()
+        self.assertEqual(load.call_count, 0)
+        self.assertEqual(ToCManuscript.list()[0]['words'], 6)
+
+    def test_word_counts_sharded(self):
+        with redirect_stdout(StringIO()):
+            configure(storage='sharded')
+        self.check_word_counts()
+
+    def test_word_counts_sqlite(self):
+        with redirect_stdout(StringIO()):
+            configure(storage='sqlite')
+        self.check_word_counts()
+
+    def test_sqlite_structural_edits(self):
+        with redirect_stdout(StringIO()):
+            configure(storage='sqlite')
+        toc = self.create()
+        with toc.batch():
+            toc.set_section([2, 1], title='Section 2.1')
+            toc.set_content('Content 1.1', [1, 1])
+            toc.set_content('Content 1.2', [1, 2])
+            toc.set_content('Content 2.1', [2, 1])
+        restored = self.restore()
+        with redirect_stdout(StringIO()):
+            restored.move_section([1, 1], [2, 1])
+        restored = self.restore()
+        self.assertEqual([restored[1][1]['content'], restored[2][1]['content'], restored[2][2]['content']],
+                         ['Content 1.2', 'Content 1.1', 'Content 2.1'])
+        with redirect_stdout(StringIO()):
+            with restored.batch():
+                restored.move_section([2, 2], [1, 1])
+                restored.insert_section([2, 1], title='Inserted 2.1')
+        restored = self.restore()
+        self.assertEqual([restored[1][1]['content'], restored[1][2]['content'], restored[2][2]['content']],
+                         ['Content 2.1', 'Content 1.2', 'Content 1.1'])
+        self.assertNotIn('content', restored[2][1])
+
+    def test_pickled_as_text(self):
+        with redirect_stdout(StringIO()):
+            configure(storage='sharded')
+        self.check_lazy_restore()
+        restored = self.restore()
+        with redirect_stdout(StringIO()):
+            configure(storage='pickle')
+        restored.pickle()
+        with redirect_stdout(StringIO()):
+            configure(lazy_restore=False)
+        restored = self.restore()
+        self.assertIs(type(dict.__getitem__(restored[2], 'content')), str)
+        self.assertEqual(restored[2]['content'], 'Content 2')
+
+
+class TestCompression(ManuscriptTestCase):
+
+    def tearDown(self):
+        with redirect_stdout(StringIO()):
+            configure(compression=None, compression_cache_size=256)
+        super().tearDown()
+
+    def write(self, toc, text):
+        with toc.batch():
+            toc.set_content(text, [1, 1], completed=True)
+            toc.set_summary('A short summary.', [1, 1])
+
+    def test_compressed_snapshot(self):
+        text = 'The experiment went on through the night. ' * 200
+        toc = self.create()
+        self.write(toc, text)
+        path = os.path.join(self.output_dir, f'{toc.safe_title}.pkl')
+        plain = os.path.getsize(path)
+        for method in ('zlib', 'lzma'):
+            with redirect_stdout(StringIO()):
+                configure(compression=method, compression_level=6)
+            toc.pickle()
+            self.assertLess(os.path.getsize(path), plain / 2)
+            restored = self.restore()
+            value = dict.__getitem__(restored[1][1], 'content')
+            self.assertIs(type(value), CompressedText)
+            self.assertEqual(value.method, method)
+            self.assertEqual(restored[1][1]['content'], text)
+            # Texts that do not get smaller are stored as they are.
+            self.assertIs(type(dict.__getitem__(restored[1][1], 'summary')), str)
+
+    def test_texts_stay_compressed_in_memory(self):
+        with redirect_stdout(StringIO()):
+            configure(compression='zlib', compression_cache_size=1)
+        toc = self.create()
+        self.write(toc, 'Content 1.1 ' * 100)
+        with toc.batch():
+            toc.set_content('Content 2 ' * 100, [2])
+        restored = self.restore()
+        first = restored[1][1]['content']
+        self.assertEqual(restored[2]['content'], 'Content 2 ' * 100)
+        self.assertEqual(len(cache._texts), 1)
+        self.assertEqual(restored[1][1]['content'], first)
+        # Unchanged texts are pickled without compressing them again.
+        with mock.patch.object(TextCompressor, 'compress') as compress:
+            restored.pickle()
+        compress.assert_not_called()
+        restored[1][1]['content'] = 'New content'
+        self.assertIs(type(dict.__getitem__(restored[1][1], 'content')), str)
+
+    def test_dictionary(self):
+        with redirect_stdout(StringIO()):
+            configure(compression='zlib', compression_dictionary=True)
+        toc = self.create()
+        with toc.batch():
+            toc.set_section([3], title='Chapter 3')
+            for index in range(1, 101):
+                toc.set_section([3, index], title=f'Section 3.{index}', prompt=Prompt(directives={}))
+                toc.set_content(f'Dr. Ellis recorded the readings of the quantum field generator at hour {index}. ' * 3, [3, index])
+        restored = self.restore()
+        first = dict.__getitem__(restored[3][1], 'content')
+        self.assertTrue(first.zdict)
+        self.assertEqual(restored[3][50]['content'], f'Dr. Ellis recorded the readings of the quantum field generator at hour 50. ' * 3)
+        restored.set_content('Dr. Ellis recorded the readings of the quantum field generator again. ' * 3, [3, 100])
+        restored.pickle()
+        restored = self.restore()
+        self.assertIs(dict.__getitem__(restored[3][100], 'content').zdict, dict.__getitem__(restored[3][1], 'content').zdict)
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            configure(compression='bz2')
+        with self.assertRaises(ValueError):
+            configure(compression='lzma', compression_dictionary=True)
+
+
+class TestJSONStorage(ManuscriptTestCase):
+    storage = 'json'
+
+    def test_restore(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_guidelines({'Style': 'Formal'})
+            toc.set_section([3], title='Chapter 3', prompt=Prompt(directives={'Instruction': 'Write 3'}))
+            toc.set_content('Content 1.1', [1, 1], completed=True)
+            toc.move_to_next_section()
+        toc.set_schema(StorySchema())
+        toc.schema.add_character('Alice', {'Role': 'Protagonist', 'Traits': ['Brave']})
+        toc.pickle()
+        restored = self.restore()
+        self.assertEqual(restored.get_content(), toc.get_content())
+        self.assertEqual(list(restored[1][1].keys()), list(toc[1][1].keys()))
+        self.assertEqual(restored[1][1]['modified'], toc[1][1]['modified'])
+        self.assertIs(restored[3]['prompt'].guidelines, restored.guidelines)
+        self.assertEqual(restored.currently_editing_index, [1])
+        self.assertIsInstance(restored.schema, StorySchema)
+        self.assertEqual(restored.schema.get_character('Alice'), {'Role': 'Protagonist', 'Traits': ['Brave']})
+
+    def test_schema_plural_names(self):
+        toc = self.create()
+        toc.set_schema(Schema({'Phenomenon': [{'Name': 'String'}]}, {'Phenomenon': 'Phenomena'}))
+        toc.schema.add_phenomenon(None, {'Name': 'Warp'})
+        toc.pickle()
+        self.assertEqual(self.restore().schema.get_phenomena(), [{'Name': 'Warp'}])
+
+    def test_migrate_pickle(self):
+        with redirect_stdout(StringIO()):
+            configure(storage='pickle')
+        toc = self.create()
+        toc.set_content('Content 2', [2])
+        path = os.path.join(self.output_dir, f'{toc.safe_title}.pkl')
+        self.assertEqual(migrate(path), os.path.splitext(path)[0] + '.json')
+        os.remove(path)
+        with redirect_stdout(StringIO()):
+            configure(storage='json')
+        self.assertEqual(self.restore().get_content(), toc.get_content())
+
+    def test_pickle_is_not_read_when_disallowed(self):
+        with redirect_stdout(StringIO()):
+            configure(storage='pickle')
+        self.create()
+        with redirect_stdout(StringIO()):
+            configure(storage='json', allow_pickle=False)
+        try:
+            self.assertNotIn(1, self.restore())
+        finally:
+            with redirect_stdout(StringIO()):
+                configure(allow_pickle=False)
+
+    def test_pickle_is_not_read_by_default(self):
+        self.assertFalse(storages['json'].allow_pickle)
+        with redirect_stdout(StringIO()):
+            configure(storage='pickle')
+        self.create()
+        with redirect_stdout(StringIO()):
+            configure(storage='json')
+        with mock.patch('pickle.load', side_effect=AssertionError('unpickled')), mock.patch('pickle.loads', side_effect=AssertionError('unpickled')):
+            restored = self.restore()
+        self.assertNotIn(1, restored)
+        self.assertEqual(storages['json'].get_location(restored), os.path.join(self.output_dir, f'{restored.safe_title}.json'))
+
+    def test_allow_pickle(self):
+        with redirect_stdout(StringIO()):
+            configure(storage='pickle')
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            configure(storage='json', allow_pickle=True)
+        try:
+            restored = self.restore()
+            self.assertEqual(restored.get_content(), toc.get_content())
+            restored.pickle()
+            self.assertTrue(os.path.exists(os.path.join(self.output_dir, f'{toc.safe_title}.json')))
+        finally:
+            with redirect_stdout(StringIO()):
+                configure(allow_pickle=False)
+
+
+class TestRegistry(ManuscriptTestCase):
+
+    def test_list(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_content('One two three', [1, 1], completed=True)
+            toc.set_content('Four five', [2])
+        self.create('Another Manuscript')
+        rows = ToCManuscript.list()
+        self.assertEqual([row['title'] for row in rows], ['Another Manuscript', 'Test Manuscript'])
+        row = rows[1]
+        self.assertEqual(row['safe_title'], 'Test_Manuscript')
+        self.assertEqual(row['storage'], 'pickle')
+        self.assertEqual(row['path'], os.path.join(self.output_dir, 'Test_Manuscript.pkl'))
+        self.assertEqual((row['sections'], row['prompted_sections'], row['completed_sections']), (4, 3, 1))
+        self.assertAlmostEqual(row['completion'], 1 / 3)
+        self.assertEqual(row['words'], 5)
+        self.assertEqual(row['size'], os.path.getsize(row['path']))
+        self.assertEqual(ToCManuscript.list(os.path.join(self.output_dir, 'missing')), [])
+
+    def test_list_sqlite(self):
+        with redirect_stdout(StringIO()):
+            configure(storage='sqlite')
+        try:
+            toc = self.create()
+            with redirect_stdout(StringIO()):
+                toc.set_content('One two three', [1, 1], completed=True)
+            row = ToCManuscript.list()[0]
+        finally:
+            storages['sqlite'].close()
+        self.assertEqual(row['storage'], 'sqlite')
+        self.assertEqual(row['words'], 3)
+        self.assertGreater(row['size'], 0)
+
+    def test_open(self):
+        toc = self.create()
+        with redirect_stdout(StringIO()):
+            toc.set_content('Content 1.1', [1, 1])
+            restored = ToCManuscript.open('Test_Manuscript')
+        self.assertEqual(restored[1][1]['content'], 'Content 1.1')
+        with self.assertRaises(ValueError):
+            ToCManuscript.open('Missing Manuscript')
+
+    def test_disabled(self):
+        with redirect_stdout(StringIO()):
+            configure(registry=False)
+        try:
+            self.create()
+        finally:
+            with redirect_stdout(StringIO()):
+                configure(registry=True)
+        self.assertEqual(ToCManuscript.list(), [])
+
+    def test_notebook_title(self):
+        with mock.patch.dict(os.environ, {'NTBL_FILE_ID': 'notebook-1'}):
+            self.create()
+            restored = self.restore(title='')
+        self.assertEqual(restored.title, 'Test Manuscript')
+        self.assertEqual([name for name in os.listdir(self.output_dir) if name.endswith('.title')], [])
+
+
+class TestBatch(ManuscriptTestCase):
+
+    def test_batch_saves_once(self):
+        toc = self.create()
+        with mock.patch.object(PickleStorage, 'save') as save:
+            with toc.batch():
+                for i in range(3, 10):
+                    toc.set_section([i], title=f'Chapter {i}')
+                toc.set_content('Content 2', [2])
+                self.assertEqual(save.call_count, 0)
+            self.assertEqual(save.call_count, 1)
+        with toc.batch():
+            toc.set_section([3], title='Chapter 3')
+        self.assertEqual(self.restore()[3]['title'], 'Chapter 3')
+
+    def test_unchanged_batch_does_not_save(self):
+        toc = self.create()
+        with mock.patch.object(PickleStorage, 'save') as save:
+            with toc.batch():
+                toc.get_currently_editing_content()
+        self.assertEqual(save.call_count, 0)
+
+    def test_nested_batches_and_decorator(self):
+        toc = self.create()
+
+        @toc.batch()
+        def fill():
+            with toc.batch():
+                toc.set_content('Content 1.1', [1, 1])
+            toc.set_content('Content 1.2', [1, 2])
+
+        with mock.patch.object(PickleStorage, 'save') as save:
+            fill()
+        self.assertEqual(save.call_count, 1)
+
+    def test_batch_on_error(self):
+        toc = self.create()
+        with mock.patch.object(PickleStorage, 'save') as save:
+            with self.assertRaises(RuntimeError):
+                with toc.batch():
+                    toc.set_content('Content 2', [2])
+                    raise RuntimeError()
+            self.assertEqual(save.call_count, 0)
+            with self.assertRaises(RuntimeError):
+                with toc.batch(save_on_error=True):
+                    toc.set_content('Content 2', [2])
+                    raise RuntimeError()
+            self.assertEqual(save.call_count, 1)
+
+
+class TestAsyncSave(ManuscriptTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with redirect_stdout(StringIO()):
+            configure(async_save=True)
+
+    def tearDown(self):
+        with redirect_stdout(StringIO()):
+            configure(async_save=False)
+        super().tearDown()
+
+    def test_wait_persisted(self):
+        toc = self.create()
+        toc.set_content('Content 2', [2], completed=True)
+        self.assertTrue(toc.wait_persisted(timeout=5))
+        self.assertEqual(self.restore()[2]['content'], 'Content 2')
+        self.assertEqual([name for name in os.listdir(self.output_dir) if name.endswith('.tmp')], [])
+
+    def test_saves_are_coalesced(self):
+        toc = self.create()
+        toc.wait_persisted()
+        original_save = PickleStorage.save
+
+        def slow_save(storage, manuscript):
+            time.sleep(0.05)
+            original_save(storage, manuscript)
+
+        with mock.patch.object(PickleStorage, 'save', autospec=True, side_effect=slow_save) as save:
+            for i in range(20):
+                toc.set_content(f'Content {i}', [2])
+            toc.flush()
+            toc.wait_persisted()
+        self.assertLess(save.call_count, 20)
+        self.assertEqual(self.restore()[2]['content'], 'Content 19')
+
+    def test_journal_edits_during_save(self):
+        journal = storages['journal']
+        original_write_snapshot = type(journal)._write_snapshot
+        writing = threading.Event()
+
+        def slow_write_snapshot(storage, manuscript):
+            if not writing.is_set():
+                writing.set()
+                time.sleep(0.1)
+            original_write_snapshot(storage, manuscript)
+            # The next save appends its records to the journal.
+            storage.ratio = 100
+
+        with redirect_stdout(StringIO()):
+            configure(storage='journal')
+        try:
+            toc = self.create()
+            toc.wait_persisted()
+            journal.ratio = 0
+            with mock.patch.object(type(journal), '_write_snapshot', autospec=True, side_effect=slow_write_snapshot):
+                with redirect_stdout(StringIO()):
+                    toc.set_content('Content 2', [2])
+                    self.assertTrue(writing.wait(5))
+                    # The edit waits for the snapshot, or it is both in the snapshot and in the journal.
+                    toc.insert_section([1], title='Prologue')
+                    toc.move_section([2, 2], [3, 1])
+                toc.wait_persisted()
+            expected = [(index, section['title']) for index, section in toc.iter_sections()]
+            restored = self.restore()
+            self.assertEqual([(index, section['title']) for index, section in restored.iter_sections()], expected)
+            self.assertEqual(restored[3]['content'], 'Content 2')
+        finally:
+            journal.ratio = 0.5
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+from datetime import datetime
+from functools import partial
+import json
+from .Author import Author
+from .Definitions import Definition, prompt_definitions
+from .LazyText import LazyText
+from .Prompt import Prompt
+from .ResearchSchema import ResearchSchema
+from .Schema import Schema
+from .StorySchema import StorySchema
+from .ToCDict import ToCDict
+
+class ManuscriptCodec:
+    """
+    The ManuscriptCodec class converts a ToCManuscript to and from a versioned JSON document. Unlike pickle, decoding a document never imports or calls arbitrary code, so manuscripts from untrusted sources can be opened safely.
+
+    Document format, version 2:
+
+        {
+            "format": "tocmanuscript",
+            "version": 2,
+            "definitions": {"<content hash>": {"Style": "Formal", ...}, ...},
+            "manuscript": {
+                "attributes": {"title": "...", "currently_editing_index": [1, 2], "author": {"$author": [...]}, ...},
+                "items": [["created", {"$datetime": "2023-09-02T10:00:00"}], [1, {"$section": {...}}], ...]
+            }
+        }
+
+    Items are stored as [key, value] pairs to keep their order and integer keys. Values that JSON cannot represent are tagged objects with a single '$' key:
+
+        {"$datetime": "<ISO 8601>"}
+        {"$section": {"items": [[key, value], ...], "attributes": {"guidelines": ...}}}
+        {"$prompt": {"directives": ..., "guidelines": ..., "constraints": ...}}  # Definitions left out are the manuscript's own
+        {"$author": [[key, value], ...]}
+        {"$schema": {"class": "StorySchema", "schema": {...}, "plural_names": {...}, "data": {...}}}
+        {"$dict": [[key, value], ...]}  # Dictionaries with non-string keys
+        {"$ref": "guidelines"}  # The manuscript's own directives, guidelines or constraints dictionary
+        {"$definition": "<content hash>"}  # An interned prompt definition, stored once in "definitions"
+
+    Empty directives, guidelines and constraints of sections are left out. Version 1 documents, without the "definitions" table, are read as well. Schemas are restored only as Schema or one of the schema classes of this package.
+
+    Usage:
+        codec = ManuscriptCodec()
+        data = codec.dumps(toc_manuscript)
+        codec.loads(data, ToCManuscript.__new__(ToCManuscript))
+    """
+    format = 'tocmanuscript'
+    version = 2
+
+    # Prompt definitions that sections and prompts may share with the manuscript.
+    definitions = ('directives', 'guidelines', 'constraints')
+
+    def dumps(self, manuscript):
+        """
+        Returns the manuscript encoded as UTF-8 JSON bytes.
+        """
+        return json.dumps(self.encode(manuscript), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data, manuscript):
+        """
+        Restores the manuscript from UTF-8 JSON bytes produced by dumps().
+        """
+        self.decode(json.loads(data.decode('utf-8')), manuscript)
+
+    def encode(self, manuscript):
+        """
+        Returns the manuscript as a JSON compatible document.
+        """
+        # The interned definitions referred to by the document, by id.
+        table = {}
+        encoded = {
+            'attributes': {name: self._encode_value(value, manuscript, table) for name, value in manuscript.__getstate__().items()},
+            'items': [[key, self._encode_value(value, manuscript, table)] for key, value in dict.items(manuscript)],
+        }
+        return {
+            'format': self.format,
+            'version': self.version,
+            'definitions': table,
+            'manuscript': encoded,
+        }
+
+    def decode(self, document, manuscript):
+        """
+        Restores a document produced by encode() into the given manuscript instance.
+
+        Raises:
+            ValueError: If the document is not a manuscript, was written by a newer version or refers to an unknown prompt definition.
+        """
+        if not isinstance(document, dict) or document.get('format') != self.format:
+            raise ValueError('The document is not a ToCManuscript document.')
+        if document.get('version', 0) > self.version:
+            raise ValueError(f"The document version {document['version']} is newer than the supported version {self.version}.")
+        table = {}
+        for key, value in document.get('definitions', {}).items():
+            table[key] = prompt_definitions.intern(self._decode_value(value, manuscript, {}))
+        data = document['manuscript']
+        for name, value in data['attributes'].items():
+            # Private and special attributes are never restored from a document.
+            if name.startswith('_'):
+                continue
+            setattr(manuscript, name, self._decode_value(value, manuscript, table))
+        for key, value in data['items']:
+            dict.__setitem__(manuscript, key, self._decode_value(value, manuscript, table))
+
+    def _encode_value(self, value, manuscript, table):
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, LazyText):
+            return value.load()
+        if isinstance(value, datetime):
+            return {'$datetime': value.isoformat()}
+        if isinstance(value, ToCDict):
+            return {'$section': self._encode_section(value, manuscript, table)}
+        if isinstance(value, Definition):
+            if value.id not in table:
+                table[value.id] = self._encode_value(dict(value), manuscript, table)
+            return {'$definition': value.id}
+        if isinstance(value, Prompt):
+            return {'$prompt': {name: self._encode_value(getattr(value, name), manuscript, table) for name in self.definitions if getattr(value, name) is not getattr(manuscript, name, None)}}
+        if isinstance(value, Author):
+            return {'$author': [[key, self._encode_value(item, manuscript, table)] for key, item in value.items()]}
+        if isinstance(value, Schema):
+            return {'$schema': self._encode_schema(value, manuscript, table)}
+        if isinstance(value, (list, tuple)):
+            return [self._encode_value(item, manuscript, table) for item in value]
+        if isinstance(value, dict):
+            if all(isinstance(key, str) and not key.startswith('$') for key in value):
+                return {key: self._encode_value(item, manuscript, table) for key, item in value.items()}
+            return {'$dict': [[self._encode_value(key, manuscript, table), self._encode_value(item, manuscript, table)] for key, item in value.items()]}
+        raise TypeError(f"Values of type '{type(value).__name__}' cannot be stored in a manuscript document.")
+
+    def _encode_section(self, section, manuscript, table):
+        encoded = {'items': [[key, self._encode_value(value, manuscript, table)] for key, value in dict.items(section)]}
+        attributes = {}
+        for name, value in section.__getstate__().items():
+            if name in self.definitions and value:
+                attributes[name] = self._encode_definition(value, manuscript, table, name)
+        if attributes:
+            encoded['attributes'] = attributes
+        return encoded
+
+    def _encode_definition(self, value, manuscript, table, name):
+        if value is getattr(manuscript, name, None):
+            return {'$ref': name}
+        return self._encode_value(value, manuscript, table)
+
+    def _encode_schema(self, schema, manuscript, table):
+        plural_names = {}
+        for key in schema.schema:
+            plural_names[key] = key
+            for name, method in vars(schema).items():
+                if isinstance(method, partial) and method.func.__name__ == '_get_from_subschema' and method.args == (key,) and name != f'get_{key.lower()}':
+                    plural_names[key] = name[len('get_'):]
+        return {
+            'class': type(schema).__name__,
+            'schema': self._encode_value(schema.schema, manuscript, table),
+            'plural_names': plural_names,
+            'data': self._encode_value(schema.data, manuscript, table),
+        }
+
+    def _decode_value(self, value, manuscript, table):
+        if isinstance(value, list):
+            return [self._decode_value(item, manuscript, table) for item in value]
+        if not isinstance(value, dict):
+            return value
+        if len(value) == 1:
+            tag, data = next(iter(value.items()))
+            if tag == '$datetime':
+                return datetime.fromisoformat(data)
+            if tag == '$section':
+                return self._decode_section(data, manuscript, table)
+            if tag == '$prompt':
+                prompt = Prompt.__new__(Prompt)
+                for name in self.definitions:
+                    setattr(prompt, name, self._decode_value(data[name], manuscript, table) if name in data else getattr(manuscript, name))
+                return prompt
+            if tag == '$author':
+                author = Author(None)
+                for key, item in data:
+                    author[key] = self._decode_value(item, manuscript, table)
+                return author
+            if tag == '$schema':
+                return self._decode_schema(data, manuscript, table)
+            if tag == '$dict':
+                return {self._decode_value(key, manuscript, table): self._decode_value(item, manuscript, table) for key, item in data}
+            if tag == '$ref' and data in self.definitions:
+                return getattr(manuscript, data)
+            if tag == '$definition':
+                if data not in table:
+                    raise ValueError(f"The document refers to an unknown prompt definition '{data}'.")
+                return table[data]
+        return {key: self._decode_value(item, manuscript, table) for key, item in value.items()}
+
+    def _decode_section(self, data, manuscript, table):
+        section = ToCDict()
+        for name, value in data.get('attributes', {}).items():
+            if name in self.definitions:
+                setattr(section, name, self._decode_value(value, manuscript, table))
+        for key, value in data['items']:
+            dict.__setitem__(section, key, self._decode_value(value, manuscript, table))
+        return section
+
+    def _decode_schema(self, data, manuscript, table):
+        cls = schema_classes().get(data['class'], Schema)
+        schema = cls.__new__(cls)
+        Schema.__init__(schema, self._decode_value(data['schema'], manuscript, table), data.get('plural_names'))
+        schema.data = self._decode_value(data['data'], manuscript, table)
+        return schema
+
+
+def schema_classes():
+    """
+    Returns the schema classes of this package by name. Only these classes are instantiated when a document is decoded.
+    """
+    classes = {'Schema': Schema}
+    pending = [Schema]
+    while pending:
+        for cls in pending.pop().__subclasses__():
+            if cls.__module__ in (StorySchema.__module__, ResearchSchema.__module__):
+                classes[cls.__name__] = cls
+            pending.append(cls)
+    return classes
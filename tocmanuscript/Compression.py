@@ -0,0 +1,267 @@
+from collections import Counter, OrderedDict
+import io
+import lzma
+import pickle
+import threading
+import zlib
+from .LazyText import LazyText
+from .ToCDict import ToCDict, restore_node
+
+class TextCache:
+    """
+    A bounded least recently used cache of decompressed section texts, shared by all manuscripts.
+
+    Usage:
+        cache.get(compressed_text)
+        cache.resize(1024)
+    """
+    def __init__(self, size=256):
+        self.size = size
+        self._texts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, compressed):
+        """
+        Returns the text of a CompressedText, decompressing it if it is not cached.
+        """
+        key = id(compressed)
+        with self._lock:
+            entry = self._texts.get(key)
+            if entry is not None and entry[0] is compressed:
+                self._texts.move_to_end(key)
+                return entry[1]
+        text = compressed.decompress()
+        with self._lock:
+            # The entry keeps the compressed text alive, so its id is not reused while cached.
+            self._texts[key] = (compressed, text)
+            self._texts.move_to_end(key)
+            while len(self._texts) > self.size:
+                self._texts.popitem(last=False)
+        return text
+
+    def resize(self, size):
+        """
+        Sets the maximum number of cached texts.
+        """
+        with self._lock:
+            self.size = size
+            while len(self._texts) > size:
+                self._texts.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._texts.clear()
+
+
+# The cache shared by all compressed texts.
+cache = TextCache()
+
+
+class CompressedText(LazyText):
+    """
+    The CompressedText class holds a compressed section text. Manuscripts saved with compression are restored with these in place of the 'content' and 'summary' strings.
+
+    Unlike a plain LazyText, the proxy stays in the section: ToCDict returns the text from the bounded LRU cache on every access, so only recently used texts are kept in memory as strings. A CompressedText is pickled as it is, so unchanged texts are not compressed again on the next save.
+
+    Usage:
+        text = compressor.compress('Chapter text')
+        text.load()  # 'Chapter text'
+    """
+    __slots__ = ('method', 'data', 'zdict')
+
+    # The text is cached by TextCache instead of replacing the proxy in the section.
+    memoize = False
+
+    def __init__(self, method, data, zdict=None):
+        """
+        Parameters:
+            method (str): The compression method, 'zlib' or 'lzma'.
+            data (bytes): The compressed UTF-8 text.
+            zdict (bytes): The preset dictionary the text was compressed with, if any.
+        """
+        self.method = method
+        self.data = data
+        self.zdict = zdict
+
+    def load(self):
+        return cache.get(self)
+
+    def decompress(self):
+        if self.method == 'lzma':
+            return lzma.decompress(self.data).decode('utf-8')
+        if self.zdict:
+            return zlib.decompressobj(zdict=self.zdict).decompress(self.data).decode('utf-8')
+        return zlib.decompress(self.data).decode('utf-8')
+
+    def __reduce__(self):
+        return (CompressedText, (self.method, self.data, self.zdict))
+
+    def __repr__(self):
+        return f'CompressedText({self.method!r}, {len(self.data)} bytes)'
+
+
+class TextCompressor:
+    """
+    The TextCompressor class compresses section 'content' and 'summary' texts when a manuscript is pickled by the storage backends.
+
+    The zlib method can use a preset dictionary trained on the manuscript's own text. It helps most with many short texts, which are too small to build up their own history. The dictionary is stored once in the saved state and reused by the following saves. lzma has no preset dictionaries in the standard library.
+
+    Usage:
+        ToCManuscript.configure(compression='zlib', compression_level=9, compression_dictionary=True)
+        ToCManuscript.configure(compression='lzma')
+        ToCManuscript.configure(compression=None)
+    """
+    methods = ('zlib', 'lzma')
+
+    # Dictionary bounds. zlib uses at most the last 32 KB of a dictionary.
+    dictionary_size = 32 * 1024
+    dictionary_min_text = 16 * 1024
+
+    # Texts shorter than this are stored as they are.
+    min_length = 64
+
+    def __init__(self, method='zlib', level=None, dictionary=False):
+        """
+        Parameters:
+            method (str): 'zlib' or 'lzma'.
+            level (int): The compression level, 0-9 for both methods. Defaults to the default level of the method.
+            dictionary (bool): Whether zlib uses a dictionary trained on the manuscript text. Defaults to False.
+
+        Raises:
+            ValueError: If the method or the level is unknown, or a dictionary is requested for lzma.
+        """
+        if method not in self.methods:
+            raise ValueError(f"Unknown compression '{method}'. Available compressions: {', '.join(self.methods)}.")
+        if level is not None and level not in range(10):
+            raise ValueError('Compression level must be an integer from 0 to 9.')
+        if dictionary and method != 'zlib':
+            raise ValueError('Compression dictionaries are supported only by zlib.')
+        self.method = method
+        self.level = level
+        self.dictionary = dictionary
+
+    def compress(self, text, zdict=None):
+        """
+        Returns the text as a CompressedText, or the text itself if it is short or compressing does not make it smaller.
+        """
+        if len(text) < self.min_length:
+            return text
+        data = text.encode('utf-8')
+        if self.method == 'lzma':
+            compressed = lzma.compress(data, preset=self.level)
+        elif zdict:
+            compressor = zlib.compressobj(-1 if self.level is None else self.level, zdict=zdict)
+            compressed = compressor.compress(data) + compressor.flush()
+        else:
+            compressed = zlib.compress(data, -1 if self.level is None else self.level)
+        if len(compressed) >= len(data):
+            return text
+        return CompressedText(self.method, compressed, zdict)
+
+    def dumps(self, manuscript):
+        """
+        Returns the manuscript pickled with its section texts compressed.
+        """
+        zdict = self._get_dictionary(manuscript) if self.dictionary else None
+        buffer = io.BytesIO()
+        CompressingPickler(buffer, self, zdict).dump(manuscript)
+        return buffer.getvalue()
+
+    def _get_dictionary(self, manuscript):
+        """
+        Returns the dictionary of the manuscript: the one its restored texts were compressed with, or a new one trained on its text. Manuscripts with too little text get no dictionary.
+        """
+        if '_compression_dictionary' in manuscript.__dict__:
+            return manuscript._compression_dictionary
+        texts = []
+        zdict = self._collect_texts(manuscript, texts)
+        if zdict is None:
+            total = sum(len(text) for text in texts)
+            if total >= self.dictionary_min_text:
+                zdict = train_dictionary(texts, min(self.dictionary_size, total // 8))
+        if zdict:
+            manuscript._compression_dictionary = zdict
+        return zdict
+
+    def _collect_texts(self, node, texts):
+        for key, value in dict.items(node):
+            if isinstance(value, dict):
+                zdict = self._collect_texts(value, texts)
+                if zdict:
+                    return zdict
+            elif key in ToCDict._text_fields:
+                if type(value) is CompressedText and value.zdict:
+                    return value.zdict
+                if isinstance(value, str):
+                    texts.append(value)
+        return None
+
+
+class CompressingPickler(pickle.Pickler):
+    """
+    A pickler that writes the 'content' and 'summary' items of sections as CompressedText.
+
+    A section remembers the compressed form of its texts, and ToCDict.__setitem__ forgets it when a text is replaced, so a save compresses only the texts changed since the last save.
+    """
+    def __init__(self, file, compressor, zdict=None):
+        super().__init__(file)
+        self.compressor = compressor
+        self.zdict = zdict
+
+    def reducer_override(self, obj):
+        if type(obj) is not ToCDict:
+            return NotImplemented
+        return (restore_node, (ToCDict, self._items(obj), obj._reduce_state()))
+
+    def _items(self, node):
+        items = dict(node)
+        for key in ToCDict._text_fields:
+            value = items.get(key)
+            if isinstance(value, LazyText) or isinstance(value, str) and len(value) >= self.compressor.min_length:
+                items[key] = self._compress(node, key, value)
+        return items
+
+    def _compress(self, node, key, value):
+        if type(value) is CompressedText:
+            if value.method == self.compressor.method:
+                return value
+            value = value.load()
+        elif isinstance(value, LazyText):
+            value = value.load()
+        compressed_texts = node._text_cache('_compressed_texts')
+        cached = compressed_texts.get(key)
+        # The identity check catches texts replaced without __setitem__, e.g. with dict.update().
+        if cached and cached[0] is value and cached[2] is self.compressor:
+            return cached[1]
+        compressed = self.compressor.compress(value, self.zdict)
+        compressed_texts[key] = (value, compressed, self.compressor)
+        return compressed
+
+
+def train_dictionary(texts, size):
+    """
+    Builds a zlib preset dictionary from the words and word pairs that repeat most in the texts.
+
+    Parameters:
+        texts (list): The texts to train on.
+        size (int): The maximum size of the dictionary in bytes.
+
+    Returns:
+        bytes: The dictionary, with the most valuable phrases at the end where zlib reaches them with the shortest distances.
+    """
+    counts = Counter()
+    for text in texts:
+        words = text.split()
+        counts.update(words)
+        counts.update(f'{first} {second}' for first, second in zip(words, words[1:]))
+    # Score phrases by the bytes their repetitions would cover.
+    phrases = sorted((count * len(phrase), phrase) for phrase, count in counts.items() if count > 1 and len(phrase) > 3)
+    selected = []
+    used = 0
+    for score, phrase in reversed(phrases):
+        length = len(phrase.encode('utf-8')) + 1
+        if used + length > size:
+            break
+        selected.append(phrase)
+        used += length
+    return ' '.join(reversed(selected)).encode('utf-8')
@@ -0,0 +1,188 @@
+import time
+from .ToCDict import _state_lock
+
+# Guards the claims of the cursors of all manuscripts in this process, so two cursors never claim the same section. Other processes are not seen, see Cursor. Writes and saves through cursors are serialized with it too. It is the state lock of the manuscripts, so a cursor and an edit never wait for each other's lock.
+_claims_lock = _state_lock
+
+class Cursor:
+    """
+    The Cursor class is a named editing position of its own, independent of 'currently_editing_index'. Several cursors can work on one manuscript at the same time, such as one per worker thread or a human and a bot, each optionally limited to a subtree.
+
+    A cursor moves only to sections that have a prompt and are not completed, and claims the section it moves to. A section claimed by one cursor is never handed out by another until the claim is released or its lease expires, so a worker that stopped does not hold its section forever. Writing through the cursor renews the lease.
+
+    The cursor positions and claims are saved with the manuscript in its 'editing_cursors' attribute, and they follow their sections through insert_section(), delete_section(), move_section() and renumber().
+
+    Claims work within one Python process only: the workers must share one ToCManuscript object, such as threads of the same process. Claiming is made atomic with a lock of the process, and the saved claims are not read back while the manuscript is open, so manuscripts opened by other processes, or by other ToCManuscript objects, hand out sections regardless of each other's claims and overwrite each other's saves.
+
+    Usage:
+        cursor = toc_manuscript.cursor('worker-3', subtree=[4])
+        while cursor.move_next():
+            prompt = cursor.get_prompt()
+            cursor.set_content(generate(prompt), completed=True)
+    """
+    # Seconds a claim is held without writes. None holds claims until they are released.
+    default_lease = 600
+
+    def __init__(self, manuscript, name):
+        self.manuscript = manuscript
+        self.name = name
+
+    def __repr__(self):
+        return f"Cursor({self.name!r}, subtree={self.subtree}, index={self.index})"
+
+    @property
+    def _state(self):
+        try:
+            return self.manuscript.editing_cursors[self.name]
+        except KeyError:
+            raise KeyError(f"Cursor '{self.name}' was closed.") from None
+
+    @property
+    def index(self):
+        """
+        The index of the claimed section, or an empty list.
+        """
+        return list(self._state['index'])
+
+    @property
+    def subtree(self):
+        """
+        The index of the section whose subtree the cursor works on. An empty list is the whole manuscript.
+        """
+        return list(self._state['subtree'])
+
+    @property
+    def lease(self):
+        return self._state['lease']
+
+    def holds(self):
+        """
+        Returns whether the cursor holds the claim of its section: the lease is valid, or it has expired but no other cursor has claimed the section since.
+        """
+        with _claims_lock:
+            state = self._state
+            if not state['index']:
+                return False
+            if state['expires'] is None or state['expires'] > time.time():
+                return True
+            return tuple(state['index']) not in self.manuscript._claimed_sections(exclude=self.name)
+
+    def move_next(self):
+        """
+        Releases the claimed section and claims the next section of the subtree that has a prompt, is not completed and is not claimed by another cursor. The search continues after the released section in numbering order and wraps around to the start of the subtree.
+
+        Returns:
+            list: The index of the claimed section, or an empty list if no section is available.
+
+        Raises:
+            KeyError: If the subtree of the cursor no longer exists.
+        """
+        manuscript = self.manuscript
+        with _claims_lock:
+            state = self._state
+            subtree = tuple(state['subtree'])
+            manuscript._section_path(subtree)
+            claimed = manuscript._claimed_sections(exclude=self.name)
+            current = tuple(state['index'])
+            after = current if current and current[:len(subtree)] == subtree else None
+            found = None
+            for path in manuscript._iter_incomplete(subtree, after):
+                if path not in claimed:
+                    found = path
+                    break
+            if found is None and after is not None:
+                # Wrap around to the sections before the released one.
+                for path in manuscript._iter_incomplete(subtree):
+                    if path not in claimed:
+                        found = path
+                        break
+            self._claim(list(found) if found is not None else [])
+            manuscript.pickle()
+            return self.index
+
+    def get_prompt(self):
+        """
+        Returns the prompt of the claimed section, or an empty string if the cursor has no section.
+        """
+        index = self._state['index']
+        if not index:
+            print(f"Cursor '{self.name}' has no section. Call move_next() first.")
+            return ""
+        return self.manuscript.section(index).get('prompt', '')
+
+    def get_content(self):
+        """
+        Returns the claimed section, or None if the cursor has no section.
+        """
+        index = self._state['index']
+        return self.manuscript.section(index) if index else None
+
+    def set_content(self, content, completed=False):
+        """
+        Sets the content of the claimed section and renews the lease. See ToCManuscript.set_content().
+
+        Raises:
+            ValueError: If the cursor does not hold the claim of a section.
+        """
+        with _claims_lock:
+            index = self._check_claim()
+            self._renew()
+            self.manuscript.set_content(content, index, completed)
+
+    def set_summary(self, summary):
+        """
+        Sets the summary of the claimed section and renews the lease. See ToCManuscript.set_summary().
+
+        Raises:
+            ValueError: If the cursor does not hold the claim of a section.
+        """
+        with _claims_lock:
+            index = self._check_claim()
+            self._renew()
+            self.manuscript.set_summary(summary, index)
+
+    def renew(self):
+        """
+        Renews the lease of the claimed section, e.g. while a long generation is still running.
+
+        Raises:
+            ValueError: If the cursor does not hold the claim of a section.
+        """
+        with _claims_lock:
+            self._check_claim()
+            self._renew()
+            self.manuscript.pickle()
+
+    def release(self):
+        """
+        Releases the claimed section, so other cursors can claim it.
+        """
+        with _claims_lock:
+            self._claim([])
+            self.manuscript.pickle()
+
+    def close(self):
+        """
+        Releases the claimed section and removes the cursor from the manuscript.
+        """
+        with _claims_lock:
+            self.manuscript.editing_cursors.pop(self.name, None)
+            self.manuscript._record_cursors()
+            self.manuscript.pickle()
+
+    def _claim(self, index):
+        state = self._state
+        state['index'] = index
+        state['expires'] = time.time() + state['lease'] if index and state['lease'] is not None else None
+        self.manuscript._record_cursors()
+
+    def _renew(self):
+        state = self._state
+        if state['lease'] is not None:
+            state['expires'] = time.time() + state['lease']
+            self.manuscript._record_cursors()
+
+    def _check_claim(self):
+        if not self.holds():
+            raise ValueError(f"Cursor '{self.name}' does not hold a section. Call move_next() first.")
+        return self._state['index']
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import pickle
+import threading
+import weakref
+
+class Definition(dict):
+    """
+    An interned prompt definition: a dictionary of directives, guidelines or constraints, shared by all sections and prompts with the same content, see DefinitionRegistry.
+
+    A definition can be changed in place, such as toc_manuscript.get_guidelines()['Style'] = 'Casual'. The change is seen by every section and prompt sharing the definition, like the sections sharing the manuscript's definitions always did, and the definition is interned again by its new content. Assign a new dictionary to change the definition of one section or prompt only.
+
+    Pickling a definition interns it again on load, so identical definitions are one object in memory and, through the pickle memo, one copy in the saved state.
+    """
+    __slots__ = ('id', '__weakref__')
+
+    def __reduce__(self):
+        return (intern_definition, (dict(self),))
+
+
+def _reinterning(method):
+    """
+    Wraps a mutating dict method of Definition to intern the definition again by its new content.
+    """
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        prompt_definitions.reintern(self)
+        return result
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+for _name in ('__setitem__', '__delitem__', '__ior__', 'clear', 'pop', 'popitem', 'setdefault', 'update'):
+    setattr(Definition, _name, _reinterning(getattr(dict, _name)))
+
+
+class DefinitionRegistry:
+    """
+    The DefinitionRegistry class interns the directives, guidelines and constraints of manuscripts, sections and prompts by content hash. Identical dictionaries, such as the same long N-shot guidelines passed to every section, are stored once and the sections refer to the same Definition object.
+
+    Definitions are held weakly, so a definition is dropped when no section or prompt uses it anymore. Empty dictionaries are not interned, as they mark definitions that are not given.
+
+    Usage:
+        guidelines = prompt_definitions.intern({'Style': 'Formal'})
+        prompt_definitions.get(guidelines.id) is guidelines  # True
+    """
+
+    def __init__(self):
+        self._definitions = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        # Counts the definitions changed in place. The storages that write only the changed sections write the full state when it has changed since their last save.
+        self.generation = 0
+
+    def __len__(self):
+        return len(self._definitions)
+
+    def key(self, definition):
+        """
+        Returns the content hash of a definition. Dictionaries with the same items in any order have the same hash.
+        """
+        try:
+            data = json.dumps(definition, sort_keys=True, ensure_ascii=False, default=repr).encode('utf-8')
+        except TypeError:
+            # Keys of mixed types cannot be sorted by json.
+            data = pickle.dumps(sorted(((repr(key), repr(value)) for key, value in definition.items())))
+        return hashlib.sha1(data).hexdigest()
+
+    def intern(self, definition):
+        """
+        Returns the shared Definition with the content of the given dictionary. Values that are not dictionaries, empty dictionaries and definitions that are interned already are returned as they are.
+
+        Parameters:
+            definition (dict): Directives, guidelines or constraints.
+
+        Returns:
+            Definition: The interned definition.
+        """
+        if type(definition) is Definition or not isinstance(definition, dict) or not definition:
+            return definition
+        key = self.key(definition)
+        with self._lock:
+            interned = self._definitions.get(key)
+            # The items are compared too, so a hash collision never mixes up two definitions.
+            if interned is None or dict(interned) != definition:
+                interned = Definition(definition)
+                interned.id = key
+                self._definitions[key] = interned
+            return interned
+
+    def reintern(self, definition):
+        """
+        Interns a definition again after it was changed in place. The definition keeps being the shared object of its sections and prompts, and it is found by its new content unless another definition with the same content is interned already.
+
+        Parameters:
+            definition (Definition): The changed definition.
+        """
+        key = self.key(definition)
+        with self._lock:
+            if self._definitions.get(definition.id) is definition:
+                del self._definitions[definition.id]
+            definition.id = key
+            # Empty definitions are not interned.
+            if definition and self._definitions.get(key) is None:
+                self._definitions[key] = definition
+            self.generation += 1
+
+    def get(self, key):
+        """
+        Returns the interned definition with the given id, or None if no section uses it.
+        """
+        return self._definitions.get(key)
+
+
+# The registry shared by all manuscripts.
+prompt_definitions = DefinitionRegistry()
+
+
+def intern_definition(definition):
+    """
+    Returns the interned copy of a definition. Used to unpickle Definition objects.
+    """
+    return prompt_definitions.intern(definition)
@@ -0,0 +1,77 @@
+import os
+import pickle
+from .Codec import ManuscriptCodec
+from .Storage import PickleStorage, storages
+from .ToCDict import ToCDict
+
+class JSONStorage(PickleStorage):
+    """
+    A backend that saves the manuscript as a versioned JSON document, 'output_dir/<safe_title>.json'. See ManuscriptCodec for the format.
+
+    Opening a JSON document never executes code from the file, and by default neither does opening a manuscript that only has a '.pkl' file: it is not found. Convert trusted pickle files with migrate(), or allow reading them with configure(allow_pickle=True), and the next save writes the JSON document.
+
+    Usage:
+        ToCManuscript.configure(storage='json')
+        ToCManuscript.configure(storage='json', allow_pickle=True)  # Reads trusted '.pkl' files of the pickle backend
+    """
+    name = 'json'
+    extension = '.json'
+
+    # Whether manuscripts saved by the pickle backend may be read. Unpickling can execute code, so it is an opt-in.
+    allow_pickle = False
+
+    def __init__(self):
+        self.codec = ManuscriptCodec()
+
+    def get_location(self, manuscript):
+        path = self.get_path(manuscript, self.extension)
+        return path if os.path.exists(path) or not self.allow_pickle else super().get_location(manuscript)
+
+    def exists(self, manuscript):
+        if os.path.exists(self.get_path(manuscript, self.extension)):
+            return True
+        return self.allow_pickle and super().exists(manuscript)
+
+    def load(self, manuscript):
+        path = self.get_path(manuscript, self.extension)
+        if not os.path.exists(path) and self.allow_pickle:
+            super().load(manuscript)
+            return
+        with open(path, 'rb') as file:
+            self.codec.loads(file.read(), manuscript)
+
+    def save(self, manuscript):
+        manuscript._take_changes()
+        data = self.codec.dumps(manuscript)
+        self._ensure_directory(manuscript)
+        self._write_atomic(self.get_path(manuscript, self.extension), data)
+
+
+def migrate(path, target=None):
+    """
+    Converts a manuscript saved by the pickle backend into a JSON document. The pickle file is read, so only migrate files from trusted sources.
+
+    Parameters:
+        path (str): The path of the '.pkl' file, e.g. 'output/The_Forgotten_Experiment.pkl'.
+        target (str): The path of the JSON document. Defaults to the path with the '.json' extension.
+
+    Returns:
+        str: The path of the JSON document.
+
+    Example:
+        migrate('output/The_Forgotten_Experiment.pkl')
+    """
+    if target is None:
+        target = os.path.splitext(path)[0] + JSONStorage.extension
+    ToCDict._restoring = True
+    try:
+        with open(path, 'rb') as file:
+            manuscript = pickle.load(file)
+    finally:
+        ToCDict._restoring = False
+    storage = storages['json']
+    storage._write_atomic(target, storage.codec.dumps(manuscript))
+    return target
+
+
+storages['json'] = JSONStorage()
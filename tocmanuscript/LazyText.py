@@ -0,0 +1,32 @@
+class LazyText:
+    """
+    The LazyText class stands in for a section text that has not been read from the storage yet. Storages restoring a manuscript lazily put it into the sections in place of the 'content' and 'summary' strings.
+
+    ToCDict reads the text on first access through __getitem__ or get() and replaces the proxy with the string. A proxy that is pickled is written as the plain string, so lazily restored manuscripts can be saved by any storage.
+
+    Usage:
+        text = LazyText(read_file, 'text_output/My_Manuscript.shards/3f7a...txt')
+        text.load()  # Reads the text
+    """
+    __slots__ = ('loader', 'key')
+
+    # Whether the loaded text replaces the proxy in the section.
+    memoize = True
+
+    def __init__(self, loader, key):
+        """
+        Parameters:
+            loader (callable): A function returning the text for the key.
+            key (mixed): The storage key of the text, such as a file name or an index path.
+        """
+        self.loader = loader
+        self.key = key
+
+    def load(self):
+        return self.loader(self.key)
+
+    def __reduce__(self):
+        return (str, (self.load(),))
+
+    def __repr__(self):
+        return f'LazyText({self.key!r})'
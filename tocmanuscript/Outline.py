@@ -0,0 +1,254 @@
+import json
+import os
+import re
+from .Prompt import Prompt
+from .ToCDict import ToCDict
+
+class Outline:
+    """
+    The Outline class reads a table of contents from a nested structure, a JSON file or Markdown headings, and builds its sections for ToCManuscript.load_outline().
+
+    The whole outline is validated before any section is built, and all problems are reported together.
+
+    Outline formats:
+
+        # A list numbers its sections from 1. A section is a title, or a dictionary with a 'title', an optional 'prompt',
+        # optional 'sections' in any of these formats and any other items, such as 'summary'.
+        ['Introduction', {'title': 'Background', 'prompt': 'Write about the background.', 'sections': ['History', 'Theory']}]
+
+        # A dictionary with integer keys, or digit strings in JSON, numbers its sections explicitly. Two keys of the same number, such as 1 and '1', are an error.
+        {1: 'Introduction', 3: {'title': 'Background', 'sections': {1: 'History'}}}
+
+        # A dictionary with titles as keys has the subsections of each title as values.
+        {'Introduction': None, 'Background': ['History', 'Theory']}
+
+        # Markdown headings. Numbers like '1.2.' in front of the titles are left out, like other lines than headings.
+        # Introduction
+        # Background
+        ## History
+
+    A prompt is a Prompt, a dictionary of 'directives', 'guidelines' and 'constraints', or a string used as the 'Instruction' directive.
+
+    Usage:
+        outline = Outline.read('outline.md')
+        sections = outline.build(toc_manuscript, datetime.now())
+    """
+    # Section items set by the outline itself.
+    reserved = ('title', 'prompt', 'sections', 'created', 'modified')
+
+    heading = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+    numbering = re.compile(r'^(\d+\.)+\s*')
+
+    def __init__(self, sections):
+        """
+        Parameters:
+            sections (list): The validated top-level sections as (key, entry) tuples. An entry is a dictionary with 'title', 'prompt', 'items' and 'sections'.
+        """
+        self.sections = sections
+
+    def __len__(self):
+        """
+        Returns the number of sections in the outline, subsections included.
+        """
+        count = 0
+        pending = [entry for key, entry in self.sections]
+        while pending:
+            entry = pending.pop()
+            count += 1
+            pending.extend(child for key, child in entry['sections'])
+        return count
+
+    @classmethod
+    def read(cls, source):
+        """
+        Reads an outline from a nested structure, a file path or Markdown text. Files ending with '.json' are read as JSON, other files as Markdown.
+
+        Raises:
+            ValueError: If the outline is not valid.
+        """
+        if isinstance(source, Outline):
+            return source
+        if isinstance(source, str):
+            if os.path.isfile(source):
+                with open(source, 'r', encoding='utf-8') as file:
+                    if source.lower().endswith('.json'):
+                        return cls.from_object(json.load(file))
+                    return cls.from_markdown(file.read())
+            return cls.from_markdown(source)
+        return cls.from_object(source)
+
+    @classmethod
+    def from_markdown(cls, text):
+        """
+        Reads an outline from Markdown headings.
+
+        Raises:
+            ValueError: If a heading skips a level, or there are no headings.
+        """
+        root = []
+        # The subsections of the open heading of each level.
+        levels = [root]
+        errors = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            match = cls.heading.match(line)
+            if not match:
+                continue
+            level = len(match.group(1))
+            if level > len(levels):
+                errors.append(f'Line {number}: The level {level} heading has no parent heading.')
+                continue
+            title = cls.numbering.sub('', match.group(2))
+            del levels[level:]
+            sections = []
+            levels[level - 1].append({'title': title, 'sections': sections})
+            levels.append(sections)
+        if not root and not errors:
+            errors.append('The outline has no headings.')
+        return cls._validated(root, errors)
+
+    @classmethod
+    def from_object(cls, obj):
+        """
+        Reads an outline from nested lists and dictionaries.
+
+        Raises:
+            ValueError: If a section has no title, a prompt or a key is invalid.
+        """
+        return cls._validated(obj, [])
+
+    @classmethod
+    def _validated(cls, obj, errors):
+        sections = cls._entries(obj, (), errors)
+        if not sections and not errors:
+            errors.append('The outline has no sections.')
+        if errors:
+            raise ValueError('Invalid outline:\n' + '\n'.join(errors))
+        return cls(sections)
+
+    @classmethod
+    def _entries(cls, obj, path, errors):
+        """
+        Returns the sections of an outline level as validated (key, entry) tuples, collecting the problems into errors.
+        """
+        if obj is None:
+            return []
+        if isinstance(obj, (list, tuple)):
+            pairs = list(enumerate(obj, start=1))
+        elif isinstance(obj, dict):
+            numbers = [cls._key(key) for key in obj]
+            if obj and all(number is not None for number in numbers):
+                keys = {}
+                for key, number in zip(obj, numbers):
+                    keys.setdefault(number, []).append(key)
+                for number, duplicates in keys.items():
+                    if len(duplicates) > 1:
+                        errors.append(f"{cls._label(path + (number,))}: The keys {', '.join(repr(key) for key in duplicates)} number the same section.")
+                pairs = sorted(((number, value) for number, value in zip(numbers, obj.values())), key=lambda pair: pair[0])
+            elif any(number is not None for number in numbers):
+                errors.append(f'{cls._label(path)}: Sections must be numbered by their keys or have their titles as keys, not both.')
+                return []
+            elif 'title' in obj:
+                errors.append(f'{cls._label(path)}: Sections must be given as a list or a dictionary, not as a single section.')
+                return []
+            else:
+                pairs = [(key, {'title': title, 'sections': sections}) for key, (title, sections) in enumerate(obj.items(), start=1)]
+        else:
+            errors.append(f'{cls._label(path)}: Sections must be given as a list or a dictionary.')
+            return []
+        entries = []
+        for key, value in pairs:
+            entry = cls._entry(value, path + (key,), errors)
+            if entry is not None:
+                entries.append((key, entry))
+        return entries
+
+    @classmethod
+    def _entry(cls, value, path, errors):
+        if isinstance(value, str):
+            value = {'title': value}
+        if not isinstance(value, dict):
+            errors.append(f'{cls._label(path)}: A section must be a title or a dictionary.')
+            return None
+        title = value.get('title')
+        if not isinstance(title, str) or not title.strip():
+            errors.append(f'{cls._label(path)}: Title must be given.')
+            title = None
+        prompt = cls._prompt(value.get('prompt'), path, errors)
+        items = {}
+        for key, item in value.items():
+            if key in cls.reserved:
+                continue
+            if not isinstance(key, str):
+                errors.append(f'{cls._label(path)}: Subsections must be given in \'sections\', not with the key {key!r}.')
+                continue
+            items[key] = item
+        sections = cls._entries(value.get('sections'), path, errors)
+        if title is None:
+            return None
+        return {'title': title, 'prompt': prompt, 'items': items, 'sections': sections}
+
+    @classmethod
+    def _prompt(cls, value, path, errors):
+        if value is None or isinstance(value, Prompt):
+            return value
+        if isinstance(value, str):
+            return Prompt(directives={'Instruction': value})
+        if isinstance(value, dict) and set(value) <= set(ToCDict._definitions) and all(isinstance(item, dict) for item in value.values()):
+            return Prompt(**value)
+        errors.append(f'{cls._label(path)}: Prompt must be a Prompt, a string or a dictionary of directives, guidelines and constraints.')
+        return None
+
+    @staticmethod
+    def _key(key):
+        """
+        Returns the section number of a key, or None if the key is not a number. Strings of ASCII digits are the numbers of JSON keys.
+        """
+        if isinstance(key, int) and not isinstance(key, bool):
+            return key
+        if isinstance(key, str) and key.isascii() and key.isdigit():
+            return int(key)
+        return None
+
+    @staticmethod
+    def _label(path):
+        return f"Section {'.'.join(str(key) for key in path)}." if path else 'Outline'
+
+    def build(self, manuscript, timestamp):
+        """
+        Builds the sections of the outline in one pass, without the per-item checks of ToCDict.__setitem__. The sections get the same items and shared prompt definitions as with ToCManuscript.set_section().
+
+        Parameters:
+            manuscript (ToCManuscript): The manuscript whose prompt definitions the sections share.
+            timestamp (datetime): The 'created' and 'modified' time of all sections.
+
+        Returns:
+            list: The top-level sections as (key, ToCDict) tuples.
+        """
+        sections = []
+        for key, entry in self.sections:
+            node = ToCDict()
+            # Top-level sections share the definitions of the manuscript, like in ToCManuscript.__setitem__().
+            for name in ToCDict._definitions:
+                setattr(node, name, getattr(manuscript, name))
+            self._build(node, entry, manuscript, timestamp)
+            sections.append((key, node))
+        return sections
+
+    def _build(self, node, entry, parent, timestamp):
+        dict.__setitem__(node, 'title', entry['title'])
+        prompt = entry['prompt']
+        if prompt is not None:
+            for name in ToCDict._definitions:
+                if not getattr(prompt, name):
+                    setattr(prompt, name, getattr(parent, name))
+            dict.__setitem__(node, 'prompt', prompt)
+        dict.update(node, entry['items'])
+        dict.__setitem__(node, 'modified', timestamp)
+        dict.__setitem__(node, 'created', timestamp)
+        # The completed rules of ToCDict._prepare(): a section without a prompt is always completed.
+        dict.setdefault(node, 'completed', False)
+        if prompt is None:
+            dict.__setitem__(node, 'completed', True)
+        for key, child in entry['sections']:
+            dict.__setitem__(node, key, self._build(ToCDict(), child, node, timestamp))
+        return node
@@ -1,3 +1,5 @@
+from .Definitions import prompt_definitions
+
 class Prompt:
     """
     The Prompt class is designed to encapsulate directives, guidelines, and constraints for guiding a large language model's response. Consider the following writing tips:
@@ -119,6 +121,27 @@ class Prompt:
         self.guidelines = guidelines
         self.constraints = constraints
 
+    def __setattr__(self, name, value):
+        """
+        Sets an attribute. Directives, guidelines and constraints are interned, so identical definitions of different prompts are one shared object.
+        """
+        if name in ('directives', 'guidelines', 'constraints'):
+            value = prompt_definitions.intern(value)
+        object.__setattr__(self, name, value)
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __reduce__(self):
+        """
+        Pickles the prompt as its three definitions. Definitions shared with the manuscript are pickled once and referenced by memo id.
+        """
+        if len(self.__dict__) == 3:
+            return (Prompt, (self.directives, self.guidelines, self.constraints))
+        state = {name: value for name, value in self.__dict__.items() if name not in ('directives', 'guidelines', 'constraints')}
+        return (Prompt, (self.directives, self.guidelines, self.constraints), state)
+
     def __repr__(self):
         return f"Prompt(directives={self.directives}, guidelines={self.guidelines}, constraints={self.constraints})"
 
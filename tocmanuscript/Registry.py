@@ -0,0 +1,194 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from .LazyText import LazyText
+from .ToCDict import ToCDict
+
+class Registry:
+    """
+    The Registry class keeps an index of the manuscripts of an output directory in 'output_dir/registry.sqlite3'. Every save updates the row of the manuscript, so manuscripts can be listed and found without restoring any of them.
+
+    Tables:
+        manuscripts: One row per manuscript, keyed by the safe title, with the title, subtitle, storage backend, path of the saved state, section counts, completion ratio, word count, size in bytes and modification time.
+        notebooks: The titles of the manuscripts of Noteable notebooks, keyed by the SHA-256 hash of the notebook file ID.
+
+    Usage:
+        ToCManuscript.list()
+        ToCManuscript.open('The Forgotten Experiment')
+        ToCManuscript.configure(registry=False)
+    """
+    name = 'registry.sqlite3'
+
+    # Whether saves update the registry.
+    enabled = True
+
+    def __init__(self):
+        self._connections = {}
+        self._lock = threading.RLock()
+
+    def get_path(self, output_dir):
+        if output_dir:
+            return os.path.join(output_dir, self.name)
+        return self.name
+
+    def connect(self, output_dir):
+        """
+        Returns the cached connection to the registry of the given output directory, creating the tables on first use.
+        """
+        path = self.get_path(output_dir)
+        with self._lock:
+            if path not in self._connections:
+                if output_dir and not os.path.exists(output_dir):
+                    os.makedirs(output_dir)
+                # Saves may run in the background writer thread. Access is serialized with self._lock.
+                connection = sqlite3.connect(path, check_same_thread=False)
+                connection.row_factory = sqlite3.Row
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.executescript('''
+                    CREATE TABLE IF NOT EXISTS manuscripts (
+                        safe_title TEXT PRIMARY KEY,
+                        title TEXT NOT NULL,
+                        subtitle TEXT,
+                        storage TEXT,
+                        path TEXT,
+                        sections INTEGER NOT NULL DEFAULT 0,
+                        prompted_sections INTEGER NOT NULL DEFAULT 0,
+                        completed_sections INTEGER NOT NULL DEFAULT 0,
+                        completion REAL NOT NULL DEFAULT 0,
+                        words INTEGER NOT NULL DEFAULT 0,
+                        size INTEGER NOT NULL DEFAULT 0,
+                        mtime REAL
+                    );
+                    CREATE TABLE IF NOT EXISTS notebooks (
+                        notebook TEXT PRIMARY KEY,
+                        title TEXT NOT NULL
+                    );
+                ''')
+                self._connections[path] = connection
+            return self._connections[path]
+
+    def close(self):
+        """
+        Closes all cached registry connections.
+        """
+        with self._lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections = {}
+
+    def update(self, manuscript, storage, stats=None):
+        """
+        Writes the registry row of a manuscript that was just saved with the given storage backend. A failure is reported and does not fail the save.
+
+        Parameters:
+            manuscript (ToCManuscript): The saved manuscript.
+            storage (Storage): The backend that saved it.
+            stats (dict): The counts of summarize(), if they were taken before the save. Defaults to counting them now.
+        """
+        if not self.enabled:
+            return
+        try:
+            if stats is None:
+                stats = self.summarize(manuscript)
+            path = storage.get_location(manuscript)
+            mtime = os.path.getmtime(path) if os.path.exists(path) else time.time()
+            with self._lock:
+                connection = self.connect(manuscript.output_dir)
+                with connection:
+                    # An unknown word count keeps the registered one.
+                    connection.execute('''
+                        INSERT OR REPLACE INTO manuscripts
+                            (safe_title, title, subtitle, storage, path, sections, prompted_sections, completed_sections, completion, words, size, mtime)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, (SELECT words FROM manuscripts WHERE safe_title = ?), 0), ?, ?)''',
+                        (manuscript.safe_title, manuscript.title, manuscript.__dict__.get('subtitle', ''), storage.name, path,
+                         stats['sections'], stats['prompted_sections'], stats['completed_sections'], stats['completion'],
+                         stats['words'], manuscript.safe_title, storage.get_size(manuscript), mtime))
+        except (OSError, sqlite3.Error) as e:
+            print(f"Updating the manuscript registry failed: {e}")
+
+    def list(self, output_dir):
+        """
+        Returns the registry rows of all manuscripts of the output directory as dictionaries, ordered by title.
+        """
+        if not os.path.exists(self.get_path(output_dir)):
+            return []
+        with self._lock:
+            rows = self.connect(output_dir).execute('SELECT * FROM manuscripts ORDER BY title').fetchall()
+        return [dict(row) for row in rows]
+
+    def find(self, output_dir, title):
+        """
+        Returns the registry row of the manuscript with the given title or safe title, or None.
+        """
+        if not os.path.exists(self.get_path(output_dir)):
+            return None
+        with self._lock:
+            row = self.connect(output_dir).execute(
+                'SELECT * FROM manuscripts WHERE title = ? OR safe_title = ? ORDER BY title = ? DESC LIMIT 1', (title, title, title)).fetchone()
+        return dict(row) if row else None
+
+    def get_notebook_title(self, output_dir, nb_file_id):
+        """
+        Returns the title of the manuscript of a notebook, or None.
+        """
+        if not os.path.exists(self.get_path(output_dir)):
+            return None
+        with self._lock:
+            row = self.connect(output_dir).execute('SELECT title FROM notebooks WHERE notebook = ?', (self._notebook_key(nb_file_id),)).fetchone()
+        return row['title'] if row else None
+
+    def set_notebook_title(self, output_dir, nb_file_id, title):
+        """
+        Stores the title of the manuscript of a notebook.
+        """
+        with self._lock:
+            connection = self.connect(output_dir)
+            with connection:
+                connection.execute('INSERT OR REPLACE INTO notebooks (notebook, title) VALUES (?, ?)', (self._notebook_key(nb_file_id), title))
+
+    def _notebook_key(self, nb_file_id):
+        return hashlib.sha256(nb_file_id.encode()).hexdigest()
+
+    def summarize(self, manuscript):
+        """
+        Counts the sections and words of a manuscript. The section counts are the completion counters of the section index, see ToCManuscript.progress(), so only the word counts walk the sections.
+
+        Returns:
+            dict: 'sections', 'prompted_sections', 'completed_sections', 'completion' as the ratio of completed sections among those with a prompt, and 'words' in section content, or None if a lazily restored text has no saved word count.
+        """
+        stats = manuscript.progress()
+        del stats['drafts']
+        words = 0
+        for path, node in manuscript._get_section_index().items():
+            if path and isinstance(node, ToCDict):
+                count = self._count_words(node)
+                if count is None:
+                    words = None
+                    break
+                words += count
+        stats['words'] = words
+        return stats
+
+    def _count_words(self, node):
+        """
+        Returns the word count of the content of a section, or None if the content is a lazily restored text that was not counted before. Counts are remembered per text, and ToCDict.__setitem__ forgets them when the text is replaced. The storages that restore texts lazily save the counts with the sections, so a save does not read the texts again.
+        """
+        value = dict.get(node, 'content')
+        if not isinstance(value, (str, LazyText)):
+            return 0
+        word_counts = node._text_cache('_word_counts')
+        cached = word_counts.get('content')
+        if cached and cached[0] is value:
+            return cached[1]
+        if type(value) is LazyText:
+            return None
+        text = value.load() if isinstance(value, LazyText) else value
+        count = len(text.split())
+        word_counts['content'] = (value, count)
+        return count
+
+
+# The registry shared by all manuscripts.
+registry = Registry()
@@ -0,0 +1,489 @@
+from functools import partial
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from datetime import datetime
+from .Definitions import Definition, prompt_definitions
+from .LazyText import LazyText
+from .Prompt import Prompt
+from .Storage import PickleStorage, storages
+from .ToCDict import ToCDict
+
+# Marked a prompt definition that was the manuscript's own dictionary in databases of older versions. It is read as the manuscript's current definition.
+SHARED = '@manuscript'
+
+# Prefixes the id of an interned prompt definition stored in the 'definitions' table.
+DEFINITION = '@definition:'
+
+# Complements the digits of negative section numbers in the sort keys.
+COMPLEMENT = str.maketrans('0123456789', '9876543210')
+
+# The version of the database layout, kept in 'PRAGMA user_version'. Version 1 changed the format of the 'sort_key' column.
+VERSION = 1
+
+class SQLiteStorage(PickleStorage):
+    """
+    A backend that stores manuscripts in an SQLite database, by default 'output_dir/manuscripts.sqlite3'. Any number of manuscripts can share one database file.
+
+    Tables:
+        manuscripts: One row per manuscript, keyed by the safe title, with the pickled attributes and items of the manuscript itself.
+        sections: One row per section, keyed by the manuscript and the dotted index path such as '1.2.3', with the title, content, summary, completed flag, prompt flag and timestamps as columns. The other items and the attributes, with the word counts of the texts, are pickled in the 'extra' column.
+        prompts: One row per section prompt with the directives, guidelines and constraints, each as a definition id or as JSON.
+        definitions: One row per interned prompt definition of a manuscript, keyed by its content hash, see DefinitionRegistry. Sections and prompts with the same definitions refer to the same row.
+
+    Definition rows no longer referenced by the manuscript are removed when all rows of the manuscript are rewritten.
+
+    The database runs in WAL mode. A save updates only the rows of the sections changed since the last save in a single transaction, so a batch of changes is written atomically. A save without change records, such as an explicit call to ToCManuscript.pickle(), rewrites all rows of the manuscript.
+
+    The incomplete sections listed by ToCManuscript.check_complete() are read with an indexed query over (completed, has_prompt) instead of a walk through the tree.
+
+    With lazy restoring the 'content' and 'summary' columns are queried section by section on first access.
+
+    Usage:
+        ToCManuscript.configure(storage='sqlite')
+        ToCManuscript.configure(storage='sqlite', lazy_restore=True)
+        ToCManuscript.configure(storage='sqlite', database='/srv/manuscripts.sqlite3')
+    """
+    name = 'sqlite'
+    journaled = True
+
+    # Path of a shared database file. None stores the database in the output directory of each manuscript.
+    database = None
+    database_name = 'manuscripts.sqlite3'
+    wal = True
+
+    # Section items that have their own column, with the rest pickled in the 'extra' column.
+    columns = ('title', 'content', 'summary', 'completed', 'created', 'modified', 'updated')
+
+    def __init__(self):
+        self._connections = {}
+        self._lock = threading.RLock()
+
+    def get_database(self, manuscript):
+        if self.database:
+            return self.database
+        if manuscript.output_dir:
+            return os.path.join(manuscript.output_dir, self.database_name)
+        return self.database_name
+
+    def connect(self, manuscript):
+        """
+        Returns the cached connection to the database of the given manuscript, creating the tables on first use.
+        """
+        self._ensure_directory(manuscript)
+        return self._connect(self.get_database(manuscript))
+
+    def _connect(self, path):
+        with self._lock:
+            if path not in self._connections:
+                # Saves may run in the background writer thread. Access is serialized with self._lock.
+                connection = sqlite3.connect(path, check_same_thread=False)
+                if self.wal:
+                    connection.execute('PRAGMA journal_mode=WAL')
+                connection.executescript('''
+                    CREATE TABLE IF NOT EXISTS manuscripts (
+                        safe_title TEXT PRIMARY KEY,
+                        title TEXT,
+                        state BLOB,
+                        saved TEXT
+                    );
+                    CREATE TABLE IF NOT EXISTS sections (
+                        manuscript TEXT NOT NULL,
+                        path TEXT NOT NULL,
+                        sort_key TEXT NOT NULL,
+                        title TEXT,
+                        content TEXT,
+                        summary TEXT,
+                        completed INTEGER NOT NULL DEFAULT 0,
+                        has_prompt INTEGER NOT NULL DEFAULT 0,
+                        created TEXT,
+                        modified TEXT,
+                        updated TEXT,
+                        extra BLOB,
+                        PRIMARY KEY (manuscript, path)
+                    );
+                    CREATE TABLE IF NOT EXISTS prompts (
+                        manuscript TEXT NOT NULL,
+                        path TEXT NOT NULL,
+                        directives TEXT,
+                        guidelines TEXT,
+                        constraints TEXT,
+                        PRIMARY KEY (manuscript, path)
+                    );
+                    CREATE TABLE IF NOT EXISTS definitions (
+                        manuscript TEXT NOT NULL,
+                        id TEXT NOT NULL,
+                        definition TEXT,
+                        PRIMARY KEY (manuscript, id)
+                    );
+                    CREATE INDEX IF NOT EXISTS sections_completion
+                        ON sections (manuscript, completed, has_prompt, sort_key, path, title);
+                ''')
+                self._upgrade(connection)
+                self._connections[path] = connection
+            return self._connections[path]
+
+    def _upgrade(self, connection):
+        """
+        Brings a database written by an older version to the current layout.
+        """
+        if connection.execute('PRAGMA user_version').fetchone()[0] >= VERSION:
+            return
+        with connection:
+            # The sort keys of zero-padded numbers did not order negative numbers and numbers of nine or more digits.
+            rows = connection.execute('SELECT manuscript, path FROM sections').fetchall()
+            connection.executemany('UPDATE sections SET sort_key = ? WHERE manuscript = ? AND path = ?',
+                                   ((self._sort_key([int(key) for key in path.split('.')]), manuscript, path) for manuscript, path in rows))
+            connection.execute(f'PRAGMA user_version = {VERSION}')
+
+    def close(self):
+        """
+        Closes all cached database connections.
+        """
+        with self._lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections = {}
+
+    def get_location(self, manuscript):
+        return self.get_database(manuscript)
+
+    def get_size(self, manuscript):
+        """
+        Returns the stored size of the rows of the given manuscript, as the database file may be shared by many manuscripts.
+        """
+        with self._lock:
+            connection = self.connect(manuscript)
+            size = 0
+            for query in ('SELECT SUM(LENGTH(state)) FROM manuscripts WHERE safe_title = ?',
+                          'SELECT SUM(IFNULL(LENGTH(CAST(content AS BLOB)), 0) + IFNULL(LENGTH(CAST(summary AS BLOB)), 0) + LENGTH(extra)) FROM sections WHERE manuscript = ?',
+                          'SELECT SUM(LENGTH(directives) + LENGTH(guidelines) + LENGTH(constraints)) FROM prompts WHERE manuscript = ?',
+                          'SELECT SUM(LENGTH(definition)) FROM definitions WHERE manuscript = ?'):
+                size += connection.execute(query, (manuscript.safe_title,)).fetchone()[0] or 0
+        return size
+
+    def exists(self, manuscript):
+        if os.path.exists(self.get_database(manuscript)):
+            with self._lock:
+                row = self.connect(manuscript).execute('SELECT 1 FROM manuscripts WHERE safe_title = ?', (manuscript.safe_title,)).fetchone()
+            if row:
+                return True
+        # A manuscript saved by the pickle backend is read from its '.pkl' file until the first save.
+        return super().exists(manuscript)
+
+    def load(self, manuscript):
+        with self._lock:
+            connection = self.connect(manuscript)
+            row = connection.execute('SELECT state FROM manuscripts WHERE safe_title = ?', (manuscript.safe_title,)).fetchone()
+            if not row:
+                super().load(manuscript)
+                return
+            texts = 'NULL, NULL' if self.lazy else 'content, summary'
+            sections = connection.execute(f'''
+                SELECT path, title, {texts}, completed, created, modified, updated, extra
+                FROM sections WHERE manuscript = ?''', (manuscript.safe_title,)).fetchall()
+            prompts = connection.execute('''
+                SELECT path, directives, guidelines, constraints
+                FROM prompts WHERE manuscript = ?''', (manuscript.safe_title,)).fetchall()
+            definitions = connection.execute('SELECT id, definition FROM definitions WHERE manuscript = ?', (manuscript.safe_title,)).fetchall()
+        order, items, state = pickle.loads(row[0])
+        manuscript.__setstate__(state)
+        table = {key: prompt_definitions.intern(self._decode_definition(value, None, {})) for key, value in definitions}
+        manuscript._stored_definitions = set(table)
+        nodes = {'': (manuscript, order, items)}
+        word_counts = {}
+        database = self.get_database(manuscript)
+        for path, title, content, summary, completed, created, modified, updated, extra in sections:
+            order, items, state = pickle.loads(extra)
+            values = {'title': title, 'content': content, 'summary': summary, 'completed': bool(completed),
+                      'created': created, 'modified': modified, 'updated': updated}
+            for key in self.columns:
+                if key in order and key not in items:
+                    value = values[key]
+                    if key in ('created', 'modified', 'updated'):
+                        value = datetime.fromisoformat(value)
+                    elif key in ToCDict._text_fields and self.lazy:
+                        value = LazyText(partial(self._read_text, database, manuscript.safe_title, key), path)
+                    items[key] = value
+            node = ToCDict()
+            counts = state.pop('_word_counts', None)
+            if counts:
+                word_counts[path] = counts
+            node.__setstate__(self._unshare(state, manuscript, table))
+            nodes[path] = (node, order, items)
+        for path, directives, guidelines, constraints in prompts:
+            prompt = Prompt.__new__(Prompt)
+            prompt.directives = self._decode_definition(directives, manuscript.directives, table)
+            prompt.guidelines = self._decode_definition(guidelines, manuscript.guidelines, table)
+            prompt.constraints = self._decode_definition(constraints, manuscript.constraints, table)
+            nodes[path][2]['prompt'] = prompt
+        # Restore the items of every node in their original order.
+        for path, (node, order, items) in nodes.items():
+            for key in order:
+                if key in items:
+                    value = items[key]
+                else:
+                    value = nodes[f'{path}.{key}' if path else str(key)][0]
+                dict.__setitem__(node, key, value)
+        for path, counts in word_counts.items():
+            nodes[path][0]._restore_word_counts(counts)
+
+    def save(self, manuscript):
+        tracked = manuscript._track_changes()
+        records = manuscript._take_changes()
+        try:
+            with self._lock:
+                connection = self.connect(manuscript)
+                exists = connection.execute('SELECT 1 FROM manuscripts WHERE safe_title = ?', (manuscript.safe_title,)).fetchone()
+                with connection:
+                    if not tracked or not records or not exists:
+                        self._write_all(connection, manuscript)
+                    else:
+                        self._write_changes(connection, manuscript, records)
+        except Exception:
+            # Keep the records for the next save, and write the definitions again as the transaction was rolled back.
+            manuscript._restore_changes(records)
+            manuscript.__dict__.pop('_stored_definitions', None)
+            if not tracked:
+                manuscript.__dict__.pop('_tracking_changes', None)
+            raise
+
+    def incomplete_sections(self, manuscript):
+        """
+        Returns the incomplete sections that have a prompt, in the order of the table of contents, with an indexed query.
+
+        Returns:
+            list: Dictionaries with 'level_str' and 'title' keys, or None if the manuscript has unsaved changes and the database cannot answer.
+        """
+        if manuscript.__dict__.get('_changes') or manuscript.__dict__.get('_batch_dirty'):
+            return None
+        with self._lock:
+            rows = self.connect(manuscript).execute('''
+                SELECT path, title FROM sections
+                WHERE manuscript = ? AND completed = 0 AND has_prompt = 1
+                ORDER BY sort_key''', (manuscript.safe_title,)).fetchall()
+        return [{'level_str': f'{path}.', 'title': title or ''} for path, title in rows]
+
+    def _read_text(self, database, safe_title, field, path):
+        with self._lock:
+            row = self._connect(database).execute(f'SELECT {field} FROM sections WHERE manuscript = ? AND path = ?', (safe_title, path)).fetchone()
+        return row[0] if row else ''
+
+    def _write_all(self, connection, manuscript):
+        self._read_lazy_texts(manuscript)
+        connection.execute('DELETE FROM sections WHERE manuscript = ?', (manuscript.safe_title,))
+        connection.execute('DELETE FROM prompts WHERE manuscript = ?', (manuscript.safe_title,))
+        connection.execute('DELETE FROM definitions WHERE manuscript = ?', (manuscript.safe_title,))
+        manuscript._stored_definitions = set()
+        self._write_manuscript(connection, manuscript)
+        for key, value in manuscript.items():
+            if self._is_section(key, value):
+                self._write_subtree(connection, manuscript, (key,), value)
+
+    def _write_changes(self, connection, manuscript, records):
+        subtrees = set()
+        rows = set()
+        manuscript_row = False
+        for kind, path, key, value in records:
+            if kind == 'keys':
+                # A structural edit renames the rows of the whole subtree.
+                if not path:
+                    self._write_all(connection, manuscript)
+                    return
+                subtrees.add(path)
+            elif kind == 'del' and isinstance(key, int):
+                # A removed subsection removes the rows of its subtree.
+                subtrees.add(path + (key,))
+                if path:
+                    rows.add(path)
+                else:
+                    manuscript_row = True
+            elif not path:
+                if self._is_section(key, value):
+                    subtrees.add((key,))
+                manuscript_row = True
+            elif self._is_section(key, value):
+                subtrees.add(path + (key,))
+                rows.add(path)
+            else:
+                rows.add(path)
+        if manuscript_row:
+            self._write_manuscript(connection, manuscript)
+        nodes = {}
+        for path in sorted(subtrees, key=len):
+            # Skip subtrees written already as a part of their parent.
+            if any(path[:i] in subtrees for i in range(1, len(path))):
+                continue
+            nodes[path] = self._resolve(manuscript, path)
+        # Lazily restored texts are read by the path they were restored from, which a moved section no longer has. Read the texts of all subtrees before any of their rows are deleted or written again.
+        for node in nodes.values():
+            if node is not None:
+                self._read_lazy_texts(node)
+        for path, node in nodes.items():
+            self._delete_subtree(connection, manuscript, path)
+            if node is not None:
+                self._write_subtree(connection, manuscript, path, node)
+        for path in rows:
+            if any(path[:i] in subtrees for i in range(1, len(path) + 1)):
+                continue
+            node = self._resolve(manuscript, path)
+            if node is not None:
+                self._write_section(connection, manuscript, path, node)
+
+    def _write_manuscript(self, connection, manuscript):
+        state = pickle.dumps(self._encode_node(connection, manuscript, manuscript))
+        connection.execute('INSERT OR REPLACE INTO manuscripts (safe_title, title, state, saved) VALUES (?, ?, ?, ?)',
+                           (manuscript.safe_title, manuscript.title, state, datetime.now().isoformat()))
+
+    def _write_subtree(self, connection, manuscript, path, node):
+        self._write_section(connection, manuscript, path, node)
+        for key, value in node.items():
+            if self._is_section(key, value):
+                self._write_subtree(connection, manuscript, path + (key,), value)
+
+    def _write_section(self, connection, manuscript, path, node):
+        dotted = '.'.join(str(key) for key in path)
+        values = {}
+        for key in self.columns:
+            value = node.get(key)
+            if key in ('created', 'modified', 'updated') and isinstance(value, datetime):
+                value = value.isoformat()
+            values[key] = value
+        prompt = node.get('prompt')
+        connection.execute('''
+            INSERT OR REPLACE INTO sections
+                (manuscript, path, sort_key, title, content, summary, completed, has_prompt, created, modified, updated, extra)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (manuscript.safe_title, dotted, self._sort_key(path), values['title'], values['content'], values['summary'],
+             int(bool(values['completed'])), int(prompt is not None), values['created'], values['modified'], values['updated'],
+             pickle.dumps(self._encode_node(connection, node, manuscript))))
+        if isinstance(prompt, Prompt):
+            connection.execute('INSERT OR REPLACE INTO prompts (manuscript, path, directives, guidelines, constraints) VALUES (?, ?, ?, ?, ?)',
+                               (manuscript.safe_title, dotted,
+                                self._encode_definition(connection, manuscript, prompt.directives),
+                                self._encode_definition(connection, manuscript, prompt.guidelines),
+                                self._encode_definition(connection, manuscript, prompt.constraints)))
+        else:
+            connection.execute('DELETE FROM prompts WHERE manuscript = ? AND path = ?', (manuscript.safe_title, dotted))
+
+    def _read_lazy_texts(self, node):
+        """
+        Reads the lazily restored texts of a subtree before its rows are deleted and written again.
+        """
+        for key, value in node.items():
+            if isinstance(value, ToCDict):
+                self._read_lazy_texts(value)
+            elif type(value) is LazyText:
+                # Accessing the item replaces the proxy with the text.
+                node[key]
+
+    def _delete_subtree(self, connection, manuscript, path):
+        dotted = '.'.join(str(key) for key in path)
+        for table in ('sections', 'prompts'):
+            connection.execute(f'DELETE FROM {table} WHERE manuscript = ? AND (path = ? OR path LIKE ?)',
+                               (manuscript.safe_title, dotted, f'{dotted}.%'))
+
+    def _encode_node(self, connection, node, manuscript):
+        """
+        Encodes the key order, the items without a column and the attributes of a node.
+        """
+        is_manuscript = node is manuscript
+        items = {}
+        for key, value in node.items():
+            if self._is_section(key, value):
+                continue
+            if not is_manuscript:
+                if key == 'prompt' and isinstance(value, Prompt):
+                    continue
+                if key in self.columns and self._fits_column(key, value):
+                    continue
+            items[key] = value
+        state = node.__getstate__()
+        if not is_manuscript:
+            state = self._share(connection, state, manuscript)
+            counts = node._saved_word_counts()
+            if counts:
+                state['_word_counts'] = counts
+        return list(node.keys()), items, state
+
+    def _fits_column(self, key, value):
+        if key in ('created', 'modified', 'updated'):
+            return isinstance(value, datetime)
+        if key == 'completed':
+            return isinstance(value, bool)
+        return isinstance(value, (str, LazyText))
+
+    def _share(self, connection, state, manuscript):
+        state = dict(state)
+        for name in ('directives', 'guidelines', 'constraints'):
+            if name in state:
+                state[name] = self._encode_definition(connection, manuscript, state[name], encode=False)
+        return state
+
+    def _unshare(self, state, manuscript, table):
+        for name in ('directives', 'guidelines', 'constraints'):
+            if name in state:
+                state[name] = self._decode_definition(state[name], getattr(manuscript, name), table, decode=False)
+        return state
+
+    def _encode_definition(self, connection, manuscript, definition, encode=True):
+        """
+        Returns a prompt definition as a reference to its row in the 'definitions' table for an interned definition, or else as JSON or pickled bytes. Without encode a definition that is not interned is returned as it is.
+
+        Definitions taken from the manuscript, such as the guidelines of a prompt set before set_guidelines() was called again, are stored by their content too, so they keep the content they had when they were set.
+        """
+        if type(definition) is Definition:
+            stored = manuscript.__dict__.setdefault('_stored_definitions', set())
+            if definition.id not in stored:
+                connection.execute('INSERT OR REPLACE INTO definitions (manuscript, id, definition) VALUES (?, ?, ?)',
+                                   (manuscript.safe_title, definition.id, self._dumps(dict(definition))))
+                stored.add(definition.id)
+            return DEFINITION + definition.id
+        return self._dumps(definition) if encode else definition
+
+    def _decode_definition(self, value, shared, table, decode=True):
+        if not isinstance(value, (str, bytes)):
+            return value
+        if value == SHARED:
+            return shared
+        if isinstance(value, str) and value.startswith(DEFINITION):
+            return table[value[len(DEFINITION):]]
+        if not decode:
+            return value
+        if isinstance(value, bytes):
+            return pickle.loads(value)
+        return json.loads(value)
+
+    def _dumps(self, definition):
+        try:
+            return json.dumps(definition)
+        except TypeError:
+            return pickle.dumps(definition)
+
+    def _is_section(self, key, value):
+        return isinstance(key, int) and isinstance(value, ToCDict)
+
+    def _resolve(self, manuscript, path):
+        node = manuscript
+        for key in path:
+            node = node.get(key) if isinstance(node, dict) else None
+        return node if isinstance(node, ToCDict) else None
+
+    @staticmethod
+    def _sort_key(path):
+        """
+        Returns the text that orders the sections like the table of contents, a section before its subsections and the subsections by their numbers. Each number is written as its sign, the count of its digits and the digits, with the digits of negative numbers complemented, so negative numbers and numbers of any size sort by value, e.g. 'N98' + '8' for -1, 'P01' + '9' for 9 and 'P02' + '10' for 10.
+        """
+        parts = []
+        for key in path:
+            digits = str(abs(key))
+            if key < 0:
+                parts.append(f"N{99 - len(digits):02d}{digits.translate(COMPLEMENT)}")
+            else:
+                parts.append(f'P{len(digits):02d}{digits}')
+        return '.'.join(parts)
+
+
+storages['sqlite'] = SQLiteStorage()
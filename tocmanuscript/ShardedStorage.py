@@ -0,0 +1,141 @@
+from functools import partial
+import hashlib
+import os
+import pickle
+from .LazyText import LazyText
+from .Storage import PickleStorage, storages
+from .ToCDict import ToCDict
+
+class SectionRecord:
+    """
+    The manifest entry of a section: its items in order, with texts replaced by TextRef names, and its pickled attributes with the word counts of its texts.
+    """
+    __slots__ = ('items', 'state')
+
+    def __init__(self, items, state):
+        self.items = items
+        self.state = state
+
+
+class TextRef(str):
+    """
+    The name of the shard file holding a section text.
+    """
+
+
+class ShardedStorage(PickleStorage):
+    """
+    A backend that stores the tree skeleton in a small manifest and the texts of the sections in separate files:
+
+        output_dir/<safe_title>.shards/manifest.pkl
+        output_dir/<safe_title>.shards/<sha1 of the text>.txt
+
+    Section 'content' and 'summary' texts are named by their content hash, so unchanged texts are never written again and renumbering sections does not touch them. Each section remembers the hash of its texts, and ToCDict.__setitem__ forgets it when a text is replaced. A save therefore hashes and writes only the changed texts, plus the manifest. Files no longer referenced by the manifest are removed.
+
+    A manuscript saved by the pickle backend is read from its '.pkl' file until the first sharded save.
+
+    With lazy restoring the manifest is read on restore and each text when it is first accessed. Texts that were never accessed are not read by a save either.
+
+    Usage:
+        ToCManuscript.configure(storage='sharded')
+        ToCManuscript.configure(storage='sharded', lazy_restore=True)
+    """
+    name = 'sharded'
+    manifest_name = 'manifest.pkl'
+    text_extension = '.txt'
+
+    def get_directory(self, manuscript):
+        return self.get_path(manuscript, '.shards')
+
+    def get_location(self, manuscript):
+        directory = self.get_directory(manuscript)
+        return directory if os.path.exists(directory) else super().get_location(manuscript)
+
+    def exists(self, manuscript):
+        return os.path.exists(os.path.join(self.get_directory(manuscript), self.manifest_name)) or super().exists(manuscript)
+
+    def load(self, manuscript):
+        directory = self.get_directory(manuscript)
+        manifest = os.path.join(directory, self.manifest_name)
+        if not os.path.exists(manifest):
+            super().load(manuscript)
+            return
+        with open(manifest, 'rb') as file:
+            record = pickle.load(file)
+        manuscript.__setstate__(record.state)
+        self._decode_items(manuscript, record.items, directory)
+
+    def save(self, manuscript):
+        manuscript._take_changes()
+        directory = self.get_directory(manuscript)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        referenced = set()
+        data = pickle.dumps(self._encode(manuscript, directory, referenced))
+        self._write_atomic(os.path.join(directory, self.manifest_name), data)
+        # Remove the texts of replaced and removed sections.
+        for name in os.listdir(directory):
+            if name.endswith(self.text_extension) and name not in referenced:
+                os.remove(os.path.join(directory, name))
+
+    def _encode(self, node, directory, referenced):
+        items = []
+        for key, value in node.items():
+            if isinstance(value, ToCDict):
+                value = self._encode(value, directory, referenced)
+            elif type(value) is LazyText and isinstance(value.key, TextRef):
+                value = value.key
+                referenced.add(value)
+            elif key in ToCDict._text_fields and isinstance(value, str):
+                value = self._store_text(node, key, value, directory)
+                referenced.add(value)
+            items.append((key, value))
+        state = node.__getstate__()
+        counts = node._saved_word_counts()
+        if counts:
+            state['_word_counts'] = counts
+        return SectionRecord(items, state)
+
+    def _store_text(self, node, key, value, directory):
+        """
+        Returns the name of the shard file of a section text, writing the file only if the text has changed since the last save.
+        """
+        shard_refs = node._text_cache('_shard_refs')
+        cached = shard_refs.get(key)
+        # The identity check catches texts replaced without __setitem__, e.g. with dict.update().
+        if cached and cached[0] is value:
+            return cached[1]
+        data = value.encode('utf-8')
+        name = TextRef(hashlib.sha1(data).hexdigest() + self.text_extension)
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            self._write_atomic(path, data)
+        shard_refs[key] = (value, name)
+        return name
+
+    def _decode_items(self, node, items, directory):
+        for key, value in items:
+            if isinstance(value, SectionRecord):
+                section = ToCDict()
+                state = dict(value.state)
+                counts = state.pop('_word_counts', None)
+                section.__setstate__(state)
+                self._decode_items(section, value.items, directory)
+                if counts:
+                    section._restore_word_counts(counts)
+                value = section
+            elif isinstance(value, TextRef):
+                if self.lazy:
+                    text = LazyText(partial(self._read_text, directory), value)
+                else:
+                    text = self._read_text(directory, value)
+                node._text_cache('_shard_refs')[key] = (text, value)
+                value = text
+            dict.__setitem__(node, key, value)
+
+    def _read_text(self, directory, name):
+        with open(os.path.join(directory, name), 'rb') as file:
+            return file.read().decode('utf-8')
+
+
+storages['sharded'] = ShardedStorage()
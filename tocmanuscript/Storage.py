@@ -0,0 +1,236 @@
+import os
+import pickle
+from .ToCDict import rekey_sections
+
+class Storage:
+    """
+    The Storage class is the base class for the persistence backends of a ToCManuscript. A backend decides where and how the manuscript state is written by ToCManuscript.pickle() and how it is read back when the manuscript is initialized with an existing title.
+
+    Backends are stateless: all per-manuscript bookkeeping lives on the manuscript itself, so a single backend instance can serve any number of manuscripts.
+
+    Usage:
+        ToCManuscript.configure(storage='journal')
+    """
+    # Name of the backend in ToCManuscript.configure(storage=...).
+    name = None
+
+    # Whether the backend consumes the change records collected by the manuscript.
+    journaled = False
+
+    # Whether section texts are read on first access instead of on restore, if the backend supports it.
+    lazy = False
+
+    # The TextCompressor of the section texts in pickled snapshots, or None to store them as they are.
+    compressor = None
+
+    def get_path(self, manuscript, extension='.pkl'):
+        """
+        Constructs the path of a storage file of the given manuscript.
+
+        Parameters:
+            manuscript (ToCManuscript): The manuscript instance.
+            extension (str): The file extension. Defaults to '.pkl'.
+
+        Returns:
+            str: The file path inside the manuscript's output directory.
+        """
+        if manuscript.output_dir:
+            return os.path.join(manuscript.output_dir, f'{manuscript.safe_title}{extension}')
+        return f'{manuscript.safe_title}{extension}'
+
+    def exists(self, manuscript):
+        """
+        Returns True if a saved state exists for the given manuscript.
+        """
+        return os.path.exists(self.get_path(manuscript))
+
+    def load(self, manuscript):
+        """
+        Restores the saved state into the given manuscript instance.
+        """
+        raise NotImplementedError
+
+    def get_location(self, manuscript):
+        """
+        Returns the path of the file or directory holding the saved state of the given manuscript.
+        """
+        return self.get_path(manuscript)
+
+    def get_size(self, manuscript):
+        """
+        Returns the size of the saved state of the given manuscript in bytes.
+        """
+        path = self.get_location(manuscript)
+        if os.path.isdir(path):
+            return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def save(self, manuscript):
+        """
+        Writes the current state of the given manuscript.
+        """
+        raise NotImplementedError
+
+    def compact(self, manuscript):
+        """
+        Writes a full snapshot of the given manuscript. Backends without incremental writes simply save.
+        """
+        self.save(manuscript)
+
+    def incomplete_sections(self, manuscript):
+        """
+        Returns the incomplete sections for ToCManuscript.check_complete() if the backend can query them without walking the tree, otherwise None.
+        """
+        return None
+
+    def _ensure_directory(self, manuscript):
+        if manuscript.output_dir and not os.path.exists(manuscript.output_dir):
+            os.makedirs(manuscript.output_dir)
+
+    def _write_atomic(self, path, data):
+        """
+        Writes the data through a temporary file that replaces the target file, so an interrupted write never leaves a half-written file behind.
+        """
+        temp = f'{path}.tmp'
+        with open(temp, 'wb') as file:
+            file.write(data)
+        os.replace(temp, path)
+
+
+class PickleStorage(Storage):
+    """
+    The default backend. The whole manuscript is serialized with pickle into 'output_dir/<safe_title>.pkl' on every save.
+
+    A journal left behind by the JournalStorage backend is replayed on load and discarded by the next save, so switching between the two backends never loses changes.
+    """
+    name = 'pickle'
+    journal_extension = '.journal'
+
+    def get_size(self, manuscript):
+        journal = self.get_path(manuscript, self.journal_extension)
+        return super().get_size(manuscript) + (os.path.getsize(journal) if os.path.exists(journal) else 0)
+
+    def load(self, manuscript):
+        with open(self.get_path(manuscript), 'rb') as file:
+            saved_obj = pickle.load(file)
+        # Update attributes.
+        manuscript.__setstate__(saved_obj.__getstate__())
+        # Update the dictionary items in bulk without triggering the save logic of __setitem__.
+        dict.update(manuscript, saved_obj)
+        journal = self.get_path(manuscript, self.journal_extension)
+        if os.path.exists(journal):
+            self._replay(manuscript, journal)
+
+    def save(self, manuscript):
+        # Change records are not needed when the full state is written.
+        manuscript._take_changes()
+        self._write_snapshot(manuscript)
+
+    def _write_snapshot(self, manuscript):
+        data = self.compressor.dumps(manuscript) if self.compressor else pickle.dumps(manuscript)
+        self._ensure_directory(manuscript)
+        self._write_atomic(self.get_path(manuscript), data)
+        journal = self.get_path(manuscript, self.journal_extension)
+        if os.path.exists(journal):
+            os.remove(journal)
+
+    def _replay(self, manuscript, journal):
+        """
+        Applies the change records of a journal file on top of the loaded snapshot.
+
+        A record that cannot be read, such as an incomplete tail left by an interrupted write, ends the replay. A record pointing to a section that does not exist is skipped.
+        """
+        with open(journal, 'rb') as file:
+            while True:
+                try:
+                    record = pickle.load(file)
+                except EOFError:
+                    break
+                except Exception:
+                    print(f"Journal '{journal}' has an incomplete record. The rest of the journal was ignored.")
+                    break
+                kind, path, key, value = record
+                try:
+                    node = manuscript
+                    for idx in path:
+                        node = node[idx]
+                except (KeyError, TypeError):
+                    print(f"Journal record for section {list(path)} was skipped. The section does not exist.")
+                    continue
+                if kind == 'attr':
+                    setattr(node, key, value)
+                elif kind == 'keys':
+                    rekey_sections(node, *value)
+                elif kind == 'del':
+                    dict.pop(node, key, None)
+                else:
+                    dict.__setitem__(node, key, value)
+
+
+class JournalStorage(PickleStorage):
+    """
+    A backend that appends one small record per change to 'output_dir/<safe_title>.journal' next to the pickle snapshot, instead of rewriting the whole manuscript on every save.
+
+    Each record is a pickled tuple (kind, section index, field, new value), where kind is 'item' for dictionary items such as 'content', 'attr' for attributes such as 'currently_editing_index', 'del' for removed items and 'keys' for the renamed, removed and added subsections of a structural edit, with the mapping and the added subsections as the value. On load the snapshot is read and the journal is replayed on top of it.
+
+    The journal is compacted into a new snapshot when it grows over 'journal_max_bytes' or over 'journal_ratio' times the size of the snapshot. A save without change records, such as an explicit call to ToCManuscript.pickle(), always writes a snapshot, as does the first save of edits that were made before the manuscript started recording its changes.
+
+    Usage:
+        ToCManuscript.configure(storage='journal', journal_max_bytes=1024 * 1024, journal_ratio=0.5)
+    """
+    name = 'journal'
+    journaled = True
+
+    # Compaction thresholds.
+    max_bytes = 1024 * 1024
+    ratio = 0.5
+
+    def save(self, manuscript):
+        tracked = manuscript._track_changes()
+        records = manuscript._take_changes()
+        snapshot = self.get_path(manuscript)
+        if not tracked or not records or not os.path.exists(snapshot):
+            try:
+                self._write_snapshot(manuscript)
+            except Exception:
+                # The next save writes the full state again.
+                manuscript.__dict__.pop('_tracking_changes', None)
+                raise
+            return
+        try:
+            data = b''.join(pickle.dumps(record) for record in records + self._schema_records(manuscript))
+        except Exception:
+            # Keep the records for the next save.
+            manuscript._restore_changes(records)
+            raise
+        journal = self.get_path(manuscript, self.journal_extension)
+        with open(journal, 'ab') as file:
+            file.write(data)
+        size = os.path.getsize(journal)
+        if size > self.max_bytes or size > self.ratio * os.path.getsize(snapshot):
+            self._write_snapshot(manuscript)
+
+    def compact(self, manuscript):
+        manuscript._take_changes()
+        self._write_snapshot(manuscript)
+
+    def _write_snapshot(self, manuscript):
+        super()._write_snapshot(manuscript)
+        manuscript._journal_schema = pickle.dumps(manuscript.schema)
+
+    def _schema_records(self, manuscript):
+        """
+        The schema is modified in place by its generated methods, which leave no change records. Journal it whenever its serialized form has changed.
+        """
+        schema = pickle.dumps(manuscript.schema)
+        if schema == manuscript.__dict__.get('_journal_schema'):
+            return []
+        manuscript._journal_schema = schema
+        return [('attr', (), 'schema', manuscript.schema)]
+
+
+# Available storage backends by name.
+storages = {
+    'pickle': PickleStorage(),
+    'journal': JournalStorage(),
+}
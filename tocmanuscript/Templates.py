@@ -0,0 +1,145 @@
+from string import Template
+
+class OutputTemplates:
+    """
+    The OutputTemplates class holds the formats of the rendered manuscript, one string.Template per element, such as the section headings, the draft marker and the details of drafts. Each template is compiled once into a function when the set is created, so rendering calls only the compiled functions for each section instead of substituting templates.
+
+    Templates that are not given keep their defaults, which render the manuscript as before. A field that an element does not have is an error when the set is created, not when rendering.
+
+    Elements and their fields:
+        front_matter: Before the title data. $title, $subtitle, $author, $created, $updated. Empty by default.
+        title, title_subtitle: The title line without and with a subtitle. $title, $subtitle.
+        author, publication: The author and publication blocks. $fields are the rendered 'field' lines.
+        field: An author or publication detail. $name, $value.
+        block_separator: Between the author and publication blocks.
+        title_end: After the title data.
+        heading: A section heading. $hashes, $level, $number (e.g. '1.2.'), $title, $draft.
+        draft: The $draft marker of the headings of drafts.
+        section_end: After the content of a section.
+        updated, prompt, summary: The details of drafts, after 'section_end'. $updated, $prompt, $summary.
+
+    Usage:
+        # Unnumbered headings without draft annotations, with YAML front matter.
+        configure(templates={
+            'heading': '${hashes} ${title}\\n\\n',
+            'updated': '', 'prompt': '', 'summary': '',
+            'front_matter': '---\\ntitle: ${title}\\nauthor: ${author}\\n---\\n\\n',
+        })
+        # Or for a single manuscript.
+        toc_manuscript.output_templates = OutputTemplates(draft=' [draft]')
+    """
+    defaults = {
+        'front_matter': '',
+        'title': '${title}\n\n',
+        'title_subtitle': '${title}: ${subtitle}\n\n',
+        'author': '_Author_\n\n${fields}',
+        'publication': '_Publication_\n\n${fields}',
+        'field': '${name}: ${value}\n',
+        'block_separator': '\n',
+        'title_end': '\n',
+        'heading': '${hashes} ${number} ${title}${draft}\n\n',
+        'draft': ' (draft)',
+        'section_end': '\n',
+        'updated': '\n\nUpdated: ${updated}\n\n',
+        'prompt': 'Prompt: ${prompt}\n\n',
+        'summary': 'Summary: ${summary}\n\n',
+    }
+
+    # The fields each element may use.
+    fields = {
+        'front_matter': ('title', 'subtitle', 'author', 'created', 'updated'),
+        'title': ('title', 'subtitle'),
+        'title_subtitle': ('title', 'subtitle'),
+        'author': ('fields',),
+        'publication': ('fields',),
+        'field': ('name', 'value'),
+        'block_separator': (),
+        'title_end': (),
+        'heading': ('hashes', 'level', 'number', 'title', 'draft'),
+        'draft': (),
+        'section_end': (),
+        'updated': ('updated',),
+        'prompt': ('prompt',),
+        'summary': ('summary',),
+    }
+
+    def __init__(self, **templates):
+        """
+        Parameters:
+            templates (dict): string.Template strings by element name, see the class documentation.
+
+        Raises:
+            ValueError: If an element is unknown, a template is not a string or uses a field its element does not have.
+        """
+        unknown = [name for name in templates if name not in self.defaults]
+        if unknown:
+            raise ValueError(f"Unknown templates {unknown}. Available templates: {', '.join(self.defaults)}.")
+        self.overrides = dict(templates)
+        # The fields used by each template, so the renderer computes only those.
+        self.used = {}
+        for name, template in dict(self.defaults, **templates).items():
+            function, used = self.compile(name, template)
+            setattr(self, name, function)
+            self.used[name] = used
+            # Elements without fields are used as text.
+            if not self.fields[name]:
+                setattr(self, name + '_text', function())
+
+    def __repr__(self):
+        return f'OutputTemplates({self.overrides!r})'
+
+    def __getstate__(self):
+        return self.overrides
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def replace(self, **templates):
+        """
+        Returns a new set with the given templates replaced and the others kept.
+        """
+        return OutputTemplates(**dict(self.overrides, **templates))
+
+    @classmethod
+    def compile(cls, name, template):
+        """
+        Compiles a string.Template string into a function that takes the fields of the element as keyword arguments and returns the formatted text, like an f-string of the template. Fields that are not given are empty.
+
+        Returns:
+            tuple: The function and the set of fields the template uses.
+
+        Raises:
+            ValueError: If the template is not a string, has an invalid placeholder or uses a field the element does not have.
+        """
+        if not isinstance(template, str):
+            raise ValueError(f"Template '{name}' must be a string.")
+        # The template as literal texts and field names. The literals are joined to the formatted fields as they are, so nothing from the template is evaluated or interpreted again.
+        parts = []
+        used = set()
+        literal = ''
+        position = 0
+        for match in Template.pattern.finditer(template):
+            literal += template[position:match.start()]
+            position = match.end()
+            if match.group('escaped') is not None:
+                literal += '$'
+                continue
+            field = match.group('named') or match.group('braced')
+            if field is None:
+                raise ValueError(f"Template '{name}' has an invalid placeholder at position {match.start('invalid')}.")
+            if field not in cls.fields[name]:
+                available = ', '.join(cls.fields[name]) or 'none'
+                raise ValueError(f"Template '{name}' has an unknown field '{field}'. Available fields: {available}.")
+            parts.append((literal, field))
+            literal = ''
+            used.add(field)
+        end = literal + template[position:]
+        parts = tuple(parts)
+
+        def function(**values):
+            text = ''
+            for literal, field in parts:
+                text += literal + format(values.get(field, ''))
+            return text + end
+
+        return function, frozenset(used)
@@ -1,6 +1,43 @@
 from datetime import datetime
+import functools
+import threading
+from .Definitions import prompt_definitions
+from .LazyText import LazyText
 from .Prompt import Prompt
 
+# Serializes the edits of manuscripts with their saves. A save holds it while it takes the change records and serializes the manuscript, and the edits hold it while they change the sections, so a save in the background writer thread never sees half of an edit. Reentrant, because the editing methods call each other.
+_state_lock = threading.RLock()
+
+def synchronized(method):
+    """
+    Decorates a method that changes a manuscript to run while holding the state lock, see '_state_lock'.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with _state_lock:
+            return method(*args, **kwargs)
+    return wrapper
+
+def _definition(name):
+    """
+    Returns a property for a prompt definition of a node. The dictionary is created on first access, so sections without own definitions do not carry empty ones. Assigned definitions are interned, see DefinitionRegistry.
+    """
+    slot = '_' + name
+
+    def get(self):
+        try:
+            return getattr(self, slot)
+        except AttributeError:
+            value = {}
+            setattr(self, slot, value)
+            return value
+
+    def set(self, value):
+        setattr(self, slot, prompt_definitions.intern(value))
+
+    return property(get, set)
+
+
 class ToCDict(dict):
     """
     A specialized dictionary class that extends the built-in dict type to manage a table of contents (ToC) structure.
@@ -10,6 +47,8 @@ class ToCDict(dict):
     The __setitem__ method is overridden to enforce these constraints and manage timestamps for 'created' and 'modified',
     as well as the 'completed' attribute.
 
+    Sections are compact: the node attributes are slots, the prompt definitions are created on first access and the sorted keys of the subsections are cached, see children().
+
     Usage:
         a = ToCDict({})
         a[1] = ToCDict({'title': 'title 1'})
@@ -18,11 +57,130 @@ class ToCDict(dict):
         # This is the wrong way. Title 2.1 is not going to reach __setitem__.
         a[2] = ToCDict({'title': 'title 2', 1: ToCDict({'title': 'title 2.1'})})
     """
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.directives = {}
-        self.guidelines = {}
-        self.constraints = {}
+    __slots__ = ('_directives', '_guidelines', '_constraints', '_shard_refs', '_compressed_texts', '_word_counts', '_root', '_path', '_children', '_rendered')
+
+    # Flag for objects restorage process. Items are set natively while a saved manuscript is loaded.
+    _restoring = False
+
+    # Section items stored as separate texts by the sharded storage.
+    _text_fields = ('content', 'summary')
+
+    # Per-text caches of the storages, dropped when a text is replaced.
+    _text_caches = ('_shard_refs', '_compressed_texts', '_word_counts')
+
+    # Runtime attributes that are never written to the saved state. '_root' and '_path' attach a node to the section index of its manuscript, '_children' caches the sorted subsection keys and '_rendered' the rendered heading and details of the section.
+    _transient_attributes = _text_caches + ('_root', '_path', '_children', '_rendered')
+
+    # Items kept in the section index and the completion counters of the manuscript, besides the subsections.
+    _indexed_keys = ('title', 'prompt', 'completed')
+
+    # Prompt definitions of a node. Empty ones are left out of the saved state.
+    _definitions = ('directives', 'guidelines', 'constraints')
+
+    directives = _definition('directives')
+    guidelines = _definition('guidelines')
+    constraints = _definition('constraints')
+
+    def __getstate__(self):
+        """
+        Returns the attributes to be pickled, leaving out the empty prompt definitions and the runtime bookkeeping listed in '_transient_attributes'.
+        """
+        state = {}
+        for name in self._definitions:
+            value = getattr(self, '_' + name, None)
+            if value:
+                state[name] = value
+        attributes = getattr(self, '__dict__', None)
+        if attributes:
+            # Copied first, as reading the manuscript adds transient attributes, such as the section index, while a save serializes it.
+            state.update((name, value) for name, value in dict(attributes).items() if name not in self._transient_attributes)
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restores the attributes. Prompt definitions left out of the state are created empty on first access.
+        """
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __reduce__(self):
+        """
+        Pickles the node as its class, a plain dictionary of its items and its compacted attributes. Unpickling rebuilds the node in one pass with restore_node(), without calling __setitem__ for each item.
+
+        Prompt definitions shared with the manuscript or other nodes are the same dictionary objects, so pickle writes them once and refers to them by memo id elsewhere.
+        """
+        return (restore_node, (type(self), dict(self), self._reduce_state()))
+
+    def _reduce_state(self):
+        """
+        Returns the attributes to be pickled, or None if there are none.
+        """
+        # The common case of a section without own definitions.
+        if not (getattr(self, '_directives', None) or getattr(self, '_guidelines', None) or getattr(self, '_constraints', None) or getattr(self, '__dict__', None)):
+            return None
+        return self.__getstate__() or None
+
+    def _saved_word_counts(self):
+        """
+        Returns the word counts of the current texts by key, as counted by the manuscript registry, or None. The storages that restore texts lazily save them with the node and set them back with _restore_word_counts(), so the registry does not read the texts to count them.
+        """
+        word_counts = getattr(self, '_word_counts', None)
+        if not word_counts:
+            return None
+        counts = {key: count for key, (value, count) in word_counts.items() if dict.get(self, key) is value}
+        return counts or None
+
+    def _restore_word_counts(self, counts):
+        """
+        Sets the saved word counts of the texts restored with the node, see _saved_word_counts().
+        """
+        self._word_counts = {key: (dict.get(self, key), count) for key, count in counts.items() if key in self}
+
+    def _text_cache(self, name):
+        """
+        Returns the per-text cache of the given name, see '_text_caches', creating it on first use.
+        """
+        cache = getattr(self, name, None)
+        if cache is None:
+            cache = {}
+            setattr(self, name, cache)
+        return cache
+
+    def children(self):
+        """
+        Returns the integer keys of the subsections in ascending order. The list is cached until a subsection is added or removed, or the number of items changes, so it must not be modified.
+        """
+        cached = getattr(self, '_children', None)
+        if cached is not None and cached[0] == len(self):
+            return cached[1]
+        keys = sorted(key for key in dict.keys(self) if isinstance(key, int))
+        self._children = (len(self), keys)
+        return keys
+
+    def __getitem__(self, key):
+        """
+        Returns the value of the key, reading a lazily restored text from the storage on first access. Compressed texts are decompressed on every access through a bounded cache.
+        """
+        value = super().__getitem__(key)
+        if isinstance(value, LazyText):
+            text = value.load()
+            if not value.memoize:
+                return text
+            super().__setitem__(key, text)
+            for name in ('_shard_refs', '_word_counts'):
+                refs = getattr(self, name, None)
+                if refs and key in refs and refs[key][0] is value:
+                    refs[key] = (text, refs[key][1])
+            return text
+        return value
+
+    def get(self, key, default=None):
+        """
+        Returns the value of the key, or the default if the key does not exist. Lazily restored texts are read like in __getitem__.
+        """
+        if key in self:
+            return self[key]
+        return default
 
     def __setitem__(self, key, value):
         """
@@ -41,24 +199,128 @@ class ToCDict(dict):
         :raises
             ValueError: If the value is not a dictionary, if 'prompt' is not a Prompt object, or 'title' is not given.
         """
-        if type(value) == ToCDict:
-            if 'prompt' in value:
-                if type(value['prompt']) != Prompt:
-                    raise ValueError('Prompt must be an object.')
-                if not value["prompt"].directives:
-                    value["prompt"].directives = self.directives
-                if not value["prompt"].guidelines:
-                    value["prompt"].guidelines = self.guidelines
-                if not value["prompt"].constraints:
-                    value["prompt"].constraints = self.constraints
-            if 'title' not in value:
-                raise ValueError('Title must be given.')
-            value['modified'] = datetime.now()
-            self['modified'] = value['modified']
-            if 'created' not in value:
-                value['created'] = value['modified']
-            if 'completed' not in value:
-                value['completed'] = False
-            if 'prompt' not in value:
-                value['completed'] = True
+        if ToCDict._restoring:
+            super().__setitem__(key, value)
+            return
+        with _state_lock:
+            if key in ToCDict._text_fields:
+                # Mark the text as changed for the sharded storage, the compression and the registry.
+                for name in ToCDict._text_caches:
+                    refs = getattr(self, name, None)
+                    if refs:
+                        refs.pop(key, None)
+            if type(value) == ToCDict:
+                self._prepare(value)
+            self._set_node(key, value)
+            # Sections attached to the section index record their edits for the journaled storages. The manuscript records its own items.
+            root = getattr(self, '_root', None)
+            if root is not None and root is not self:
+                root._record_change(self._path, key, value)
+
+    def _prepare(self, value):
+        """
+        Checks a new subsection and fills in its prompt definitions, timestamps and completed status, as __setitem__() does before setting it.
+
+        Raises:
+            ValueError: If 'prompt' is not a Prompt object, or 'title' is not given.
+        """
+        if 'prompt' in value:
+            if type(value['prompt']) != Prompt:
+                raise ValueError('Prompt must be an object.')
+            if not value["prompt"].directives:
+                value["prompt"].directives = self.directives
+            if not value["prompt"].guidelines:
+                value["prompt"].guidelines = self.guidelines
+            if not value["prompt"].constraints:
+                value["prompt"].constraints = self.constraints
+        if 'title' not in value:
+            raise ValueError('Title must be given.')
+        value['modified'] = datetime.now()
+        self['modified'] = value['modified']
+        if 'created' not in value:
+            value['created'] = value['modified']
+        if 'completed' not in value:
+            value['completed'] = False
+        if 'prompt' not in value:
+            value['completed'] = True
+
+    @synchronized
+    def __delitem__(self, key):
+        old = super().__getitem__(key)
+        super().__delitem__(key)
+        if isinstance(key, int):
+            self._children = None
+        root = getattr(self, '_root', None)
+        if root is not None:
+            root._update_index(self, key, old, None)
+            root._record_deletion(self._path, key)
+
+    def pop(self, key, *default):
+        """
+        Removes the key and returns its value, or the default if the key does not exist. Removed sections leave the section index.
+        """
+        if key not in self:
+            return super().pop(key, *default)
+        value = self[key]
+        del self[key]
+        return value
+
+    def _set_node(self, key, value):
+        """
+        Sets an item without the checks of __setitem__, keeping the section index of the manuscript up to date.
+        """
+        if isinstance(key, int):
+            self._children = None
+        root = getattr(self, '_root', None)
+        if root is None or not (isinstance(key, int) or key in ToCDict._indexed_keys):
+            super().__setitem__(key, value)
+            return
+        old = dict.get(self, key)
         super().__setitem__(key, value)
+        root._update_index(self, key, old, value)
+
+
+def restore_node(cls, items, state):
+    """
+    Rebuilds a pickled ToCDict or ToCManuscript from its items and attributes. See ToCDict.__reduce__().
+    """
+    node = cls.__new__(cls)
+    dict.update(node, items)
+    node.__setstate__(state or {})
+    return node
+
+
+def section_keys(node):
+    """
+    Returns the integer keys of the subsections of a node in ascending order. Plain dictionaries of old manuscripts are sorted on every call.
+    """
+    if isinstance(node, ToCDict):
+        return node.children()
+    return sorted(key for key in node.keys() if isinstance(key, int))
+
+
+def rekey_sections(node, mapping, added=None):
+    """
+    Renames, removes and adds the subsections of a node in one pass. The other items keep their places, followed by the subsections in numbering order. Used by the structural edits of ToCManuscript and by the journal replay.
+
+    Parameters:
+        node (dict): The parent node.
+        mapping (dict): The new key of each renamed subsection by its old key, or None for a removed subsection.
+        added (dict): New subsections by key.
+    """
+    items = []
+    sections = {}
+    for key, value in dict.items(node):
+        if isinstance(key, int) and isinstance(value, dict):
+            key = mapping.get(key, key)
+            if key is not None:
+                sections[key] = value
+        else:
+            items.append((key, value))
+    if added:
+        sections.update(added)
+    dict.clear(node)
+    dict.update(node, items)
+    dict.update(node, sorted(sections.items()))
+    if isinstance(node, ToCDict):
+        node._children = None
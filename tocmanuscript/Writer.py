@@ -0,0 +1,101 @@
+import atexit
+import threading
+
+class BackgroundWriter:
+    """
+    The BackgroundWriter class saves manuscripts in a single background thread, so that the methods changing a manuscript return without waiting for the disk.
+
+    A save is serialized while the methods changing manuscripts wait, so it writes a consistent state, and the change records it writes to a journal are exactly the edits contained in that state. Save requests are coalesced per manuscript: a manuscript that is requested again before its previous request was picked up is written only once, with its latest state. Pending saves are flushed when the interpreter exits.
+
+    Usage:
+        ToCManuscript.configure(async_save=True)
+        toc_manuscript.set_currently_editing_content(content)  # Returns immediately
+        toc_manuscript.wait_persisted()  # Blocks until the state is on disk
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending = {}
+        self._writing = set()
+        self._thread = None
+
+    def submit(self, manuscript):
+        """
+        Requests a save of the given manuscript.
+
+        Parameters:
+            manuscript (ToCManuscript): The manuscript to save.
+        """
+        with self._condition:
+            self._pending[id(manuscript)] = manuscript
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='tocmanuscript-writer', daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self, manuscript):
+        """
+        Writes the pending save of the given manuscript in the calling thread, after any save of the same manuscript already in progress has finished.
+
+        Parameters:
+            manuscript (ToCManuscript): The manuscript to flush.
+        """
+        key = id(manuscript)
+        with self._condition:
+            self._condition.wait_for(lambda: key not in self._writing)
+            if self._pending.pop(key, None) is None:
+                return
+            self._writing.add(key)
+        self._write(key, manuscript)
+
+    def flush_all(self):
+        """
+        Writes all pending saves in the calling thread.
+        """
+        with self._condition:
+            manuscripts = list(self._pending.values())
+        for manuscript in manuscripts:
+            self.flush(manuscript)
+
+    def wait(self, manuscript, timeout=None):
+        """
+        Blocks until the given manuscript has no pending or running save.
+
+        Parameters:
+            manuscript (ToCManuscript): The manuscript to wait for.
+            timeout (float): The maximum number of seconds to wait. Defaults to None, waiting without a limit.
+
+        Returns:
+            bool: True if the manuscript is persisted, False if the timeout expired.
+        """
+        key = id(manuscript)
+        with self._condition:
+            return self._condition.wait_for(lambda: key not in self._pending and key not in self._writing, timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending)
+                key = next(iter(self._pending))
+                if key in self._writing:
+                    # A flush in another thread is writing the same manuscript.
+                    self._condition.wait_for(lambda: key not in self._writing)
+                    continue
+                manuscript = self._pending.pop(key)
+                self._writing.add(key)
+            self._write(key, manuscript)
+
+    def _write(self, key, manuscript):
+        try:
+            # The save holds the state lock of the manuscripts, so edits in other threads wait until it is serialized.
+            manuscript._save()
+        except Exception as e:
+            print(f"Saving manuscript '{manuscript.title}' failed: {e}")
+        finally:
+            with self._condition:
+                self._writing.discard(key)
+                self._condition.notify_all()
+
+
+# The single writer shared by all manuscripts.
+writer = BackgroundWriter()
+atexit.register(writer.flush_all)
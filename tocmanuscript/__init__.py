@@ -2,6 +2,7 @@ from .core import ToCManuscript, Prompt, Author, configure
 from .Schema import Schema
 from .StorySchema import StorySchema
 from .ResearchSchema import ResearchSchema
+from .Templates import OutputTemplates
 
 def docs(*args):
     """ Print doc string of the main classes. """
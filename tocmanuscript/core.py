@@ -263,12 +263,29 @@ Initiate the procedure with the first step!
 """
 
 from .Author import Author
+from .Cursor import Cursor, _claims_lock
 from .Prompt import Prompt
-from .ToCDict import ToCDict
+from .ToCDict import ToCDict, _state_lock, rekey_sections, section_keys, synchronized
+from .Outline import Outline
 from .Schema import Schema
+from .Storage import Storage, storages
+from .ShardedStorage import ShardedStorage
+from .SQLiteStorage import SQLiteStorage
+from .JSONStorage import JSONStorage
+from .Compression import TextCompressor, cache
+from .Definitions import prompt_definitions
+from .Registry import registry
+from .Templates import OutputTemplates
+from .Writer import writer
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, redirect_stdout
 from datetime import datetime
+from itertools import repeat
+from types import MappingProxyType
 import hashlib
-import pickle
+import io
+import time
 import os, re
 
 class ToCManuscript(ToCDict):
@@ -312,8 +329,26 @@ class ToCManuscript(ToCDict):
     # Manuscript generation directory for final output and temp files.
     _output_directory = 'text_output'
 
-  	# Flag for objects restorage process.
-    _restoring = False
+    # Name of the storage backend used by pickle() and restoration. See the Storage module.
+    _storage = 'pickle'
+
+    # Whether saves are handed over to the background writer thread. See the Writer module.
+    _async_save = False
+
+    # Buffer size in characters of the files written by generate() and of each write of render().
+    render_buffer_size = 1024 * 1024
+
+    # Encoding of the files written by generate().
+    render_encoding = 'utf-8'
+
+    # The parts of the sections that are rendered by default. See render_iter().
+    render_fields = ('titles', 'content', 'updated', 'prompts', 'summaries')
+
+    # The formats of the rendered manuscript. Set with configure(templates=...), or per manuscript. See the Templates module.
+    output_templates = OutputTemplates()
+
+    # Runtime attributes that are never written to the saved state.
+    _transient_attributes = ToCDict._transient_attributes + ('_changes', '_journal_schema', '_batch_depth', '_batch_dirty', '_compression_dictionary', '_section_index', '_section_titles', '_next_section', '_previous_section', '_section_counts', '_tracking_changes', '_definitions_generation', '_stored_definitions', '_render_table', 'output_templates')
 
     def __init__(self, title = '', subtitle = '', author = None, **kwargs):
         """
@@ -361,17 +396,15 @@ class ToCManuscript(ToCDict):
         if self.title:
             # Make file name safe title.
             self.safe_title = re.sub('[^a-zA-Z0-9 \n\.]', '', self.title).replace(" ", "_")
-            filepath = os.path.join(self.output_dir, f'{self.safe_title}.pkl')
-            if os.path.exists(filepath):
-                ToCManuscript._restoring = True
-                with open(filepath, 'rb') as file:
-                    saved_obj = pickle.load(file)
-                    # Update attributes.
-                    self.__dict__.update(saved_obj.__dict__)
-                    # Update the dictionary items.
-                    for key, value in saved_obj.items():
-                        self[key] = value
-                ToCManuscript._restoring = False
+            storage = self._get_storage()
+            if storage.exists(self):
+                ToCDict._restoring = True
+                try:
+                    storage.load(self)
+                finally:
+                    ToCDict._restoring = False
+                if storage.journaled:
+                    self._track_changes()
                 print("Manuscript was restored from the previous state")
             else:
                 self.subtitle = subtitle
@@ -382,6 +415,7 @@ class ToCManuscript(ToCDict):
                 self.completed = False
                 self.currently_editing_index = []
                 self.first_index = []
+                self.editing_cursors = {}
                 self.directives = {}
                 self.guidelines = {}
                 self.constraints = {}
@@ -409,6 +443,7 @@ class ToCManuscript(ToCDict):
         if nb_file_id:
             self.save_title_to_file(nb_file_id, self.title)
         
+    @synchronized
     def set_title(self, title, subtitle=""):
         """
         Set the title and subtitle for the object.
@@ -426,12 +461,15 @@ class ToCManuscript(ToCDict):
             self.title = title
             self.subtitle = subtitle
             self.safe_title = re.sub('[^a-zA-Z0-9 \n\.]', '', self.title).replace(" ", "_")
+            self._record_change((), 'title', self.title, attribute=True)
+            self._record_change((), 'subtitle', self.subtitle, attribute=True)
+            self._record_change((), 'safe_title', self.safe_title, attribute=True)
             self.pickle()
             self._save_noteable_title()
 
     def retrieve_title(self, nb_file_id):
         """
-        Retrieve the title associated with a notebook file ID.
+        Retrieve the title associated with a notebook file ID from the manuscript registry, or from a '<sha256>.title' file written by earlier versions.
         
         Parameters:
             nb_file_id (str): The notebook file ID.
@@ -439,6 +477,9 @@ class ToCManuscript(ToCDict):
         Returns:
             str: The title if it exists, None otherwise.
         """
+        title = registry.get_notebook_title(self.output_dir, nb_file_id)
+        if title:
+            return title
         hash_object = hashlib.sha256(nb_file_id.encode())
         hash = hash_object.hexdigest()
         filepath = os.path.join(self.output_dir, f'{hash}.title')
@@ -448,18 +489,15 @@ class ToCManuscript(ToCDict):
 
     def save_title_to_file(self, nb_file_id, title):
         """
-        Save the title associated with a notebook file ID.
+        Save the title associated with a notebook file ID in the manuscript registry.
         
         Parameters:
             nb_file_id (str): The notebook file ID.
             title (str): The title to save.
         """
-        hash_object = hashlib.sha256(nb_file_id.encode())
-        hash = hash_object.hexdigest()
-        filepath = os.path.join(self.output_dir, f'{hash}.title')
-        with open(filepath, 'w') as file:
-            file.write(title)
+        registry.set_notebook_title(self.output_dir, nb_file_id, title)
 
+    @synchronized
     def set_section(self, indices, **kwargs):
         """
         Set a section in the nested dictionary using indices.
@@ -469,10 +507,659 @@ class ToCManuscript(ToCDict):
             kwargs (dict): Additional keyword arguments to set in the section.
         """
         d = self
-        for index in indices[:-1]:
-            d = d.setdefault(index, {})
+        for position, index in enumerate(indices[:-1]):
+            if index not in d:
+                # Untitled parent section, set without the title check of __setitem__.
+                d._set_node(index, ToCDict())
+                self._record_change(indices[:position], index, d[index])
+            d = d[index]
+        # Recorded by __setitem__ for the journaled storages.
         d[indices[-1]] = ToCDict(kwargs)
     
+    @synchronized
+    def load_outline(self, outline):
+        """
+        Sets the sections of a whole table of contents at once. The outline is validated in full before any section is set, all sections get the same 'created' and 'modified' timestamp, and the manuscript is saved once. Top-level sections of the outline replace existing sections with the same index.
+
+        Parameters:
+            outline (list|dict|str): Nested lists and dictionaries of sections, the path of a JSON or Markdown file, or Markdown text. See the Outline class for the formats.
+
+        Returns:
+            int: The number of sections set.
+
+        Raises:
+            ValueError: If the outline is not valid. The message lists every problem found.
+
+        Example:
+            toc_manuscript.load_outline([
+                {'title': 'Introduction', 'prompt': 'Introduce the topic.'},
+                {'title': 'Background', 'sections': ['History', {'title': 'Theory', 'prompt': Prompt(directives={'Instruction': 'Explain the theory.'})}]},
+            ])
+            toc_manuscript.load_outline('outline.md')
+        """
+        outline = Outline.read(outline)
+        timestamp = datetime.now()
+        for key, node in outline.build(self, timestamp):
+            self._set_node(key, node)
+            self._record_change((), key, node)
+        # Like setting a section with set_section().
+        self['modified'] = timestamp
+        self.pickle()
+        return len(outline)
+
+    @synchronized
+    def insert_section(self, index, **kwargs):
+        """
+        Inserts a new section at the given index. The section at the index and the following sections numbered without gaps after it move down by one, with their subsections.
+
+        The currently editing index and the first index follow the sections they point to, and only the subtree of the parent section is reindexed and saved again.
+
+        Parameters:
+            index (list): The index of the new section. Its parent section must exist.
+            kwargs (dict): The items of the section, like in set_section().
+
+        Returns:
+            list: The index of the new section.
+
+        Raises:
+            KeyError: If the parent section does not exist.
+            ValueError: If the title is not given or the prompt is not a Prompt object.
+
+        Example:
+            toc_manuscript.insert_section([4], title='Interlude')  # Chapters 4, 5, ... become 5, 6, ...
+        """
+        path = tuple(index)
+        parent = self.section(path[:-1])
+        section = ToCDict(kwargs)
+        parent._prepare(section)
+        self._restructure(path[:-1], self._shift_run(parent, path[-1], 1), {path[-1]: section})
+        self.pickle()
+        return list(path)
+
+    @synchronized
+    def delete_section(self, index, shift=True):
+        """
+        Removes a section with its subsections. A currently editing index inside the removed section moves to the previous section.
+
+        Parameters:
+            index (list): The index of the section.
+            shift (bool): Whether the following sections numbered without gaps after it move up by one to close the gap. Defaults to True.
+
+        Returns:
+            ToCDict: The removed section.
+
+        Raises:
+            KeyError: If the section does not exist.
+
+        Example:
+            toc_manuscript.delete_section([2, 3])  # Sections 2.4, 2.5, ... become 2.3, 2.4, ...
+        """
+        path = tuple(index)
+        if not path:
+            raise KeyError(path)
+        section = self.section(path)
+        parent = self.section(path[:-1])
+        mapping = self._shift_run(parent, path[-1] + 1, -1) if shift else {}
+        mapping[path[-1]] = None
+        self._restructure(path[:-1], mapping, removed_index=self._find_previous_index(path))
+        self.pickle()
+        return section
+
+    @synchronized
+    def move_section(self, index, new_index):
+        """
+        Moves a section with its subsections to a new index, as if it was deleted and then inserted there. The new index is the index of the section after the move, so moving section 2 to 5 leaves it at 5 with sections 3 to 5 moved up by one.
+
+        The currently editing index and the first index follow the sections they point to.
+
+        Parameters:
+            index (list): The index of the section.
+            new_index (list): The index of the section after the move. Its parent section must exist after the section is removed.
+
+        Returns:
+            list: The new index.
+
+        Raises:
+            KeyError: If the section or the new parent section does not exist.
+
+        Example:
+            toc_manuscript.move_section([2, 3], [4, 1])
+        """
+        path, new_path = tuple(index), tuple(new_index)
+        if not path or not new_path:
+            raise KeyError(path if not path else new_path)
+        section = self.section(path)
+        parent_path, key = path[:-1], path[-1]
+        removal = self._shift_run(self.section(parent_path), key + 1, -1)
+        removal[key] = None
+        # Find the new parent before anything changes, through the keys it has before the removal.
+        restored = {new: old for old, new in removal.items() if new is not None}
+        # The keys the removal leaves empty do not exist afterwards.
+        for old in removal:
+            restored.setdefault(old, None)
+        new_parent_path = self._remap_path(new_path[:-1], parent_path, restored)
+        if new_parent_path is None:
+            raise KeyError(new_path[:-1])
+        new_parent = self.section(new_parent_path)
+        if new_path[:-1] == parent_path:
+            # A move among the siblings only renames them.
+            keys = [removal.get(child, child) for child in section_keys(new_parent) if child != key]
+            insertion = self._shift_run(keys, new_path[-1], 1)
+            mapping = {child: insertion.get(removal.get(child, child), removal.get(child, child)) for child in section_keys(new_parent)}
+            mapping[key] = new_path[-1]
+            self._restructure(parent_path, {old: new for old, new in mapping.items() if old != new})
+        else:
+            cursors = [tuple(self.currently_editing_index), tuple(self.first_index)]
+            states = self.__dict__.get('editing_cursors') or {}
+            editing_cursors = {name: (tuple(state['index']), tuple(state['subtree']), state['expires']) for name, state in states.items()}
+            self._restructure(parent_path, removal)
+            new_parent = self.section(new_path[:-1])
+            self._restructure(new_path[:-1], self._shift_run(new_parent, new_path[-1], 1), {new_path[-1]: section})
+            # Cursors inside the moved section follow it.
+            for name, cursor in zip(('currently_editing_index', 'first_index'), cursors):
+                if cursor[:len(path)] == path:
+                    self._set_cursor(name, list(new_path + cursor[len(path):]))
+            for name, (index, subtree, expires) in editing_cursors.items():
+                state = states.get(name)
+                if state is None:
+                    continue
+                if index[:len(path)] == path:
+                    state['index'], state['expires'] = list(new_path + index[len(path):]), expires
+                if subtree[:len(path)] == path and subtree:
+                    state['subtree'] = list(new_path + subtree[len(path):])
+                self._record_cursors()
+        self.pickle()
+        return list(new_path)
+
+    @synchronized
+    def renumber(self, index=None):
+        """
+        Renumbers the subsections of a section, and of all its subsections, from 1 without gaps, keeping their order.
+
+        Parameters:
+            index (list): The index of the section. Defaults to the whole manuscript.
+
+        Returns:
+            int: The number of sections that got a new number.
+
+        Raises:
+            KeyError: If the section does not exist.
+
+        Example:
+            toc_manuscript.renumber()  # Sections 1, 3, 7 become 1, 2, 3
+        """
+        renamed = 0
+        pending = [tuple(index) if index else ()]
+        while pending:
+            path = pending.pop()
+            node = self.section(path)
+            keys = [key for key in section_keys(node) if isinstance(dict.__getitem__(node, key), dict)]
+            mapping = {key: number for number, key in enumerate(keys, start=1) if key != number}
+            if mapping:
+                self._restructure(path, mapping)
+                renamed += len(mapping)
+            pending.extend(path + (number,) for number in range(len(keys), 0, -1))
+        if renamed:
+            self.pickle()
+        return renamed
+
+    def _shift_run(self, node, key, offset):
+        """
+        Returns the mapping that shifts the subsections numbered without gaps from the key onwards by the offset.
+
+        Parameters:
+            node (dict|list): The parent node, or its subsection keys.
+        """
+        keys = set(node) if isinstance(node, list) else {child for child in section_keys(node) if isinstance(dict.__getitem__(node, child), dict)}
+        mapping = {}
+        while key in keys:
+            mapping[key] = key + offset
+            key += 1
+        return mapping
+
+    def _remap_path(self, path, parent_path, mapping):
+        """
+        Returns a path after the subsections of the parent were renamed with the mapping, or None if it was removed.
+        """
+        depth = len(parent_path)
+        if len(path) <= depth or path[:depth] != parent_path or path[depth] not in mapping:
+            return path
+        if mapping[path[depth]] is None:
+            return None
+        return path[:depth] + (mapping[path[depth]],) + path[depth + 1:]
+
+    def _set_cursor(self, name, index):
+        if getattr(self, name) != index:
+            setattr(self, name, index)
+            self._record_change((), name, index, attribute=True)
+
+    def _restructure(self, path, mapping, added=None, removed_index=None):
+        """
+        Renames, removes and adds the subsections of one section with rekey_sections(), keeping the derived state up to date: only the subtree of the section is reindexed, the currently editing index and the first index follow their sections, and the change is recorded for the journaled storages as one 'keys' record.
+
+        Parameters:
+            path (tuple): The index path of the parent section.
+            mapping (dict): The new key of each renamed subsection by its old key, or None for a removed subsection.
+            added (dict): New subsections by key.
+            removed_index (list): Where the currently editing index moves if its section is removed. Defaults to an empty index.
+        """
+        node = self.section(path)
+        indexed = self.__dict__.get('_section_index') is not None
+        if indexed:
+            after = self._next_section[self._last_descendant(path, node)]
+            for key in section_keys(node):
+                child = dict.__getitem__(node, key)
+                if isinstance(child, dict):
+                    self._unindex_subtree(path + (key,), child)
+        rekey_sections(node, mapping, added)
+        if indexed:
+            last = path
+            for key in section_keys(node):
+                child = dict.__getitem__(node, key)
+                if isinstance(child, dict):
+                    first, child_last = self._index_subtree(path + (key,), child)
+                    self._link(last, first)
+                    last = child_last
+            self._link(last, after)
+        cursor = self._remap_path(tuple(self.currently_editing_index), path, mapping)
+        self._set_cursor('currently_editing_index', list(cursor) if cursor is not None else list(removed_index or []))
+        if self.first_index:
+            first_index = self._remap_path(tuple(self.first_index), path, mapping)
+            self._set_cursor('first_index', list(first_index) if first_index is not None else self._find_next_index([]))
+        self._remap_cursors(path, mapping)
+        self._record_structure(path, mapping, added)
+
+    def _remap_cursors(self, path, mapping):
+        """
+        Moves the editing cursors with their sections after a structural edit. A cursor whose section was removed loses its claim, and one whose subtree was removed keeps the old index, so its next move raises a KeyError.
+        """
+        states = self.__dict__.get('editing_cursors')
+        if not states:
+            return
+        with _claims_lock:
+            changed = False
+            for state in states.values():
+                for name in ('index', 'subtree'):
+                    if not state[name]:
+                        continue
+                    remapped = self._remap_path(tuple(state[name]), path, mapping)
+                    if remapped is None and name == 'index':
+                        state['index'], state['expires'] = [], None
+                        changed = True
+                    elif remapped is not None and list(remapped) != state[name]:
+                        state[name] = list(remapped)
+                        changed = True
+            if changed:
+                self._record_cursors()
+
+    def section(self, index):
+        """
+        Returns the section at the given index path from the section index, without walking the tree.
+
+        Parameters:
+            index (list|tuple): The index path, e.g. (1, 2, 3). An empty path returns the manuscript itself.
+
+        Returns:
+            ToCDict: The section.
+
+        Raises:
+            KeyError: If the section does not exist.
+
+        Example:
+            toc_manuscript.section((1, 2))['title']
+        """
+        path = tuple(index)
+        node = self._get_section_index().get(path)
+        if node is None:
+            # Paths through items other than sections are walked.
+            node = self
+            for key in path:
+                node = node[key]
+        return node
+
+    def ancestors(self, index):
+        """
+        Returns the ancestors of a section, from its top-level section down to its parent, in O(depth) through the section index. Indexed sections know their own path, so no walk from the root is needed and nothing is added to the saved state.
+
+        Parameters:
+            index (list|tuple): The index path of the section.
+
+        Returns:
+            list: The ancestors as (index path, section) tuples. Empty for a top-level section.
+
+        Raises:
+            KeyError: If the section does not exist.
+
+        Example:
+            chapter_title = toc_manuscript.ancestors([2, 3, 1])[0][1]['title']
+        """
+        path = self._section_path(index)
+        sections = self._section_index
+        return [(path[:depth], sections[path[:depth]]) for depth in range(1, len(path))]
+
+    def siblings(self, index, include_self=False):
+        """
+        Returns the sections that share the parent of a section, in the order of their numbers. The parent is found in O(depth) and its cached subsection keys are listed.
+
+        Parameters:
+            index (list|tuple): The index path of the section.
+            include_self (bool): Whether the section itself is included. Defaults to False.
+
+        Returns:
+            list: The siblings as (index path, section) tuples.
+
+        Raises:
+            KeyError: If the section does not exist.
+
+        Example:
+            previous_titles = [section['title'] for path, section in toc_manuscript.siblings([2, 3]) if path < (2, 3)]
+        """
+        path = self._section_path(index)
+        if not path:
+            return [((), self)] if include_self else []
+        sections = self._section_index
+        parent_path = path[:-1]
+        siblings = []
+        for key in section_keys(sections[parent_path]):
+            sibling = sections.get(parent_path + (key,))
+            if sibling is not None and (include_self or key != path[-1]):
+                siblings.append((parent_path + (key,), sibling))
+        return siblings
+
+    def numbering(self, index):
+        """
+        Returns the numbering of a section as used in the headings of the content, e.g. '2.3.1.'.
+
+        Parameters:
+            index (list|tuple): The index path of the section.
+
+        Returns:
+            str: The numbering. Empty for the manuscript itself.
+
+        Raises:
+            KeyError: If the section does not exist.
+        """
+        path = self._section_path(index)
+        return '.'.join(str(key) for key in path) + '.' if path else ''
+
+    def _section_path(self, index):
+        """
+        Returns the index path as a tuple after checking that it is a section in the section index.
+        """
+        path = tuple(index)
+        if path not in self._get_section_index():
+            raise KeyError(path)
+        return path
+
+    def iter_sections(self, order='preorder', start=None, max_depth=None, where=None):
+        """
+        Iterates the sections of the manuscript lazily as (index path, section) tuples. Subsections are visited in the order of their numbers, like in the generated content.
+
+        Parameters:
+            order (str): 'preorder' (default) yields a section before its subsections, 'postorder' after them and 'bfs' yields the sections level by level.
+            start (list|tuple): The index path of a section to iterate, including the section itself. Defaults to all sections of the manuscript.
+            max_depth (int): The number of levels to descend below the start. For the whole manuscript, 1 yields the top-level sections only. Defaults to no limit.
+            where (callable): A predicate called with the index path and the section. Sections it rejects are not yielded, but their subsections are still visited.
+
+        Returns:
+            generator: The (index path, section) tuples, with the index path as a tuple, e.g. (1, 2, 3).
+
+        Raises:
+            ValueError: If the order is unknown.
+            KeyError: If the start section does not exist.
+
+        Example:
+            for index, section in toc_manuscript.iter_sections(start=[2], max_depth=1):
+                print(index, section['title'])
+        """
+        if order not in ('preorder', 'postorder', 'bfs'):
+            raise ValueError(f"Unknown order '{order}'. Available orders: preorder, postorder, bfs.")
+        path = tuple(start) if start else ()
+        # The manuscript itself is not a section, and needs no index lookup.
+        node = self.section(path) if path else self
+        return self._iter_sections(order, path, node, max_depth, where)
+
+    def _iter_sections(self, order, path, node, max_depth, where):
+        limit = len(path) + max_depth if max_depth is not None else None
+
+        def subsections(path, node):
+            children = []
+            if limit is None or len(path) < limit:
+                for key in section_keys(node):
+                    child = dict.__getitem__(node, key)
+                    if isinstance(child, dict):
+                        children.append((path + (key,), child))
+            return children
+
+        if order == 'bfs':
+            pending = deque([(path, node)])
+            while pending:
+                path, node = pending.popleft()
+                if path and (where is None or where(path, node)):
+                    yield path, node
+                pending.extend(subsections(path, node))
+        elif order == 'preorder':
+            pending = [(path, node)]
+            while pending:
+                path, node = pending.pop()
+                if path and (where is None or where(path, node)):
+                    yield path, node
+                children = subsections(path, node)
+                children.reverse()
+                pending += children
+        else:
+            pending = [(path, node, None)]
+            while pending:
+                path, node, children = pending.pop()
+                if children is None:
+                    children = subsections(path, node)
+                    # The node is yielded when it is popped again, after its subsections.
+                    pending.append((path, node, ()))
+                    pending.extend((child_path, child, None) for child_path, child in reversed(children))
+                elif path and (where is None or where(path, node)):
+                    yield path, node
+
+    @property
+    def sections_by_title(self):
+        """
+        The index paths of the sections by title, e.g. {'Introduction': [(1,)], 'Summary': [(1, 3), (2, 3)]}. The mapping is read-only and kept up to date with the sections.
+        """
+        self._get_section_index()
+        return MappingProxyType(self._section_titles)
+
+    def _get_section_index(self):
+        """
+        Returns the section index from index path tuples to sections, building it on first use. Built on demand, because a restored manuscript does not pickle its index.
+
+        Along with the index the sections are threaded in pre-order, the order of move_to_next_section(): '_next_section' and '_previous_section' map each path to its neighbours. The manuscript itself, path (), comes first and the last section links to None.
+
+        '_section_counts' keeps the completion counters of each path, see _count_subtree().
+        """
+        index = self.__dict__.get('_section_index')
+        if index is None:
+            index = self._section_index = {}
+            self._section_titles = {}
+            self._section_counts = {}
+            self._next_section = {}
+            self._previous_section = {}
+            first, last = self._index_subtree((), self)
+            self._link(last, None)
+        return index
+
+    def _update_index(self, node, key, old, new):
+        """
+        Updates the section index and the pre-order links after an item of an indexed node was set or deleted. Called by ToCDict.
+        """
+        path = node._path
+        if key in ('prompt', 'completed'):
+            if path:
+                self._update_status(path, node)
+            return
+        if key == 'title':
+            if path:
+                self._remove_title(old, path)
+                if new is not None:
+                    self._section_titles.setdefault(new, []).append(path)
+            return
+        child_path = path + (key,)
+        before = after = None
+        if isinstance(old, dict) and self._section_index.get(child_path) is old:
+            # The old subtree keeps its place in the order.
+            before = self._previous_section[child_path]
+            after = self._next_section[self._last_descendant(child_path, old)]
+            self._unindex_subtree(child_path, old)
+        if isinstance(new, dict):
+            if before is None and self._last_child(node) != key:
+                # An existing non-section item became a section in the middle of its siblings.
+                self._index_subtree(child_path, new)
+                self._relink()
+                return
+            if before is None:
+                # A new key comes after the subtree of the previous sibling.
+                before = self._last_descendant(path, node, exclude=key)
+                after = self._next_section[before]
+            first, last = self._index_subtree(child_path, new)
+            self._link(before, first)
+            self._link(last, after)
+        elif before is not None:
+            self._link(before, after)
+
+    def _index_subtree(self, path, node):
+        """
+        Indexes a subtree and links its sections in pre-order.
+
+        Returns:
+            tuple: The first and the last path of the subtree in pre-order.
+        """
+        last = None
+        paths = []
+        for child_path, child in self._preorder(path, node):
+            self._section_index[child_path] = child
+            if isinstance(child, ToCDict):
+                child._root = self
+                child._path = child_path
+            if child_path and 'title' in child:
+                self._section_titles.setdefault(dict.get(child, 'title'), []).append(child_path)
+            if last is not None:
+                self._link(last, child_path)
+            last = child_path
+            paths.append(child_path)
+        self._count_subtree(paths)
+        return path, last
+
+    def _count_subtree(self, paths):
+        """
+        Counts the sections of a newly indexed subtree and adds them to the counters of its ancestors.
+
+        The counters of a path are a list: whether the section itself has a prompt and whether it is completed, followed by the number of sections, prompted sections and completed prompted sections in its subtree, the section included.
+
+        Parameters:
+            paths (list): The paths of the subtree in pre-order, its root first.
+        """
+        counts = self._section_counts
+        for path in paths:
+            prompted, completed = self._section_status(path, self._section_index[path])
+            counts[path] = [prompted, completed, 1 if path else 0, prompted, completed]
+        for path in reversed(paths[1:]):
+            self._add_counts(counts[path[:-1]], counts[path])
+        root = paths[0]
+        for depth in range(len(root)):
+            self._add_counts(counts[root[:depth]], counts[root])
+
+    def _section_status(self, path, node):
+        if not path:
+            # The manuscript itself is not a section.
+            return 0, 0
+        prompted = int(dict.get(node, 'prompt') is not None)
+        return prompted, int(prompted and bool(dict.get(node, 'completed', False)))
+
+    def _add_counts(self, counts, subtree, sign=1):
+        counts[2] += sign * subtree[2]
+        counts[3] += sign * subtree[3]
+        counts[4] += sign * subtree[4]
+
+    def _update_status(self, path, node):
+        """
+        Updates the counters of a section and its ancestors after its prompt or completed item changed, in O(depth).
+        """
+        counts = self._section_counts.get(path)
+        if counts is None:
+            return
+        prompted, completed = self._section_status(path, node)
+        delta = [0, 0, 0, prompted - counts[0], completed - counts[1]]
+        counts[0], counts[1] = prompted, completed
+        for depth in range(len(path) + 1):
+            self._add_counts(self._section_counts[path[:depth]], delta)
+
+    def _unindex_subtree(self, path, node):
+        counts = self._section_counts.get(path)
+        if counts is not None and self._section_index.get(path) is node:
+            for depth in range(len(path)):
+                self._add_counts(self._section_counts[path[:depth]], counts, -1)
+        for child_path, child in self._preorder(path, node):
+            if self._section_index.get(child_path) is not child:
+                continue
+            del self._section_index[child_path]
+            self._section_counts.pop(child_path, None)
+            self._next_section.pop(child_path, None)
+            self._previous_section.pop(child_path, None)
+            self._remove_title(dict.get(child, 'title'), child_path)
+            if isinstance(child, ToCDict) and getattr(child, '_root', None) is self:
+                del child._root, child._path
+
+    def _relink(self):
+        """
+        Rebuilds the pre-order links of the whole manuscript.
+        """
+        self._next_section = {}
+        self._previous_section = {}
+        last = None
+        for path, node in self._preorder((), self):
+            if last is not None:
+                self._link(last, path)
+            last = path
+        self._link(last, None)
+
+    def _link(self, path, next_path):
+        self._next_section[path] = next_path
+        if next_path is not None:
+            self._previous_section[next_path] = path
+
+    def _preorder(self, path, node):
+        """
+        Yields the index paths and nodes of a subtree in pre-order, with the subsections of each node in insertion order.
+        """
+        pending = [(path, node)]
+        while pending:
+            path, node = pending.pop()
+            yield path, node
+            children = [(path + (key,), child) for key, child in dict.items(node) if isinstance(key, int) and isinstance(child, dict)]
+            pending.extend(reversed(children))
+
+    def _last_child(self, node, exclude=None):
+        for key in reversed(node.keys()):
+            if isinstance(key, int) and key != exclude and isinstance(dict.get(node, key), dict):
+                return key
+        return None
+
+    def _last_descendant(self, path, node, exclude=None):
+        """
+        Returns the path of the last section of a subtree in pre-order, optionally leaving out one child of its root.
+        """
+        key = self._last_child(node, exclude)
+        while key is not None:
+            path += (key,)
+            node = dict.__getitem__(node, key)
+            key = self._last_child(node)
+        return path
+
+    def _remove_title(self, title, path):
+        paths = self._section_titles.get(title)
+        if paths and path in paths:
+            paths.remove(path)
+            if not paths:
+                del self._section_titles[title]
+
     def get_schema(self):
         """
         Retrieves the current schema instance for this Schema or its subclass.
@@ -482,6 +1169,7 @@ class ToCManuscript(ToCDict):
         """
         return self.schema
 
+    @synchronized
     def set_schema(self, schema):
         """
         Sets a new schema instance for this Schema or its subclass.
@@ -493,7 +1181,9 @@ class ToCManuscript(ToCDict):
             Typically, this is set during initialization, e.g., self.schema = StorySchema().
         """
         self.schema = schema
+        self._record_change((), 'schema', schema, attribute=True)
 
+    @synchronized
     def set_guidelines(self, guidelines):
         """
         Set guidelines and update the 'updated' timestamp.
@@ -502,6 +1192,7 @@ class ToCManuscript(ToCDict):
             guidelines (dict): Dictionary containing the guidelines to set.
         """
         self.guidelines = guidelines
+        self._record_change((), 'guidelines', guidelines, attribute=True)
         self['updated'] = datetime.now()
         self.pickle()
 
@@ -514,6 +1205,7 @@ class ToCManuscript(ToCDict):
         """
         return self.guidelines
 
+    @synchronized
     def set_constraints(self, constraints):
         """
         Set constraints and update the 'updated' timestamp.
@@ -522,6 +1214,7 @@ class ToCManuscript(ToCDict):
             constraints (dict): Dictionary containing the constraints to set.
         """
         self.constraints = constraints
+        self._record_change((), 'constraints', constraints, attribute=True)
         self['updated'] = datetime.now()
         self.pickle()
 
@@ -534,6 +1227,7 @@ class ToCManuscript(ToCDict):
         """
         return self.constraints
 
+    @synchronized
     def __setitem__(self, key, value):
         """
         Sets the value for the specified key in the instance. If the value is of type 'ToCDict', the current state of the object is saved to a pickle file.
@@ -544,41 +1238,122 @@ class ToCManuscript(ToCDict):
         """
 
         # Object's init process we want to have a native functionality.
-        if ToCManuscript._restoring:
+        if ToCDict._restoring:
             super().__setitem__(key, value)
             return
 
         # Set global references if prompt properties are not given.
         if isinstance(value, ToCDict):
-            if not value.directives:
-                value.directives = self.directives
-            if not value.guidelines:
-                value.guidelines = self.guidelines
-            if not value.constraints:
-                value.constraints = self.constraints
-            if "prompt" in value:
-                if not value["prompt"].directives:
-                    value["prompt"].directives = self.directives
-                if not value["prompt"].guidelines:
-                    value["prompt"].guidelines = self.guidelines
-                if not value["prompt"].constraints:
-                    value["prompt"].constraints = self.constraints
+            self._share_definitions(value)
 
         super().__setitem__(key, value)
+        self._record_change((), key, value)
 
         # If the value is of type 'ToCDict', execute specific logic (e.g., pickling)
         if isinstance(value, ToCDict):
             self.pickle()
 
+    def _share_definitions(self, value):
+        """
+        Sets the manuscript's directives, guidelines and constraints to a top-level section and its prompt where they are not given.
+        """
+        if not value.directives:
+            value.directives = self.directives
+        if not value.guidelines:
+            value.guidelines = self.guidelines
+        if not value.constraints:
+            value.constraints = self.constraints
+        if "prompt" in value:
+            if not value["prompt"].directives:
+                value["prompt"].directives = self.directives
+            if not value["prompt"].guidelines:
+                value["prompt"].guidelines = self.guidelines
+            if not value["prompt"].constraints:
+                value["prompt"].constraints = self.constraints
+
+    def _prepare(self, value):
+        self._share_definitions(value)
+        super()._prepare(value)
+
+    def _get_storage(self):
+        """
+        Returns the storage backend configured with ToCManuscript.configure(storage=...).
+        """
+        return storages[ToCManuscript._storage]
+
+    def _record_change(self, index, key, value, attribute=False):
+        """
+        Records a single change for the journaled storage backends. Nothing is recorded when the configured backend writes the full state on every save.
+
+        Parameters:
+            index (list): The index path of the changed section. An empty index refers to the manuscript itself.
+            key (str|int): The dictionary key, or the attribute name if 'attribute' is True.
+            value (mixed): The new value.
+            attribute (bool): Whether the change is an attribute instead of a dictionary item. Defaults to False.
+        """
+        self._append_record(('attr' if attribute else 'item', tuple(index), key, value))
+
+    def _record_deletion(self, index, key):
+        """
+        Records a removed dictionary item, such as a subsection deleted with del, for the journaled storage backends.
+        """
+        self._append_record(('del', tuple(index), key, None))
+
+    def _record_structure(self, index, mapping, added=None):
+        """
+        Records a structural edit of the subsections of a section for the journaled storage backends, see rekey_sections().
+        """
+        self._append_record(('keys', tuple(index), None, (mapping, added or {})))
+
+    def _append_record(self, record):
+        """
+        Appends a change record (kind, index path, key, value) for the journaled storage backends.
+        """
+        if ToCDict._restoring:
+            return
+        if self.__dict__.get('_batch_depth'):
+            self._batch_dirty = True
+        if not self._get_storage().journaled:
+            return
+        with _state_lock:
+            self.__dict__.setdefault('_changes', []).append(record)
+
+    def _track_changes(self):
+        """
+        Returns whether the edits of the manuscript have been recorded since the last save, and starts recording them. Sections record their direct edits, such as toc_manuscript[1][2]['title'] = 'Title', once they are attached to the section index, so a journaled storage must write the full state when the index was not built before the edits.
+
+        Prompt definitions changed in place leave no change records, so the edits are not tracked either when a definition was changed since the last save, see Definition.
+        """
+        tracked = self.__dict__.get('_tracking_changes', False)
+        if self.__dict__.get('_definitions_generation') != prompt_definitions.generation:
+            self._definitions_generation = prompt_definitions.generation
+            tracked = False
+        if not tracked:
+            self._get_section_index()
+            self._tracking_changes = True
+        return tracked
+
+    def _take_changes(self):
+        """
+        Returns and clears the change records collected since the last save.
+        """
+        with _state_lock:
+            return self.__dict__.pop('_changes', [])
+
+    def _restore_changes(self, records):
+        """
+        Puts back change records taken by a save that failed, in front of the records collected since.
+        """
+        with _state_lock:
+            self._changes = records + self.__dict__.get('_changes', [])
+
     def pickle(self):
         """
-        Serializes the current state of the ToCManuscript object and saves it to a pickle file.
+        Saves the current state of the ToCManuscript object with the configured storage backend.
 
         The method performs the following steps:
         1. Checks if the manuscript title is available. If not, prints an error message and returns.
-        2. Checks if the output directory exists. If not, creates it.
-        3. Constructs the filepath for the pickle file based on the title and output directory.
-        4. Writes the serialized object to the pickle file.
+        2. Delegates the write to the storage backend. The default 'pickle' backend serializes the whole object to 'output_dir/<safe_title>.pkl', the 'journal' backend appends the changes recorded since the last save to 'output_dir/<safe_title>.journal'.
 
         Note:
             The method uses Python's built-in `pickle` module for serialization.
@@ -594,14 +1369,143 @@ class ToCManuscript(ToCDict):
         if not self.title:
             print("Manuscript title is missing. Cannot save the current state of the manuscript.")
             return
-        if self.output_dir and not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
-        if self.output_dir:
-            filepath = os.path.join(self.output_dir, f'{self.safe_title}.pkl')
-        else:
-            filepath = os.path.join(f'{self.safe_title}.pkl')
-        with open(filepath, 'wb') as file:
-            pickle.dump(self, file)
+        # Inside a batch the save is postponed to the end of the batch.
+        if self.__dict__.get('_batch_depth'):
+            self._batch_dirty = True
+            return
+        if ToCManuscript._async_save:
+            writer.submit(self)
+            return
+        self._save()
+
+    def _save(self):
+        """
+        Writes the manuscript with the configured storage backend and updates its row in the manuscript registry.
+        """
+        storage = self._get_storage()
+        # The change records are taken and the manuscript serialized while no edit is in progress, see '_state_lock'.
+        with _state_lock:
+            # Counted before the save, so the storages that restore texts lazily save the word counts with the sections.
+            stats = registry.summarize(self) if registry.enabled else None
+            storage.save(self)
+        registry.update(self, storage, stats)
+
+    def flush(self):
+        """
+        Writes a save that is still waiting for the background writer in the calling thread and returns when the manuscript is on disk. Does nothing when saves are synchronous.
+
+        Example:
+            ToCManuscript.configure(async_save=True)
+            toc_manuscript.set_currently_editing_content(content)
+            toc_manuscript.flush()
+        """
+        writer.flush(self)
+
+    def wait_persisted(self, timeout=None):
+        """
+        Blocks until the background writer has written all saves requested for the manuscript.
+
+        Parameters:
+            timeout (float): The maximum number of seconds to wait. Defaults to None, waiting without a limit.
+
+        Returns:
+            bool: True if the manuscript is persisted, False if the timeout expired.
+        """
+        return writer.wait(self, timeout)
+
+    @contextmanager
+    def batch(self, save_on_error=False):
+        """
+        Suspends saving for the duration of a block of changes. Every save requested inside the block, such as those of set_section, set_content, set_summary and move_to_next_section, is coalesced into exactly one save when the outermost batch exits, and only if something has changed.
+
+        Batches can be nested. The returned object can also be used as a decorator.
+
+        Parameters:
+            save_on_error (bool): Whether the changes are saved when the block raises an exception. Defaults to False, in which case the changes stay in memory and are saved with the next save.
+
+        Example:
+            with toc_manuscript.batch():
+                for i, title in enumerate(titles, start=1):
+                    toc_manuscript.set_section([i], title=title)
+
+            @toc_manuscript.batch(save_on_error=True)
+            def import_content(contents):
+                for index, content in contents:
+                    toc_manuscript.set_content(content, index, completed=True)
+        """
+        depth = self.__dict__.get('_batch_depth', 0)
+        self._batch_depth = depth + 1
+        failed = False
+        try:
+            yield self
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._batch_depth = depth
+            if not depth and self.__dict__.pop('_batch_dirty', False):
+                if not failed or save_on_error:
+                    self.pickle()
+
+    def compact(self):
+        """
+        Writes a full snapshot of the manuscript and discards the journal of the 'journal' storage backend. With other backends this is the same as pickle().
+
+        Example:
+            ToCManuscript.configure(storage='journal')
+            toc_manuscript = ToCManuscript(title="My Manuscript")
+            ...
+            toc_manuscript.compact()
+        """
+        if not self.title:
+            print("Manuscript title is missing. Cannot save the current state of the manuscript.")
+            return
+        # Let a running background save finish first, it would otherwise race the snapshot.
+        writer.flush(self)
+        storage = self._get_storage()
+        with _state_lock:
+            stats = registry.summarize(self) if registry.enabled else None
+            storage.compact(self)
+        registry.update(self, storage, stats)
+
+    @classmethod
+    def list(cls, output_directory=None):
+        """
+        Lists the manuscripts saved in an output directory from the manuscript registry, without restoring any of them.
+
+        Parameters:
+            output_directory (str): The output directory. Defaults to the configured output directory.
+
+        Returns:
+            list: One dictionary per manuscript, ordered by title, with the keys 'title', 'safe_title', 'subtitle', 'storage', 'path', 'sections', 'prompted_sections', 'completed_sections', 'completion', 'words', 'size' and 'mtime'.
+
+        Example:
+            for row in ToCManuscript.list():
+                print(f"{row['title']}: {row['completion']:.0%} of {row['sections']} sections, {row['words']} words")
+        """
+        return registry.list(cls._output_directory if output_directory is None else output_directory)
+
+    @classmethod
+    def open(cls, title):
+        """
+        Restores a manuscript of the configured output directory by its title or safe title, as listed by ToCManuscript.list().
+
+        Parameters:
+            title (str): The title or the safe title of the manuscript.
+
+        Returns:
+            ToCManuscript: The restored manuscript.
+
+        Raises:
+            ValueError: If the manuscript is not in the registry.
+
+        Example:
+            toc_manuscript = ToCManuscript.open('The_Forgotten_Experiment')
+        """
+        row = registry.find(cls._output_directory, title)
+        if row is None:
+            raise ValueError(f"Manuscript '{title}' was not found in the registry of '{cls._output_directory}'.")
+        return cls(title=row['title'])
 
     def get_filepath(self):
         """
@@ -621,7 +1525,7 @@ class ToCManuscript(ToCDict):
             return ''
         return os.path.join(self.output_dir, f'{self.safe_title}.md')
 
-    def get_content(self):
+    def get_content(self, indices=None, max_depth=None, include=None):
         """
         Generates a string containing details about the instance, including the author's information and publication arguments. The structure of the string is identical to the Markdown file generated by the 'generate' method.
 
@@ -629,7 +1533,10 @@ class ToCManuscript(ToCDict):
         - Title data: Contains title and subtitle strings.
         - Author section: Contains the author's name and other author-related properties.
         - Publication section: Contains the publication-related properties.
-        - Content section: Delegates to a private method '_get_content_string' to construct the actual content.
+        - Content section: The sections in numbering order, see render_iter().
+
+        Parameters:
+            indices, max_depth, include: Render only some sections or parts of them, see render_iter().
 
         Returns:
             str: The content string representing the instance's details.
@@ -650,42 +1557,158 @@ class ToCManuscript(ToCDict):
 
             [Content Section]
         """
-        content_str = ''
-        title = self.title
+        return ''.join(self.render_iter(indices=indices, max_depth=max_depth, include=include))
+
+    def render_iter(self, start=None, indices=None, max_depth=None, include=None):
+        """
+        Renders the manuscript as Markdown lazily, in chunks: the title data first, then each section in numbering order. Section texts are yielded as they are instead of being copied into a larger string, so writing the chunks one at a time needs memory only for the largest section. get_content(), generate() and render() all use this renderer.
+
+        Previews render only some sections, or only some parts of them. Sections outside the selected subtrees and below 'max_depth' are not visited at all, and content and summary texts that are not included are not read, so lazily restored texts stay on disk.
+
+        Parameters:
+            start (list|tuple): The index path of a section to render with its subsections, without the title data. Defaults to the whole manuscript.
+            indices (list): The index paths of the sections to render with their subsections, in numbering order after the title data. Sections inside another selected section are rendered once. Defaults to the whole manuscript.
+            max_depth (int): The number of levels rendered from each selected section, or from the top level for the whole manuscript. 1 renders the selected sections without their subsections. Defaults to no limit.
+            include (tuple): The parts rendered from 'render_fields': 'titles' for the headings and the title data, 'content', and 'updated', 'prompts' and 'summaries' for the details of drafts. Defaults to all of them.
+
+        Returns:
+            generator: The chunks of the Markdown text.
+
+        Raises:
+            ValueError: If both 'start' and 'indices' are given, or a part is unknown.
+            KeyError: If a selected section does not exist.
+
+        Example:
+            for chunk in toc_manuscript.render_iter():
+                response.write(chunk.encode('utf-8'))
+
+            # A table of contents of two levels.
+            print(toc_manuscript.get_content(max_depth=2, include=('titles',)))
+        """
+        if start is not None and indices is not None:
+            raise ValueError('Give either a start section or indices, not both.')
+        if include is not None:
+            unknown = [field for field in include if field not in self.render_fields]
+            if unknown:
+                raise ValueError(f"Unknown parts {unknown}. Available parts: {', '.join(self.render_fields)}.")
+            include = frozenset(include)
+        paths = [()] if start is None and indices is None else sorted(self._section_path(index) for index in ([start] if indices is None else indices))
+        # Sections inside another selected section are rendered with it.
+        paths = [path for position, path in enumerate(paths) if not any(path[:len(other)] == other for other in paths[:position])]
+        return self._render_chunks(start is None and (include is None or 'titles' in include), paths, max_depth, include)
+
+    def _render_chunks(self, title, paths, max_depth, include):
+        if title:
+            yield self._title_string()
+        for path in paths:
+            node = self.section(path) if path else self
+            for index, section in self._iter_sections('preorder', path, node, max_depth, None):
+                yield from self._section_chunks(index, section, include)
+
+    def render(self, sink=None, start=None, encoding='utf-8', buffer_size=None, indices=None, max_depth=None, include=None):
+        """
+        Renders the manuscript with render_iter() into a sink. Chunks are gathered up to 'buffer_size' characters before each write, so sockets and unbuffered streams are not written a heading at a time.
+
+        Parameters:
+            sink: Where the chunks are written. One of:
+                - None: The rendered text is returned as a string.
+                - A text stream, such as a file opened in text mode or io.StringIO.
+                - A binary stream, such as a file opened in binary mode or the 'wfile' of an HTTP request handler. The text is encoded with 'encoding'.
+                - A socket, written with sendall() and encoded with 'encoding'.
+                - A list, to which the chunks are appended.
+                - A callable, called with each chunk.
+            start (list|tuple): The index path of a section to render with its subsections. Defaults to the whole manuscript.
+            encoding (str): The encoding for binary streams and sockets. Defaults to 'utf-8'.
+            buffer_size (int): The number of characters gathered before a write. Defaults to 'render_buffer_size'. 0 writes every chunk as it is.
+            indices, max_depth, include: Render only some sections or parts of them, see render_iter().
+
+        Returns:
+            str|int: The rendered text without a sink, otherwise the number of characters written.
+
+        Raises:
+            TypeError: If the sink is none of the above.
+            ValueError, KeyError: If the selection is not valid, see render_iter().
+
+        Example:
+            toc_manuscript.render(sys.stdout)
+            toc_manuscript.render(connection, start=[2])
+        """
+        chunks = self.render_iter(start, indices, max_depth, include)
+        if sink is None:
+            return ''.join(chunks)
+        write = self._sink_writer(sink, encoding)
+        if buffer_size is None:
+            buffer_size = self.render_buffer_size
+        written = 0
+        pending = []
+        pending_size = 0
+        for chunk in chunks:
+            pending.append(chunk)
+            pending_size += len(chunk)
+            if pending_size >= buffer_size:
+                write(''.join(pending) if len(pending) > 1 else chunk)
+                written += pending_size
+                pending = []
+                pending_size = 0
+        if pending:
+            write(''.join(pending))
+            written += pending_size
+        return written
+
+    def _sink_writer(self, sink, encoding):
+        """
+        Returns a function that writes a chunk of text into a sink of render().
+        """
+        if isinstance(sink, list):
+            return sink.append
+        if hasattr(sink, 'write'):
+            if not isinstance(sink, io.TextIOBase) and (isinstance(sink, (io.RawIOBase, io.BufferedIOBase)) or 'b' in getattr(sink, 'mode', '')):
+                return lambda chunk: sink.write(chunk.encode(encoding))
+            return sink.write
+        if hasattr(sink, 'sendall'):
+            return lambda chunk: sink.sendall(chunk.encode(encoding))
+        if callable(sink):
+            return sink
+        raise TypeError(f"Cannot render into a sink of type '{type(sink).__name__}'.")
+
+    def _title_string(self):
+        """
+        Returns the title data of the rendered manuscript: the front matter, the title and the subtitle, the author and the publication details, formatted with 'output_templates'.
+        """
+        templates = self.output_templates
+        author = self.author
+        content_str = templates.front_matter(title=self.title, subtitle=self.subtitle, author=author.get('name', '') if author else '',
+                                             created=dict.get(self, 'created', ''), updated=dict.get(self, 'updated', ''))
         if self.subtitle:
-            title = f'{title}: {self.subtitle}'
-        content_str += f'{title}\n\n'
-        if self.author:
-            content_str += '_Author_\n\n'
-            if "name" in self.author:
-                content_str += f'Name: {self.author["name"]}\n'
-            for key, value in self.author.items():
+            content_str += templates.title_subtitle(title=self.title, subtitle=self.subtitle)
+        else:
+            content_str += templates.title(title=self.title, subtitle='')
+        if author:
+            fields = ''
+            if "name" in author:
+                fields += templates.field(name='Name', value=author["name"])
+            for key, value in author.items():
                 if key != "name":
-                    content_str += f'{key.capitalize()}: {value}\n'
+                    fields += templates.field(name=key.capitalize(), value=value)
+            content_str += templates.author(fields=fields)
         if self.publication_args:
-            if self.author:
-                content_str += '\n'
-            content_str += '_Publication_\n\n'
-        for key, value in self.publication_args.items():
-            content_str += f'{key.capitalize()}: {value}\n'
-        content_str += '\n'
-        content_str += self._get_content_string(self, '')
-
+            if author:
+                content_str += templates.block_separator_text
+            content_str += templates.publication(fields=''.join(templates.field(name=key.capitalize(), value=value) for key, value in self.publication_args.items()))
+        content_str += templates.title_end_text
         return content_str
 
-    def _get_content_string(self, content_dict, level_str=''):
+    def _section_chunks(self, index, section, include=None):
         """
-        Recursively constructs content from a nested dictionary into a string, using integer keys as section identifiers. This method formats content in a hierarchical structure, providing section numbers, titles, and other details as required.
+        Yields the heading and the content of a single section, without its subsections. The content text is yielded as it is, and the heading and the details of drafts come from the render cache of the section, see _section_parts().
 
         Parameters:
-            content_dict (dict): A dictionary containing the content to be constructed, organized hierarchically using integer keys.
-            level_str (str): A string representing the current numbering level in the hierarchy, e.g., "1.2.3.".
-
-        Returns:
-            str: The content string representing the hierarchical structure of the content_dict.
+            index (tuple): The index path of the section, e.g. (1, 2, 3). The heading level is its length.
+            section (dict): The section.
+            include (frozenset): The parts to render, see render_iter(). Defaults to all parts. Partial renderings are not cached, and texts that are not included are not read.
 
         Example:
-            Given a content_dict structured as:
+            Given sections structured as:
                 {
                     1: {'title': 'Introduction', 'content': 'This is the intro'},
                     2: {'title': 'Chapter 1', 'content': 'Chapter 1 content'},
@@ -703,43 +1726,90 @@ class ToCManuscript(ToCDict):
 
             Sections marked as incomplete will include an "Updated" timestamp and a "Prompt" if provided.
         """
-        content_str = ''
-        sorted_keys = sorted([k for k in content_dict.keys() if isinstance(k, int)])
-
-        for key in sorted_keys:
-            value = content_dict[key]
-            title = value.get('title', '')
-            content = value.get('content', '')
-            completed = value.get('completed', False)
-            updated = value.get('updated', '')
-            prompt = value.get('prompt', {})
-            summary = value.get('summary', '')
-            draft = ' (draft)' if not completed else ''
-            next_level_str = level_str + str(key) + '.'
-            content_str += f'%s {next_level_str} {title}{draft}\n\n' % ("#" * next_level_str.count("."))
-            content_str += f'{content}\n'
-            if not completed:
-                content_str += f'\n\nUpdated: {updated}\n\n'
-                if prompt:
-                    content_str += f'Prompt: {prompt}\n\n'
-                if summary:
-                    content_str += f'Summary: {summary}\n\n'
-            content_str += self._get_content_string(value, next_level_str)
-
-        return content_str
-
-    def generate(self):
+        if include is None:
+            heading, details = self._section_parts(index, section)
+        else:
+            heading = self._section_heading(index, section) if 'titles' in include else ''
+            details = self._section_details(section, include)
+        if heading:
+            yield heading
+        if include is None or 'content' in include:
+            content = section.get('content', '')
+            yield content if isinstance(content, str) else f'{content}'
+        yield details
+
+    def _section_parts(self, index, section):
+        """
+        Returns the rendered heading of a section and the details that follow its content. Both are cached in the section with the fingerprint they were rendered from, and rendered again only when the fingerprint changes.
+        """
+        fingerprint = self._render_fingerprint(index, section)
+        cached = getattr(section, '_rendered', None)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1], cached[2]
+        heading = self._section_heading(index, section)
+        details = self._section_details(section, self.render_fields)
+        if isinstance(section, ToCDict):
+            section._rendered = (fingerprint, heading, details)
+        return heading, details
+
+    def _section_heading(self, index, section):
+        templates = self.output_templates
+        # Titles and statuses are never lazily restored, so they are read without ToCDict.get().
+        return templates.heading(
+            hashes='#' * len(index),
+            level=len(index),
+            # Construct nested numbering for hierarchical headings, such as "1.2.3."
+            number='.'.join(str(key) for key in index) + '.' if 'number' in templates.used['heading'] else '',
+            title=dict.get(section, 'title', ''),
+            # Mark draft sections with a label
+            draft=templates.draft_text if not dict.get(section, 'completed', False) else '')
+
+    def _section_details(self, section, include):
+        templates = self.output_templates
+        details = templates.section_end_text
+        # Include additional information if the section is incomplete
+        if not dict.get(section, 'completed', False):
+            if 'updated' in include:
+                details += templates.updated(updated=section.get("updated", ""))
+            prompt = section.get('prompt', {}) if 'prompts' in include else None
+            if prompt:
+                details += templates.prompt(prompt=prompt)
+            summary = section.get('summary', '') if 'summaries' in include else None
+            if summary:
+                details += templates.summary(summary=summary)
+        return details
+
+    def _render_fingerprint(self, index, section):
+        """
+        Returns the values the heading and the details of a section are rendered from: its numbering, title, completed status, prompt and its definitions, summary and update time, and the output templates. Tuples compare their items by identity first, so comparing the fingerprint of an unchanged section is cheap. Prompt definitions and output templates are replaced instead of changed, so their identity is enough.
+        """
+        prompt = dict.get(section, 'prompt')
+        return (index, dict.get(section, 'title', ''), dict.get(section, 'completed', False), prompt,
+                getattr(prompt, 'directives', None), getattr(prompt, 'guidelines', None), getattr(prompt, 'constraints', None),
+                dict.get(section, 'summary', ''), dict.get(section, 'updated', ''), self.output_templates)
+
+    def generate(self, return_content=True, workers=None, indices=None, max_depth=None, include=None):
         """
         Generates a Markdown file containing details about the instance, including the author's information and publication arguments. The file is named after the instance's name and is saved in the 'text_output' directory.
 
+        The file is written in UTF-8 through a large buffer, one section at a time. The manuscript remembers the fingerprint and the byte length of each rendered section in the file, so the next call rewrites only what has changed since: a section whose new rendering has the same length is patched in place, otherwise the file is rewritten from the first changed section on, copying the unchanged sections after it from the file instead of rendering them. The file is written from scratch when it was changed by others.
+
         The file structure includes:
         - Title data: Contains title and subtitle strings.
         - Author section: Contains the author's name and other author-related properties.
         - Publication section: Contains the publication-related properties.
-        - Content section: Delegates to a private method '_write_content' to write the actual content.
+        - Content section: The sections in numbering order, see render_iter().
 
         Note: If the 'text_output' directory does not exist, it will be created.
 
+        Parameters:
+            return_content (bool): Whether the written content is returned. Defaults to True. With False only the file path is returned, the content is never held in memory as a whole and an unchanged manuscript is not rendered at all.
+            workers (int): The number of worker processes that render the top-level sections with their subsections when the file is written from scratch. The results are written into the file in numbering order. Defaults to None, rendering in this process. The sections are pickled to the workers, so this pays off only for large manuscripts on several cores.
+            indices, max_depth, include: Write a preview of only some sections or parts of them into the file, see render_iter(). A preview is always written in this process and from scratch, and the next full generation writes the whole file again.
+
+        Returns:
+            str: The content of the file, or its path if 'return_content' is False.
+
         Example File Structure:
             Title: Sub title
 
@@ -756,145 +1826,241 @@ class ToCManuscript(ToCDict):
 
             [Content Section]
         """
-        output_dir = 'text_output'
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
         filepath = self.get_filepath()
         if not filepath:
             return ''
-        with open(filepath, 'w') as file:
-            title = self.title
-            if self.subtitle:
-                title = f'{title}: {self.subtitle}'
-            file.write(f'{title}\n\n')
-            if self.author:
-                file.write('_Author_\n\n')
-                if "name" in self.author:
-                    file.write(f'Name: {self.author["name"]}\n')
-                for key, value in self.author.items():
-                    if key != "name":
-                        file.write(f'{key.capitalize()}: {value}\n')
-            if self.publication_args:
-                if self.author:
-                    file.write('\n')
-                file.write('_Publication_\n\n')
-            for key, value in self.publication_args.items():
-                file.write(f'{key.capitalize()}: {value}\n')
-            file.write('\n')
-            self._write_content(file, self)
-        with open(filepath, 'r') as file:
-            return file.read()
-
-    def _write_content(self, file, content_dict, level_str=''):
-        """
-        Recursively writes content from a nested dictionary into a given file, using integer keys as section identifiers. This method formats content in a hierarchical structure, providing section numbers, titles, and other details as required.
+        if indices is not None or max_depth is not None or include is not None:
+            return self._write_preview(filepath, return_content, indices, max_depth, include)
+        entries = self._render_entries()
+        if self._patch_output(filepath, entries):
+            content = None
+        elif workers and workers > 1:
+            content = self._write_output_parallel(filepath, entries, workers, return_content)
+        else:
+            content = self._write_output(filepath, entries, return_content)
+        if not return_content:
+            return filepath
+        if content is None:
+            # The file was up to date or patched. Its text is joined from the parts, whose headings and details come from the render cache, without walking the sections again.
+            content = ''.join(chunk for key, fingerprint, section in entries for chunk in self._entry_chunks(key, section))
+        return content
+
+    @classmethod
+    def generate_many(cls, manuscripts, workers=None):
+        """
+        Generates the Markdown files of several manuscripts in a pool of worker processes, one manuscript per worker at a time. The workers use the configuration of this process, see configure(), and the output templates set to the given manuscript instances.
 
         Parameters:
-            file (File): The file object to which the content will be written.
-            content_dict (dict): A dictionary containing the content to be written, organized hierarchically using integer keys.
-            level_str (str): A string representing the current numbering level in the hierarchy, e.g., "1.2.3.".
+            manuscripts (list): ToCManuscript instances, or titles or safe titles of manuscripts in the configured output directory, restored like in ToCManuscript.open().
+            workers (int): The number of worker processes. Defaults to None, one per CPU. 1 generates the files one by one in this process.
 
-        Example:
-            Given a content_dict structured as:
-                {
-                    1: {'title': 'Introduction', 'content': 'This is the intro'},
-                    2: {'title': 'Chapter 1', 'content': 'Chapter 1 content'},
-                    ...
-                }
-            The output will be:
-                # 1. Introduction
+        Returns:
+            list: The paths of the generated files, in the order of 'manuscripts'.
 
-                This is the intro
+        Raises:
+            ValueError: If a title is not in the registry of the output directory.
 
-                # 2. Chapter 1
+        Example:
+            ToCManuscript.generate_many([row['title'] for row in ToCManuscript.list()], workers=4)
+        """
+        manuscripts = list(manuscripts)
+        # The templates of a manuscript are not pickled with it, see '_transient_attributes'.
+        templates = [manuscript.__dict__.get('output_templates') if isinstance(manuscript, ToCManuscript) else None for manuscript in manuscripts]
+        if workers == 1 or len(manuscripts) < 2:
+            return list(map(_generate_manuscript, manuscripts, templates))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_configure_worker, initargs=(cls._settings(),)) as executor:
+            return list(executor.map(_generate_manuscript, manuscripts, templates))
 
-                Chapter 1 content
-                ...
+    @classmethod
+    def _settings(cls):
+        """
+        Returns the configure() settings that the worker processes of generate_many() start with.
+        """
+        return {'output_directory': cls._output_directory, 'storage': cls._storage, 'database': storages['sqlite'].database,
+                'allow_pickle': storages['json'].allow_pickle, 'lazy_restore': Storage.lazy, 'registry': registry.enabled,
+                'templates': cls.output_templates}
 
-            Sections marked as incomplete will include an "Updated" timestamp and a "Prompt" if provided.
+    def _write_preview(self, filepath, return_content, indices, max_depth, include):
         """
-        # Sorting keys ensure that the sections are processed in the correct order
-        sorted_keys = sorted([k for k in content_dict.keys() if isinstance(k, int)])
+        Writes a partial rendering into the generated file, see generate().
+        """
+        chunks = self.render_iter(indices=indices, max_depth=max_depth, include=include)
+        # The file no longer matches the render table of the whole manuscript.
+        self.__dict__.pop('_render_table', None)
+        with open(filepath, 'w', encoding=self.render_encoding, buffering=self.render_buffer_size) as file:
+            if return_content:
+                content = ''.join(chunks)
+                file.write(content)
+                return content
+            file.writelines(chunks)
+        return filepath
 
-        for key in sorted_keys:
-            value = content_dict[key]
-            title = value.get('title', '')
-            content = value.get('content', '')
-            completed = value.get('completed', False)
-            updated = value.get('updated', '')
-            prompt = value.get('prompt', {})
-            summary = value.get('summary', '')
+    def _render_entries(self):
+        """
+        Returns the parts of the generated file as (key, fingerprint, section) tuples: the title data with the key None, followed by the sections by index path. The fingerprint of a section includes its content.
+        """
+        entries = [(None, self._title_fingerprint(), None)]
+        for index, section in self.iter_sections():
+            entries.append((index, (self._render_fingerprint(index, section), dict.get(section, 'content', '')), section))
+        return entries
 
-            # Mark draft sections with a label
-            draft = ' (draft)' if not completed else ''
+    def _title_fingerprint(self):
+        author = self.author
+        templates = self.output_templates
+        # The times change with every edit, so they count only if the front matter shows them.
+        times = tuple(dict.get(self, name) for name in ('created', 'updated') if name in templates.used['front_matter'])
+        return (self.title, self.subtitle, tuple(author.items()) if author else None, tuple(self.publication_args.items()), templates, times)
 
-            # Construct nested numbering for hierarchical headings, such as "1.2.3."
-            next_level_str = level_str + str(key) + '.'
+    def _entry_chunks(self, key, section):
+        """
+        Returns the chunks of a part of the generated file.
+        """
+        return [self._title_string()] if key is None else self._section_chunks(key, section)
 
-            # Write the heading using the corresponding number of "#" symbols
-            file.write(f'%s {next_level_str} {title}{draft}\n\n' % ("#" * next_level_str.count(".")))
-            file.write(f'{content}\n')
+    def _render_entry(self, key, section):
+        """
+        Returns the encoded chunks of a part of the generated file.
+        """
+        return [chunk.encode(self.render_encoding) for chunk in self._entry_chunks(key, section)]
 
-            # Include additional information if the section is incomplete
-            if not completed:
-                file.write(f'\n\nUpdated: {updated}\n\n')
-                if prompt:
-                    file.write(f'Prompt: {prompt}\n\n')
-                if summary:
-                    file.write(f'Summary: {summary}\n\n')
+    def _write_output(self, filepath, entries, return_content=False):
+        """
+        Writes the whole generated file and remembers the byte length of each part in '_render_table'.
+
+        Returns:
+            str: The written content, or None if 'return_content' is False.
+        """
+        table = []
+        parts = [] if return_content else None
+        with open(filepath, 'wb', buffering=self.render_buffer_size) as file:
+            for key, fingerprint, section in entries:
+                size = 0
+                for chunk in self._render_entry(key, section):
+                    file.write(chunk)
+                    size += len(chunk)
+                    if parts is not None:
+                        parts.append(chunk)
+                table.append((key, fingerprint, size))
+        self._render_table = {'path': filepath, 'entries': table, 'stat': self._file_stat(filepath)}
+        return b''.join(parts).decode(self.render_encoding) if parts is not None else None
+
+    def _write_output_parallel(self, filepath, entries, workers, return_content):
+        """
+        Writes the whole generated file like _write_output(), rendering the top-level sections with their subsections in a pool of worker processes, see _render_subtree().
 
-            # Recurse into sub-sections if present
-            self._write_content(file, value, next_level_str)
+        Returns:
+            str: The written content, or None if 'return_content' is False.
+        """
+        keys = [key for key in section_keys(self) if isinstance(dict.__getitem__(self, key), dict)]
+        header = b''.join(self._render_entry(None, None))
+        sizes = [len(header)]
+        parts = [header] if return_content else None
+        with open(filepath, 'wb', buffering=self.render_buffer_size) as file:
+            file.write(header)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(_render_subtree, keys, (dict.__getitem__(self, key) for key in keys), repeat(self.render_encoding), repeat(self.output_templates))
+                for data, section_sizes in results:
+                    file.write(data)
+                    sizes.extend(section_sizes)
+                    if parts is not None:
+                        parts.append(data)
+        table = [(key, fingerprint, size) for (key, fingerprint, section), size in zip(entries, sizes)]
+        self._render_table = {'path': filepath, 'entries': table, 'stat': self._file_stat(filepath)}
+        return b''.join(parts).decode(self.render_encoding) if parts is not None else None
+
+    def _patch_output(self, filepath, entries):
+        """
+        Updates the generated file from the previous one with the parts that have changed, see generate().
+
+        Returns:
+            bool: False if the previous file cannot be used and the whole file must be written.
+        """
+        table = self.__dict__.get('_render_table')
+        if not table or table['path'] != filepath or not os.path.exists(filepath) or self._file_stat(filepath) != table['stat']:
+            return False
+        old = table['entries']
+        # The unchanged parts at the start and at the end of the file.
+        start = 0
+        offset = 0
+        while start < len(old) and start < len(entries) and old[start][0] == entries[start][0] and old[start][1] == entries[start][1]:
+            offset += old[start][2]
+            start += 1
+        if start == len(old) == len(entries):
+            return True
+        end = 0
+        while end < len(old) - start and end < len(entries) - start and old[-1 - end][0] == entries[-1 - end][0] and old[-1 - end][1] == entries[-1 - end][1]:
+            end += 1
+        old_size = sum(size for key, fingerprint, size in old[start:len(old) - end])
+        changed = []
+        chunks = []
+        for key, fingerprint, section in entries[start:len(entries) - end]:
+            rendered = self._render_entry(key, section)
+            chunks += rendered
+            changed.append((key, fingerprint, sum(len(chunk) for chunk in rendered)))
+        new_size = sum(size for key, fingerprint, size in changed)
+        with open(filepath, 'r+b') as file:
+            if new_size == old_size:
+                file.seek(offset)
+                file.writelines(chunks)
+            else:
+                # The unchanged end of the file moves with the changed size.
+                file.seek(offset + old_size)
+                rest = file.read()
+                file.seek(offset)
+                file.writelines(chunks)
+                file.write(rest)
+                file.truncate()
+        table['entries'] = old[:start] + changed + old[len(old) - end:]
+        table['stat'] = self._file_stat(filepath)
+        return True
+
+    def _file_stat(self, filepath):
+        stat = os.stat(filepath)
+        return (stat.st_size, stat.st_mtime_ns)
 
     def find_next_index(self):
-        return self._find_next_index(self.currently_editing_index, self)
+        """
+        Returns the index of the section after the currently editing section in depth-first order, without moving to it.
+        """
+        return self._find_next_index(self.currently_editing_index)
 
-    def _find_next_index(self, index, toc):
+    def _find_next_index(self, index):
         """
-        Recursively find the index of the next available depth-first section in the TOC.
+        Finds the index of the next section in depth-first order from the pre-order links of the section index.
 
         Parameters:
             index (list): The current index in the TOC.
-            toc (dict): The TOC structure.
 
         Returns:
-            list: The index of the next available section or the first section if no next section is found.
+            list: The index of the next section, or an empty list after the last section.
+
+        Raises:
+            KeyError: If the index does not point to a section.
 
         Example Cases:
-            - Starting from an empty index: Returns the index of the first key in the TOC.
-            - Starting from a section: Returns the index of the next sibling section at the same level.
-            - If no sibling sections exist: Move up one level and repeat the process.
-            - If no next section is found at any level: Start from the beginning of the TOC.
-
-        """
-        if not index:
-            for key in toc.keys():
-                if isinstance(key, int):
-                    return [key]
-            return []
-
-        # Check for children at the current level
-        current_level = toc
-        for i in index:
-            current_level = current_level[i]
-
-        for key in current_level.keys():
-            if isinstance(key, int):
-                return index + [key]
-
-        # If no children are found, try to find the next sibling section at the same level or above
-        for level in range(len(index) - 1, -1, -1):
-            current_level = toc
-            for i in index[:level]:
-                current_level = current_level[i]
-
-            keys = list(current_level.keys())
-            current_key_index = keys.index(index[level])
-            for key in keys[current_key_index + 1:]:
-                if isinstance(key, int):
-                    return index[:level] + [key]
+            - Starting from an empty index: Returns the index of the first section in the TOC.
+            - Starting from a section with subsections: Returns the index of its first subsection.
+            - Otherwise: Returns the index of the next sibling of the section or of its closest ancestor with one.
+        """
+        self._get_section_index()
+        next_path = self._next_section[tuple(index)]
+        return list(next_path) if next_path is not None else []
 
-        return []
+    def _find_previous_index(self, index):
+        """
+        Finds the index of the previous section in depth-first order. The reverse of _find_next_index(): from an empty index it returns the last section, and from the first section an empty list.
+        """
+        self._get_section_index()
+        path = tuple(index)
+        if not path:
+            previous_path = self._last_descendant((), self)
+        else:
+            if path not in self._section_index:
+                raise KeyError(index)
+            previous_path = self._previous_section[path]
+        return list(previous_path)
 
     def get_prompt_by_index(self, index = []):
         return self.get_currently_editing_prompt(index)
@@ -922,10 +2088,7 @@ class ToCManuscript(ToCDict):
 
         See the Prompt class documentation for more details on the structure and usage of Prompt objects.
         """
-        nested_dict = self
-        start_index = index if index else self.currently_editing_index
-        for idx in start_index:
-            nested_dict = nested_dict[idx]
+        nested_dict = self.section(index if index else self.currently_editing_index)
         title = nested_dict.get("title", "")
         prompt = nested_dict.get("prompt", "")
         if title == "":
@@ -943,10 +2106,7 @@ class ToCManuscript(ToCDict):
         Returns:
             dict: The nested dictionary content at the location specified by 'currently_editing_index'. If 'currently_editing_index' is empty or does not correspond to a valid path, the entire dictionary is returned.
         """
-        nested_dict = self
-        for idx in self.currently_editing_index:
-            nested_dict = nested_dict[idx]
-        return nested_dict
+        return self.section(self.currently_editing_index)
 
     def set_currently_editing_summary(self, summary):
         """
@@ -957,6 +2117,7 @@ class ToCManuscript(ToCDict):
         """
         self.set_summary(summary, self.currently_editing_index)
 
+    @synchronized
     def set_summary(self, summary, editing_index):
         """
         Sets the summary for the given editing index.
@@ -966,9 +2127,7 @@ class ToCManuscript(ToCDict):
             editing_index (list): The index path to the location within the nested dictionary where the summary should be updated.
         """
         # Get the reference to the nested dictionary using the index_path
-        nested_dict = self
-        for idx in editing_index:
-            nested_dict = nested_dict[idx]
+        nested_dict = self.section(editing_index)
 
         # Update the content key within the nested dictionary
         nested_dict['summary'] = summary
@@ -992,6 +2151,7 @@ class ToCManuscript(ToCDict):
         """
         self.set_content(content, self.currently_editing_index, completed)
 
+    @synchronized
     def set_content(self, content, editing_index, completed=False):
         """
         Sets the content for the given editing index.
@@ -1002,9 +2162,7 @@ class ToCManuscript(ToCDict):
             completed (bool): A flag indicating whether the content editing is completed. Defaults to False.
         """
         # Get the reference to the nested dictionary using the index_path
-        nested_dict = self
-        for idx in editing_index:
-            nested_dict = nested_dict[idx]
+        nested_dict = self.section(editing_index)
 
         # Update the content key within the nested dictionary
         nested_dict['content'] = content
@@ -1021,15 +2179,24 @@ class ToCManuscript(ToCDict):
         # Save state.
         self.pickle()
 
+    @synchronized
     def check_complete(self):
         """
         Checks the completion status of all sections in the manuscript. If all sections are marked as complete, the manuscript's global completion status is set to True. Otherwise, a notice is printed, and a list of all incomplete sections is provided.
         """
-        incomplete_sections = self._check_completion_status(self, [])
+        if not self.progress()['drafts']:
+            incomplete_sections = []
+        else:
+            # Storages that can answer with a query need the latest state on disk first.
+            self.wait_persisted()
+            incomplete_sections = self._get_storage().incomplete_sections(self)
+            if incomplete_sections is None:
+                incomplete_sections = self._check_completion_status()
 
         if not incomplete_sections:
             print("All sections are completed.")
             self.completed = True
+            self._record_change((), 'completed', True, attribute=True)
             # Save state.
             self.pickle()
         else:
@@ -1037,44 +2204,104 @@ class ToCManuscript(ToCDict):
             for section in incomplete_sections:
                 print(f"Section {section['level_str']} - {section['title']}")
 
-    def _check_completion_status(self, content_dict, level_str_list):
+    def _check_completion_status(self, start=None):
         """
-        Recursively checks the completion status of sections in the nested dictionary and returns a list of incomplete sections.
+        Returns the sections that have a prompt but are not completed. Subtrees without drafts are skipped by their completion counters.
 
         Parameters:
-            content_dict (dict): A dictionary containing the content to be checked.
-            level_str_list (list): A list of strings representing the current numbering level in the hierarchy.
+            start (list|tuple): The index path of a section to check, including its subsections. Defaults to the whole manuscript.
 
         Returns:
             list: A list of dictionaries containing details about the incomplete sections.
         """
-        incomplete_sections = []
-        sorted_keys = sorted([k for k in content_dict.keys() if isinstance(k, int)])
+        return [{'level_str': '.'.join(str(key) for key in index) + '.', 'title': self.section(index).get('title', '')}
+                for index in self._iter_incomplete(tuple(start) if start else ())]
 
-        for key in sorted_keys:
-            value = content_dict[key]
-            title = value.get('title', '')
-            prompt = value.get('prompt', None)
-            completed = value.get('completed', False)
+    def _iter_incomplete(self, path, after=None):
+        """
+        Yields the paths of the incomplete sections of a subtree in numbering order, descending only into subtrees that have drafts.
 
-            # Construct the current numbering for hierarchical headings
-            next_level_str_list = level_str_list + [str(key)]
+        Parameters:
+            path (tuple): The root of the subtree, included.
+            after (tuple): Skip the sections up to and including this path in numbering order.
+        """
+        self._get_section_index()
+        counts = self._section_counts
+        pending = [path]
+        while pending:
+            path = pending.pop()
+            if path and counts[path][0] > counts[path][1] and (after is None or path > after):
+                yield path
+            node = self._section_index[path]
+            children = []
+            for key in section_keys(node):
+                child_path = path + (key,)
+                child_counts = counts.get(child_path)
+                if child_counts is None or child_counts[3] == child_counts[4]:
+                    continue
+                # Subtrees that come entirely before 'after' are skipped.
+                if after is not None and child_path < after and after[:len(child_path)] != child_path:
+                    continue
+                children.append(child_path)
+            children.reverse()
+            pending += children
+
+    def progress(self, index=None):
+        """
+        Returns the completion counters of the manuscript or of a section and its subsections. The counters are kept up to date as sections are set, completed and removed, so this does not walk the sections.
 
-            if not completed and prompt is not None:
-                level_str = '.'.join(next_level_str_list) + '.'
-                incomplete_sections.append({'level_str': level_str, 'title': title})
+        Parameters:
+            index (list|tuple): The index path of a section. Defaults to the whole manuscript.
+
+        Returns:
+            dict: 'sections', 'prompted_sections', 'completed_sections', 'drafts' as the prompted sections that are not completed, and 'completion' as the ratio of completed sections among the prompted ones.
 
-            # Recurse into sub-sections if present
-            incomplete_sections += self._check_completion_status(value, next_level_str_list)
+        Raises:
+            KeyError: If the section does not exist.
 
-        return incomplete_sections
+        Example:
+            toc_manuscript.progress()['completion']  # 0.25
+            toc_manuscript.progress([2])['drafts']  # 3
+        """
+        self._get_section_index()
+        path = tuple(index) if index else ()
+        if path not in self._section_counts:
+            raise KeyError(path)
+        sections, prompted, completed = self._section_counts[path][2:]
+        return {
+            'sections': sections,
+            'prompted_sections': prompted,
+            'completed_sections': completed,
+            'drafts': prompted - completed,
+            'completion': completed / prompted if prompted else 1.0,
+        }
 
+    def find_next_incomplete_index(self, index=None):
+        """
+        Finds the next section in numbering order that has a prompt but is not completed.
+
+        Parameters:
+            index (list): The index to search after. Defaults to the currently editing index. An empty index searches from the beginning.
+
+        Returns:
+            list: The index of the next incomplete section, or an empty list if there are none after the index.
+
+        Example:
+            toc_manuscript.find_next_incomplete_index()  # [2, 3]
+        """
+        if index is None:
+            index = self.currently_editing_index
+        for path in self._iter_incomplete((), tuple(index) if index else None):
+            return list(path)
+        return []
+
+    @synchronized
     def move_to_next_section(self):
         """
         Navigate to the next available section in the TOC.
 
-        This method traverses the nested structure of the TOC, considering various keys and levels of nesting,
-        and updates the currently_editing_index to point to the next available section.
+        This method follows the depth-first order of the sections kept by the section index, and updates the
+        currently_editing_index to point to the next available section. After the last section the index is empty.
 
         Returns:
             next_index (list): The index of the next available section.
@@ -1085,64 +2312,35 @@ class ToCManuscript(ToCDict):
             This will traverse to the next index every time method is called. If you want to keep
             a more static index and know exactly what you want, use: self.currently_editing_index = [indices...]
         """
-
-        def find_next_index(index, toc):
-            """
-            Recursively find the index of the next available depth-first section in the TOC.
-
-            Parameters:
-                index (list): The current index in the TOC.
-                toc (dict): The TOC structure.
-
-            Returns:
-                next_index (list): The index of the next available section or the first section if no next section is found.
-
-            Example Cases:
-                - Starting from an empty index: Returns the index of the first key in the TOC.
-                - Starting from a section: Returns the index of the next sibling section at the same level.
-                - If no sibling sections exist: Move up one level and repeat the process.
-                - If no next section is found at any level: Start from the beginning of the TOC.
-
-            """
-            if not index:
-                for key in toc.keys():
-                    if isinstance(key, int):
-                        return [key]
-                return []
-
-            # Check for children at the current level
-            current_level = toc
-            for i in index:
-                current_level = current_level[i]
-
-            for key in current_level.keys():
-                if isinstance(key, int):
-                    return index + [key]
-
-            # If no children are found, try to find the next sibling section at the same level or above
-            for level in range(len(index) - 1, -1, -1):
-                current_level = toc
-                for i in index[:level]:
-                    current_level = current_level[i]
-
-                keys = list(current_level.keys())
-                current_key_index = keys.index(index[level])
-                for key in keys[current_key_index + 1:]:
-                    if isinstance(key, int):
-                        return index[:level] + [key]
-
-            # If no next section is found at any level, start from the beginning of the TOC
-            return find_next_index([], toc)
-
         # Find the next index and update the currently_editing_index
-        next_index = self._find_next_index(self.currently_editing_index, self)
+        next_index = self._find_next_index(self.currently_editing_index)
         if not self.currently_editing_index and not self.first_index:
             self.first_index = next_index
+            self._record_change((), 'first_index', next_index, attribute=True)
         self.currently_editing_index = next_index
+        self._record_change((), 'currently_editing_index', next_index, attribute=True)
         # Save state.
         self.pickle()
         return next_index
 
+    @synchronized
+    def move_to_previous_section(self):
+        """
+        Navigate to the previous section in the TOC, the reverse of move_to_next_section().
+
+        Returns:
+            previous_index (list): The index of the previous section, or an empty list when moving back from the first section.
+
+        Example:
+            toc_manuscript.move_to_previous_section()  # Returns the index of the previous section
+        """
+        previous_index = self._find_previous_index(self.currently_editing_index)
+        self.currently_editing_index = previous_index
+        self._record_change((), 'currently_editing_index', previous_index, attribute=True)
+        # Save state.
+        self.pickle()
+        return previous_index
+
     def get_next_prompt_directives(self):
         """
         Get the directives for the next prompt based on the next index.
@@ -1215,6 +2413,57 @@ class ToCManuscript(ToCDict):
         
         return result
 
+    @synchronized
+    def cursor(self, name, subtree=None, lease=None):
+        """
+        Returns the named editing cursor, creating it on first use. Cursors have their own position and claim sections, so several worker threads can write the same manuscript without handing out the same section twice. Claims are not shared between processes. See the Cursor class.
+
+        Parameters:
+            name (str): The name of the cursor, e.g. 'worker-3'.
+            subtree (list): Limits the cursor to the subtree of a section. Defaults to the whole manuscript for a new cursor, and to the current subtree for an existing one.
+            lease (float): Seconds a claimed section is held without writes through the cursor. Defaults to Cursor.default_lease for a new cursor. Pass 0 or less to hold claims until they are released.
+
+        Returns:
+            Cursor: The cursor.
+
+        Raises:
+            KeyError: If the subtree section does not exist.
+
+        Example:
+            cursor = toc_manuscript.cursor('worker-3', subtree=[4])
+            cursor.move_next()  # [4, 1]
+        """
+        if subtree is not None:
+            self._section_path(subtree)
+        with _claims_lock:
+            states = self.__dict__.setdefault('editing_cursors', {})
+            state = states.get(name)
+            if state is None:
+                state = states[name] = {'subtree': [], 'index': [], 'lease': Cursor.default_lease, 'expires': None}
+            if subtree is not None and list(subtree) != state['subtree']:
+                state['subtree'] = list(subtree)
+                # A claim outside of the new subtree is released.
+                if tuple(state['index'][:len(subtree)]) != tuple(subtree):
+                    state['index'], state['expires'] = [], None
+            if lease is not None:
+                state['lease'] = lease if lease > 0 else None
+            self._record_cursors()
+        return Cursor(self, name)
+
+    def _claimed_sections(self, exclude=None):
+        """
+        Returns the index paths of the sections claimed by the cursors with a valid lease, by path.
+        """
+        now = time.time()
+        claimed = {}
+        for name, state in self.__dict__.get('editing_cursors', {}).items():
+            if name != exclude and state['index'] and (state['expires'] is None or state['expires'] > now):
+                claimed[tuple(state['index'])] = name
+        return claimed
+
+    def _record_cursors(self):
+        self._record_change((), 'editing_cursors', self.editing_cursors, attribute=True)
+
     def print_toc(self, output_summaries = True):
         """
         Print the Table of Contents (TOC) in a hierarchical tree format.
@@ -1234,46 +2483,29 @@ class ToCManuscript(ToCDict):
               - Frank Rosenblatt and the Inception of the Perceptron
             ...
         """
+        # Whether all subsections of a parent are completed, evaluated once per parent.
+        siblings_completed = {}
+        for index, section in self.iter_sections():
+            # Calculate the indentation based on the level of the section
+            indent = '  ' * (len(index) - 1)
+            title = section.get('title', '')
+
+            # If 'prompt' key exists, use its 'completed' status
+            if 'prompt' in section:
+                completed = ' (completed)' if section.get('completed', False) else ''
+            # If 'prompt' key doesn't exist, check the 'completed' status of all sections under the same parent
+            elif len(index) > 1:
+                parent = index[:-1]
+                if parent not in siblings_completed:
+                    siblings_completed[parent] = all(sibling.get('completed', False) for sibling in self.section(parent).values() if isinstance(sibling, ToCDict))
+                completed = ' (completed)' if siblings_completed[parent] else ''
+            else:
+                completed = ''
 
-        def _print_toc(toc, level=0, parent=None):
-            """
-            Recursive inner function to print the TOC at different levels.
-
-            Parameters:
-                toc (dict): The TOC structure at the current level.
-                level (int): The current level of indentation, allowing for a clear visual representation of the hierarchy.
-
-            Behavior:
-                - Iterates through the keys and values of the TOC at the current level.
-                - If the value is a ToCDict instance, print the title with the appropriate indentation.
-                - Recursively calls itself for nested levels, increasing the indentation.
-            """
-            # Calculate the indentation based on the current level
-            indent = '  ' * level
-            for key, value in toc.items():
-                if isinstance(value, ToCDict):
-                    title = value.get('title', '')
-
-                    # If 'prompt' key exists, use its 'completed' status
-                    if 'prompt' in value:
-                        completed = ' (completed)' if value.get('completed', False) else ''
-                    else:
-                        # If 'prompt' key doesn't exist, check the 'completed' status of all immediate siblings under the same parent
-                        if parent is not None:
-                            completed = ' (completed)' if all(sibling.get('completed', False) for k, sibling in parent.items() if isinstance(sibling, ToCDict)) else ''
-                        else:
-                            completed = ''
-
-                    print(f'{indent}- {title}{completed}')
-
-                    if 'summary' in value:
-                        summary = value.get('summary', '')
-                        print(f'{indent}  {summary}')
-
-                    _print_toc(value, level + 1, parent=value)
+            print(f'{indent}- {title}{completed}')
 
-        # Start the recursive printing from the root level
-        _print_toc(self)
+            if output_summaries and 'summary' in section:
+                print(f'{indent}  {section.get("summary", "")}')
 
     @classmethod
     def configure(cls, **kwargs):
@@ -1281,11 +2513,35 @@ class ToCManuscript(ToCDict):
         Class method to configure settings for ToCManuscript.
         
         Parameters:
-            kwargs (dict): Keyword arguments to set configurations. Currently supports 'output_directory'.
+            kwargs (dict): Keyword arguments to set configurations. Currently supports:
+                - 'output_directory': The directory for the saved state and the generated Markdown files.
+                - 'storage': The storage backend, 'pickle' (default), 'journal', 'sharded', 'sqlite' or 'json'.
+                - 'journal_max_bytes': The journal size that triggers compaction into a snapshot.
+                - 'journal_ratio': The journal to snapshot size ratio that triggers compaction.
+                - 'database': The database file of the 'sqlite' storage. Defaults to 'manuscripts.sqlite3' in the output directory.
+                - 'allow_pickle': Whether the 'json' storage may read manuscripts saved by the pickle backend. Unpickling can execute code, so it defaults to False, see migrate().
+                - 'lazy_restore': Whether section texts are read on first access instead of on restore. Supported by the 'sharded' and 'sqlite' storages.
+                - 'async_save': Whether saves are written by a background thread. See flush() and wait_persisted().
+                - 'compression': Compresses section content and summary texts in pickled snapshots, 'zlib', 'lzma' or None (default).
+                - 'compression_level': The compression level from 0 to 9.
+                - 'compression_dictionary': Whether zlib uses a dictionary trained on the manuscript text.
+                - 'compression_cache_size': How many decompressed texts are kept in memory. Defaults to 256.
+                - 'registry': Whether saves update the manuscript registry of the output directory. Defaults to True.
+                - 'templates': The formats of the rendered manuscript, an OutputTemplates or a dictionary of string.Template strings by element. None restores the defaults. See the Templates module.
         
+        Raises:
+            ValueError: If the storage backend or the compression is unknown, or a template is not valid.
+
         Usage:
             ToCManuscript.configure(output_directory='/path/to/dir')
+            ToCManuscript.configure(storage='journal', journal_max_bytes=512 * 1024)
+            ToCManuscript.configure(storage='sqlite', database='/path/to/manuscripts.sqlite3')
+            ToCManuscript.configure(async_save=True)
+            ToCManuscript.configure(compression='zlib', compression_level=9, compression_dictionary=True)
+            ToCManuscript.configure(templates={'heading': '${hashes} ${title}\n\n', 'draft': ''})
         """
+        configured = False
+
         # Check if 'output_directory' is provided in keyword arguments.
         if 'output_directory' in kwargs:
             # Set the class attribute _output_directory.
@@ -1294,8 +2550,109 @@ class ToCManuscript(ToCDict):
             # Get the absolute path and print it.
             abs_path = os.path.abspath(cls._output_directory)
             print(f'Output directory set to: {abs_path}')
-        else:
+            configured = True
+
+        if 'storage' in kwargs:
+            if kwargs['storage'] not in storages:
+                raise ValueError(f"Unknown storage '{kwargs['storage']}'. Available storages: {', '.join(storages)}.")
+            cls._storage = kwargs['storage']
+            print(f'Storage set to: {cls._storage}')
+            configured = True
+
+        if 'journal_max_bytes' in kwargs:
+            storages['journal'].max_bytes = kwargs['journal_max_bytes']
+            configured = True
+
+        if 'journal_ratio' in kwargs:
+            storages['journal'].ratio = kwargs['journal_ratio']
+            configured = True
+
+        if 'database' in kwargs:
+            storages['sqlite'].database = kwargs['database']
+            configured = True
+
+        if 'allow_pickle' in kwargs:
+            storages['json'].allow_pickle = bool(kwargs['allow_pickle'])
+            configured = True
+
+        if 'lazy_restore' in kwargs:
+            Storage.lazy = bool(kwargs['lazy_restore'])
+            print(f'Lazy restore: {"on" if Storage.lazy else "off"}')
+            configured = True
+
+        if 'async_save' in kwargs:
+            cls._async_save = bool(kwargs['async_save'])
+            print(f'Asynchronous saving: {"on" if cls._async_save else "off"}')
+            configured = True
+
+        if any(name in kwargs for name in ('compression', 'compression_level', 'compression_dictionary')):
+            current = Storage.compressor
+            method = kwargs.get('compression', current.method if current else 'zlib')
+            if method is None:
+                Storage.compressor = None
+                print('Compression: off')
+            else:
+                level = kwargs.get('compression_level', current.level if current else None)
+                dictionary = kwargs.get('compression_dictionary', current.dictionary if current else False)
+                Storage.compressor = TextCompressor(method, level, bool(dictionary))
+                print(f'Compression: {method}')
+            configured = True
+
+        if 'registry' in kwargs:
+            registry.enabled = bool(kwargs['registry'])
+            configured = True
+
+        if 'compression_cache_size' in kwargs:
+            cache.resize(kwargs['compression_cache_size'])
+            configured = True
+
+        if 'templates' in kwargs:
+            templates = kwargs['templates']
+            if not isinstance(templates, OutputTemplates):
+                templates = OutputTemplates(**(templates or {}))
+            cls.output_templates = templates
+            configured = True
+
+        if not configured:
             print('No settings to configure.')
 
+def _render_subtree(key, section, encoding, templates):
+    """
+    Renders a top-level section with its subsections in a worker process of ToCManuscript.generate().
+
+    Returns:
+        tuple: The encoded text and the byte length of each rendered section in numbering order.
+    """
+    renderer = ToCManuscript.__new__(ToCManuscript)
+    renderer.output_templates = templates
+    chunks = []
+    sizes = []
+    for index, node in renderer._iter_sections('preorder', (key,), section, None, None):
+        size = 0
+        for chunk in renderer._section_chunks(index, node):
+            chunk = chunk.encode(encoding)
+            chunks.append(chunk)
+            size += len(chunk)
+        sizes.append(size)
+    return b''.join(chunks), sizes
+
+def _configure_worker(settings):
+    """
+    Configures a worker process of ToCManuscript.generate_many() like the process that started it.
+    """
+    with redirect_stdout(io.StringIO()):
+        ToCManuscript.configure(**settings)
+
+def _generate_manuscript(manuscript, templates=None):
+    """
+    Generates the Markdown file of a manuscript with its own output templates, if it has them, restoring it first if it is given by its title. Returns the path of the file.
+    """
+    if not isinstance(manuscript, ToCManuscript):
+        with redirect_stdout(io.StringIO()):
+            manuscript = ToCManuscript.open(manuscript)
+    if templates is not None:
+        manuscript.output_templates = templates
+    return manuscript.generate(return_content=False)
+
 # Initialize configuration function.
 configure = ToCManuscript.configure